@@ -1,4 +1,5 @@
 import json
+import time
 from contextlib import contextmanager
 from typing import Any, Generator, List, Optional, Union
 
@@ -12,7 +13,6 @@ import cairne.schema.generated as generated_schema
 import cairne.schema.worlds as worlds_schema
 import cairne.model.generation as generation_model
 import cairne.schema.templates as template_schema
-import time
 
 logger = get_logger(__name__)
 
@@ -47,6 +47,25 @@ def temporary_world(
     # assert delete_response.world_id == create_response.world_id
 
 
+def wait_for_generation(
+    generation_id: Any,
+    status: generation_model.GenerationStatus = generation_model.GenerationStatus.COMPLETE,
+    timeout: float = 30.0,
+) -> generate_schema.GenerationView:
+    while True:
+        query = generate_schema.WaitForGenerationQuery(timeout=timeout, status=status)
+        response = requests.get(
+            f"{HOST}/generation/{generation_id}/wait",
+            params=json.loads(query.model_dump_json()),
+            timeout=timeout + 10,
+        )
+        assert response.status_code == 200
+        wait_response = generate_schema.WaitForGenerationResponse.model_validate(response.json())
+        if not wait_response.timed_out:
+            return wait_response.generation
+        logger.debug("Waiting for generation", status=wait_response.generation.status)
+
+
 def find_world(
     worlds: List[generated_schema.GeneratedEntity], world_id: str
 ) -> Optional[generated_schema.GeneratedEntity]:
@@ -148,23 +167,8 @@ def test_characters():
         generate_response = generate_schema.GenerateResponse.model_validate(response.json())
         
         generation_id = generate_response.generation_id
-        while True:
-            response = requests.get(f"{HOST}/generation/{generation_id}")
-            assert response.status_code == 200
-            
-            time.sleep(5)
-            
-            generation_response = generate_schema.GetGenerationResponse.model_validate(response.json())
-            generation = generation_response.generation
-            
-            if generation.status in [
-                generation_model.GenerationStatus.COMPLETE,
-                generation_model.GenerationStatus.ERROR,
-            ]:
-                logger.debug("Generation complete", generation=generation)
-                break
-            
-            logger.debug("Waiting for generation", status=generation.status)
+        generation = wait_for_generation(generation_id)
+        logger.debug("Generation complete", generation=generation)
 
         response = requests.delete(
             f"{HOST}/world/{world.entity_id}/entity/{create_response.entity_id}"
@@ -174,6 +178,38 @@ def test_characters():
         # assert delete_response.character_id == create_response.character_id
 
 
+def test_validate_world():
+    with temporary_world(name="Test World") as world:
+        request = generated_schema.CreateEntityRequest(
+            world_id=world.entity_id,
+            entity_type=spec.EntityType.CHARACTER,
+            name="Test Character",
+        )
+        response = requests.post(
+            f"{HOST}/world/{world.entity_id}/entities/{spec.EntityType.CHARACTER.value}",
+            json=json.loads(request.model_dump_json()),
+        )
+        assert response.status_code == 200
+
+        response = requests.post(f"{HOST}/world/{world.entity_id}/validate")
+        assert response.status_code == 200
+        validation = worlds_schema.ValidateWorldResponse.model_validate(response.json()).validation
+
+        while validation.status == worlds_schema.WorldValidationStatus.RUNNING:
+            time.sleep(0.1)
+            response = requests.get(
+                f"{HOST}/world/{world.entity_id}/validation/{validation.validation_id}"
+            )
+            assert response.status_code == 200
+            validation = worlds_schema.GetWorldValidationResponse.model_validate(response.json()).validation
+            logger.debug("Validating world", completed=validation.completed_partitions, total=validation.number_of_partitions)
+
+        assert validation.status == worlds_schema.WorldValidationStatus.COMPLETE
+        assert validation.validated_entities == validation.number_of_entities
+        assert len(validation.errors) == validation.number_of_errors
+
+
 if __name__ == "__main__":
     test_list_worlds()
     test_characters()
+    test_validate_world()
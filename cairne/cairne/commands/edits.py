@@ -15,28 +15,13 @@ import cairne.model.parsing as parsing
 import cairne.model.specification as spec
 import cairne.schema.edits as edits_schema
 import cairne.schema.generated as generated_schema
+import cairne.serve.journal as journal
 from cairne.commands.base import Command
 from cairne.model.world_spec import WORLD
 
 logger = get_logger()
 
 
-class PathSplit(BaseModel):
-    parent_path: spec.GeneratablePath = Field()
-    key: spec.GeneratablePathElement = Field()
-
-
-def split_path(path: spec.GeneratablePath) -> PathSplit:
-    if len(path.path_elements) == 0:
-        print("uh oh")
-    path_elements = path.model_copy(deep=True).path_elements
-
-    return PathSplit(
-        parent_path=spec.GeneratablePath(path_elements=path_elements[:-1]),
-        key=path_elements[-1],
-    )
-
-
 @dataclass
 class Edit(Command):
     def parse(
@@ -45,7 +30,7 @@ class Edit(Command):
         specification: Optional[spec.GeneratableSpecification] = None,
     ) -> generated_model.Generated:
         if specification is None:
-            specification = WORLD.get(request.path, 0)
+            specification = spec.resolve(WORLD, request.path)
         raw_value = json.loads(request.value_js)
 
         source_type = generated_model.GenerationSourceType.USER_EDIT
@@ -66,11 +51,17 @@ class ReplaceValue(Edit):
         if world is None:
             raise ValueError(f"World not found: {self.request.world_id}")
 
-        path_split = split_path(self.request.path)
-        parent = world.get(path_split.parent_path, 0)
+        # Make sure the value being replaced exists before it is journaled
+        world.get(self.request.path, 0)
         generated = self.parse(self.request)
-        parent.replace_child(path_split.key, generated)
-        self.datastore.save()
+        self.datastore.apply_edit(
+            journal.EditRecord(
+                world_id=self.request.world_id,
+                operation=journal.EditOperation.REPLACE,
+                path=self.request.path,
+                generated=generated,
+            )
+        )
 
         return edits_schema.ReplaceResponse()
 
@@ -88,7 +79,7 @@ class AppendValue(Edit):
         if not isinstance(parent, generated_model.GeneratedList):
             raise ValueError(f"Cannot append to non-list: {self.request.path}")
 
-        specification = WORLD.get(self.request.path, 0)
+        specification = spec.resolve(WORLD, self.request.path)
         if not isinstance(specification, spec.ListSpecification):
             raise ValueError(f"Cannot append to non-list: {self.request.path}")
 
@@ -98,8 +89,14 @@ class AppendValue(Edit):
         generated = self.parse(
             self.request, specification=specification.element_specification
         )
-        parent.append_child(generated)
-        self.datastore.save()
+        self.datastore.apply_edit(
+            journal.EditRecord(
+                world_id=self.request.world_id,
+                operation=journal.EditOperation.APPEND,
+                path=self.request.path,
+                generated=generated,
+            )
+        )
 
         return edits_schema.AppendElementResponse()
 
@@ -15,7 +15,15 @@ import cairne.schema.generated as generated_schema
 import cairne.schema.worlds as worlds_schema
 from cairne.model.world_spec import WORLD
 import cairne.model.templates as template_model
+import cairne.openrpg.world_helpers as world_helpers
 import cairne.schema.templates as template_schema
+import cairne.serve.change_log as change_log
+import cairne.serve.entity_listing as entity_listing
+import cairne.serve.export_cache as export_cache
+import cairne.serve.export_memo as export_memo
+import cairne.serve.scheduler as scheduler
+import cairne.serve.world_cache as world_cache
+import cairne.serve.world_validation as world_validation
 
 
 logger = get_logger(__name__)
@@ -41,15 +49,44 @@ def export_generated_entity_item(
     )
 
 
+def export_entity_list_entry(
+    entry: entity_listing.EntityListEntry,
+) -> generated_schema.GeneratedEntityListItem:
+    return generated_schema.GeneratedEntityListItem(
+        entity_id=entry.entity_id,
+        name=entry.name,
+        image_uri=None,
+        created_at=entry.created_at,
+        updated_at=entry.updated_at,
+        path=entry.path,
+    )
+
+
+def export_world_index_entry(
+    entry: world_cache.WorldIndexEntry,
+) -> generated_schema.GeneratedEntityListItem:
+    return generated_schema.GeneratedEntityListItem(
+        entity_id=entry.world_id,
+        name=entry.name,
+        image_uri=None,
+        created_at=entry.created_at,
+        updated_at=entry.updated_at,
+        path=spec.EntityType.WORLD.get_dictionary_path().append(
+            spec.GeneratablePathElement(entity_id=entry.world_id)
+        ),
+    )
+
+
 def export_generated_object_child(
     path: spec.GeneratablePath,
     label: str,
     generatable: generated_model.GeneratedObject,
+    session: Optional[export_memo.ExportSession] = None,
 ) -> generated_schema.GeneratedField:
     children: list[generated_schema.GeneratedField] = []
     for name, child in generatable.children.items():
         child_path = path.append(spec.GeneratablePathElement(key=name))
-        children.append(export_generated_child(child_path, name, typing.cast(generated_model.Generated, child)))
+        children.append(export_generated_child(child_path, name, typing.cast(generated_model.Generated, child), session))
     return generated_schema.GeneratedField(
         label=label,
         raw_value=json.dumps(generatable.raw),
@@ -91,8 +128,9 @@ def export_generated_list_child(
     path: spec.GeneratablePath,
     label: str,
     generatable: generated_model.GeneratedList,
+    session: Optional[export_memo.ExportSession] = None,
 ) -> generated_schema.GeneratedField:
-    specification = WORLD.get(path, 0)
+    specification = spec.resolve(WORLD, path)
     if not isinstance(specification, spec.ListSpecification):
         raise NotImplementedError(f"Expected list specification at {path}")
     add_value_type = get_add_value_type(
@@ -102,7 +140,7 @@ def export_generated_list_child(
     children: list[generated_schema.GeneratedField] = []
     for index, child in enumerate(generatable.elements):
         child_path = path.append(spec.GeneratablePathElement(index=index))
-        children.append(export_generated_child(child_path, f"[{index}]", typing.cast(generated_model.Generated, child)))
+        children.append(export_generated_child(child_path, f"[{index}]", typing.cast(generated_model.Generated, child), session))
     return generated_schema.GeneratedField(
         label=label,
         raw_value=json.dumps(generatable.raw),
@@ -130,7 +168,7 @@ def export_generated_dictionary_child(
     label: str,
     generatable: generated_model.EntityDictionary,
 ) -> generated_schema.GeneratedField:
-    specification = WORLD.get(path, 0)
+    specification = spec.resolve(WORLD, path)
     if not isinstance(specification, spec.EntityDictionarySpecification):
         raise NotImplementedError(f"Expected entity dictionary specification at {path}")
 
@@ -180,7 +218,7 @@ def export_generated_boolean_child(
 
 
 def export_choices(path: spec.GeneratablePath) -> Optional[List[generated_schema.GeneratedFieldChoice]]:
-    specification = WORLD.get(path, 0)
+    specification = spec.resolve(WORLD, path)
     choices = None
     for validator in specification.validators:
         if isinstance(validator, spec.OneOfLiteralValidator):
@@ -267,21 +305,37 @@ def export_generated_float_child(
     )
 
 
-# TODO: We could improt exprting into the model itself
 def export_generated_child(
     path: spec.GeneratablePath,
     label: str,
     generatable: generated_model.Generated,
+    session: Optional[export_memo.ExportSession] = None,
+) -> generated_schema.GeneratedField:
+    if session is None:
+        return export_generated_subtree(path, label, generatable, session)
+    exported = session.get(path, label)
+    if exported is None:
+        exported = export_generated_subtree(path, label, generatable, session)
+        session.put(path, label, exported)
+    return exported
+
+
+# TODO: We could improt exprting into the model itself
+def export_generated_subtree(
+    path: spec.GeneratablePath,
+    label: str,
+    generatable: generated_model.Generated,
+    session: Optional[export_memo.ExportSession],
 ) -> generated_schema.GeneratedField:
     if isinstance(generatable, generated_model.GeneratedEntity):
         entity = typing.cast(generated_model.GeneratedEntity, generatable)
-        return export_generated_object_child(path, label, entity)
+        return export_generated_object_child(path, label, entity, session)
     elif isinstance(generatable, generated_model.GeneratedObject):
         object = typing.cast(generated_model.GeneratedObject, generatable)
-        return export_generated_object_child(path, label, object)
+        return export_generated_object_child(path, label, object, session)
     elif isinstance(generatable, generated_model.GeneratedList):
         gen_list = typing.cast(generated_model.GeneratedList, generatable)
-        return export_generated_list_child(path, label, gen_list)
+        return export_generated_list_child(path, label, gen_list, session)
     elif isinstance(generatable, generated_model.EntityDictionary):
         gen_dict = typing.cast(generated_model.EntityDictionary, generatable)
         return export_generated_dictionary_child(path, label, gen_dict)
@@ -305,10 +359,11 @@ def export_generated_entity(
     world: generated_model.GeneratedEntity,
     path: spec.GeneratablePath,
     generated_entity: generated_model.GeneratedEntity,
+    session: Optional[export_memo.ExportSession] = None,
 ) -> generated_schema.GeneratedEntity:
 
     # TODO: This doesn't return the validation errors for the entity itself
-    fields = export_generated_object_child(path, "", generated_entity).children
+    fields = export_generated_child(path, "", generated_entity, session).children
     if fields is None:
         raise NotImplementedError(
             "No fields found for entity: " + str(generated_entity)
@@ -329,6 +384,15 @@ def export_generated_entity(
     )
 
 
+def export_world_change(change: change_log.WorldChange) -> generated_schema.WorldChangeView:
+    return generated_schema.WorldChangeView(
+        version=change.version,
+        path=change.path,
+        entity_id=change.entity_id,
+        date=change.date,
+    )
+
+
 def export_generation_list_item(
     generation: generate_model.Generation,
 ) -> generate_schema.GenerationListItem:
@@ -353,15 +417,65 @@ def export_generation_list_item(
 
 def export_generation(
     generation: generate_model.Generation,
-    world: generated_model.GeneratedEntity,
+    aggregates: Optional[world_helpers.WorldAggregates],
 ) -> generate_schema.GenerationView:
     return generate_schema.GenerationView(
         generation_id=generation.generation_id,
-        template=export_template(generation.template_snapshot, world),
+        template=export_template(generation.template_snapshot, aggregates),
         begin_time=generation.begin_time,
         end_time=generation.end_time,
         status=generation.status,
+        stop_reason=generation.stop_reason,
         raw_generated_text=generation.result.raw_text if generation.result else None,
+        partial_json=generation.result.partial if generation.result else None,
+    )
+
+
+def export_scheduler_status(status: scheduler.SchedulerStatus) -> generate_schema.GenerationQueueView:
+    return generate_schema.GenerationQueueView(
+        queue_depth=status.queue_depth,
+        running=status.running,
+        number_of_workers=status.number_of_workers,
+        running_per_generator_type=status.running_per_generator_type,
+        running_per_model=status.running_per_model,
+        average_wait_seconds=status.average_wait_seconds,
+        longest_wait_seconds=status.longest_wait_seconds,
+    )
+
+
+def export_export_cache_stats(stats: export_cache.ExportCacheStats) -> worlds_schema.ExportCacheView:
+    return worlds_schema.ExportCacheView(
+        size=stats.size,
+        capacity=stats.capacity,
+        hits=stats.hits,
+        misses=stats.misses,
+        evictions=stats.evictions,
+        hit_rate=stats.hit_rate,
+    )
+
+
+def export_world_validation(
+    state: world_validation.WorldValidation,
+) -> worlds_schema.WorldValidationView:
+    errors: List[worlds_schema.WorldValidationErrorView] = []
+    if state.status == worlds_schema.WorldValidationStatus.COMPLETE:
+        errors = [
+            worlds_schema.WorldValidationErrorView(path=error.path, message=error.message)
+            for error in state.errors
+        ]
+    return worlds_schema.WorldValidationView(
+        validation_id=state.validation_id,
+        world_id=state.world_id,
+        status=state.status,
+        started_at=state.started_at,
+        finished_at=state.finished_at,
+        number_of_partitions=state.number_of_partitions,
+        completed_partitions=state.completed_partitions,
+        number_of_entities=state.number_of_entities,
+        validated_entities=state.validated_entities,
+        number_of_errors=state.number_of_errors,
+        errors=errors,
+        failure=state.failure,
     )
 
 
@@ -389,10 +503,10 @@ def export_template_list_item(
 
 
 def export_instructions(
-    world: generated_model.GeneratedEntity,
+    aggregates: world_helpers.WorldAggregates,
     template: template_model.GenerationTemplate,
 ) -> List[template_schema.InstructionView]:
-    specification = WORLD.get(template.target_path, 0)
+    specification = spec.resolve(WORLD, template.target_path)
     unfilled_instructions = [
         instruction.model_copy(deep=True)
         for instruction in specification.generation.instructions
@@ -410,8 +524,13 @@ def export_instructions(
     for excluded in template.excluded_instruction_names:
         instructions_by_name[excluded].included = False
     
-    generation_variables = template_model.GenerationVariables.create(world)
-    filled_instructions = generation_variables.fill_instructions(unfilled_instructions)
+    generation_variables = template_model.GenerationVariables.create(aggregates)
+    # The same budget as the prompt of a generation, so the preview lists what would be sent
+    json_instruction = template.create_json_instruction(specification.create_example())
+    filled_instructions = generation_variables.fill_instructions_within(
+        unfilled_instructions,
+        template.get_instructions_budget(template.get_max_tokens(), json_instruction),
+    )
     for instruction in filled_instructions:
         instructions_by_name[instruction.name].preview = instruction.message
         instructions_by_name[instruction.name].valid = True
@@ -421,8 +540,9 @@ def export_instructions(
 
 def export_template(
     template: template_model.GenerationTemplate,
-    world: generated_model.GeneratedEntity,
+    aggregates: Optional[world_helpers.WorldAggregates],
 ) -> template_schema.GenerationTemplateView:
+    # The instructions are previewed against the world, which is gone once archived
     return template_schema.GenerationTemplateView(
         template_id=template.template_id,
         name=template.name,
@@ -437,7 +557,7 @@ def export_template(
         prompt=template.additional_prompt,
         parameters=template.parameters,
         fields_to_include=[field.path for field in template.fields_to_include],
-        instructions=export_instructions(world, template),
+        instructions=export_instructions(aggregates, template) if aggregates is not None else [],
         json_structure_preview=template.create_json_schema(),
         validations_to_include=[],  # TODO
     )
@@ -1,3 +1,4 @@
+import copy
 import datetime
 import typing
 import uuid
@@ -24,7 +25,9 @@ from cairne.model.world_spec import WORLD
 from cairne.serve.data_store import Datastore
 import cairne.model.parsing as parsing
 import cairne.model.validation as validation
+import cairne.parsing.parse_incomplete_json as parse_incomplete
 import threading
+import time
 from contextlib import contextmanager
 import cairne.model.templates as template_model
 
@@ -32,16 +35,60 @@ import cairne.model.templates as template_model
 logger = get_logger()
 
 
+# Partial results are parsed at most this often while streaming
+PARTIAL_PARSE_INTERVAL_SECONDS = 0.2
+
+
 def parse_results(
     generation: generate_model.Generation,
     result: generate_model.GenerateResult,
 ) -> None:
     context = parsing.ParseContext(source=generation.as_source())
-    generated = parsing.parse(context, WORLD, raw=result.raw_text)
+    specification = spec.resolve(WORLD, generation.template_snapshot.target_path)
+    generated = parsing.parse(context, specification, raw=result.raw_text)
     result.parsed = generated
+    result.partial = None
     generation.result = result
 
 
+@dataclass
+class PartialResults:
+    datastore: Datastore
+    generation: generate_model.Generation
+    create_result: Callable[[str], generate_model.GenerateResult]
+    pieces: List[str] = field(default_factory=list)
+    incomplete_context: parse_incomplete.ParsingContext = field(
+        default_factory=lambda: parse_incomplete.ParsingContext(json_str="", more_input_expected=True)
+    )
+    last_parse_time: float = field(default=0.0)
+
+    def update(self, content: str) -> None:
+        if self.generation.status != generate_model.GenerationStatus.STREAMING:
+            self.generation.status = generate_model.GenerationStatus.STREAMING
+            self.datastore.generation_changed(self.generation.generation_id)
+        self.pieces.append(content)
+        # Only reads the new content
+        self.incomplete_context.feed(content)
+        parse_incomplete.parse_incomplete_json(self.incomplete_context, include_partial_string=False)
+
+        now = time.monotonic()
+        if now - self.last_parse_time < PARTIAL_PARSE_INTERVAL_SECONDS:
+            return
+        self.last_parse_time = now
+        partial = parse_incomplete.parse_incomplete_json(self.incomplete_context)
+        result = self.create_result("".join(self.pieces))
+        if isinstance(partial, dict):
+            result.partial = copy.deepcopy(partial)
+            try:
+                context = parsing.ParseContext(source=self.generation.as_source())
+                specification = spec.resolve(WORLD, self.generation.template_snapshot.target_path)
+                result.parsed = parsing.parse(context, specification, raw=result.partial)
+            except Exception as e:
+                logger.warning("Unable to parse partial results", generation_id=self.generation.generation_id, error=e)
+        self.generation.result = result
+        self.datastore.generation_changed(self.generation.generation_id)
+
+
 @contextmanager
 def generate_thread_entry(datastore: Datastore, generation: generate_model.Generation) -> Generator[None, None, None]:
     datastore.generation_threads[generation.generation_id] = threading.current_thread()
@@ -243,7 +290,7 @@ class BaseGenerate(Command):
 
     def execute(self) -> generate_schema.GenerateResponse:
         self.datastore.generations[self.generation.generation_id] = self.generation
-        self.datastore.save()
+        self.datastore.save_generation(self.generation.generation_id)
 
         self.spawn_generation()
         
@@ -253,6 +300,31 @@ class BaseGenerate(Command):
             generation_id=self.generation.generation_id
         )
 
+def resume_generations(datastore: Datastore, user: str) -> None:
+    # Generations that were queued or running when the server stopped
+    interrupted = [
+        generation
+        for generation in datastore.generations.values()
+        if generation.deletion is None
+        and generation.status in (
+            generate_model.GenerationStatus.QUEUED,
+            generate_model.GenerationStatus.IN_PROGRESS,
+            generate_model.GenerationStatus.STREAMING,
+        )
+    ]
+    interrupted.sort(key=lambda generation: generation.begin_time)
+    for generation in interrupted:
+        logger.info("Resuming generation", generation_id=generation.generation_id, status=generation.status)
+        generation.status = generate_model.GenerationStatus.QUEUED
+        generation.result = None
+        generation.stop_reason = None
+        generation.end_time = None
+        datastore.generation_changed(generation.generation_id)
+        command_class = get_command_class(generation=generation)
+        command = command_class(datastore=datastore, user=user, generation=generation)
+        command.spawn_generation()
+
+
 def get_command_class(generation: generate_model.Generation) -> typing.Type[BaseGenerate]:
     if generation.template_snapshot.generator_model.generator_type == template_model.GeneratorType.OPENAI:
         import cairne.commands.generate.openai.generate as openai_generate
@@ -1,7 +1,9 @@
 import datetime
+import functools
 import json
 import sys
 import threading
+import time
 import typing
 import uuid
 from dataclasses import dataclass, field
@@ -24,15 +26,40 @@ import cairne.schema.generate as generate_schema
 import cairne.schema.worlds as worlds_schema
 from cairne.commands.base import Command
 import cairne.commands.generate.base as base_generate_commands
+import cairne.commands.generate.rate_limit as rate_limit
 from cairne.serve.data_store import Datastore
 
 
 logger = get_logger()
 
 
+# Should match the limits of the account, unlisted models use the default limits
+OPENAI_RATE_LIMITS = rate_limit.RateLimiters(
+    default_limits=rate_limit.RateLimits(requests_per_minute=500, tokens_per_minute=10000),
+    model_limits={
+        "gpt-3.5-turbo-1106": rate_limit.RateLimits(requests_per_minute=3500, tokens_per_minute=60000),
+        "gpt-4-1106-preview": rate_limit.RateLimits(requests_per_minute=500, tokens_per_minute=150000),
+    },
+)
+
+# Used when the generation does not limit the completion
+DEFAULT_COMPLETION_TOKENS = 1024
+CHARACTERS_PER_TOKEN = 4
+
+
+@dataclass
+class StreamedCompletion:
+    content: str = field(default="")
+    finish_reason: str = field(default="")
+    completion_tokens: int = field(default=0)
+    prompt_tokens: int = field(default=0)
+    total_tokens: int = field(default=0)
+
+
 class OpenAIService:
     client: openai.OpenAI
-    last_call_time: Optional[datetime.datetime] = None
+    rate_limiters: rate_limit.RateLimiters = OPENAI_RATE_LIMITS
+    retry_policy: rate_limit.RetryPolicy = rate_limit.RetryPolicy()
 
     @classmethod
     def translate_message(
@@ -43,8 +70,107 @@ class OpenAIService:
             "content": message.message,
         }
 
+    @classmethod
+    def estimate_tokens(cls, generation: generate_model.Generation) -> int:
+        prompt_tokens = generation.estimated_prompt_tokens
+        if prompt_tokens is None:
+            prompt_characters = sum(len(message.message) for message in generation.prompt_messages)
+            prompt_tokens = prompt_characters // CHARACTERS_PER_TOKEN
+        max_tokens = generation.template_snapshot.parameters.max_tokens
+        if max_tokens is None:
+            max_tokens = DEFAULT_COMPLETION_TOKENS
+        return prompt_tokens + max_tokens
+
+    @classmethod
+    def get_retry_after(cls, error: openai.APIStatusError) -> Optional[float]:
+        retry_after = error.response.headers.get("retry-after", None)
+        if retry_after is None:
+            return None
+        try:
+            return float(retry_after)
+        except ValueError:
+            return None
+
+    def create_completion(self, generation: generate_model.Generation, kwargs: Dict[str, Any]) -> Any:
+        limiter = self.rate_limiters.get(kwargs["model"])
+        estimated_tokens = self.estimate_tokens(generation)
+        attempt = 0
+        while True:
+            limiter.acquire(estimated_tokens)
+            try:
+                completion = self.client.chat.completions.create(**kwargs)
+            except openai.RateLimitError as e:
+                stop_reason = generate_model.GenerationStopReason.RATE_LIMIT
+                retry_after = self.get_retry_after(e)
+                error: Exception = e
+            except (openai.APITimeoutError, openai.APIConnectionError) as e:
+                stop_reason = generate_model.GenerationStopReason.TIMEOUT
+                retry_after = None
+                error = e
+            except openai.InternalServerError as e:
+                stop_reason = generate_model.GenerationStopReason.ERROR
+                retry_after = self.get_retry_after(e)
+                error = e
+            else:
+                # Streams only report their usage once they are consumed
+                if not kwargs.get("stream", False) and completion.usage is not None:
+                    limiter.settle(estimated_tokens, completion.usage.total_tokens)
+                return completion
+
+            attempt += 1
+            if attempt >= self.retry_policy.max_attempts:
+                raise rate_limit.GenerationStopped(stop_reason, f"Giving up after {attempt} attempts: {error}") from error
+            delay = self.retry_policy.get_delay(attempt, retry_after)
+            if stop_reason == generate_model.GenerationStopReason.RATE_LIMIT:
+                limiter.penalize(delay)
+            logger.warning(
+                "Retrying OpenAI call",
+                generation_id=generation.generation_id,
+                attempt=attempt,
+                delay=delay,
+                error=error,
+            )
+            time.sleep(delay)
+
+    def stream_completion(
+        self,
+        generation: generate_model.Generation,
+        kwargs: Dict[str, Any],
+        on_content: Optional[Callable[[str], None]],
+    ) -> StreamedCompletion:
+        stream = self.create_completion(
+            generation,
+            dict(kwargs, stream=True, stream_options={"include_usage": True}),
+        )
+        streamed = StreamedCompletion()
+        pieces: List[str] = []
+        for chunk in stream:
+            # The last chunk only carries the usage
+            if chunk.usage is not None:
+                streamed.completion_tokens = chunk.usage.completion_tokens
+                streamed.prompt_tokens = chunk.usage.prompt_tokens
+                streamed.total_tokens = chunk.usage.total_tokens
+            if len(chunk.choices) == 0:
+                continue
+            choice = chunk.choices[0]
+            if choice.finish_reason is not None:
+                streamed.finish_reason = choice.finish_reason
+            if not choice.delta.content:
+                continue
+            pieces.append(choice.delta.content)
+            if on_content is not None:
+                on_content(choice.delta.content)
+        streamed.content = "".join(pieces)
+        if streamed.total_tokens > 0:
+            self.rate_limiters.get(kwargs["model"]).settle(
+                self.estimate_tokens(generation), streamed.total_tokens
+            )
+        return streamed
+
     def generate_json(
-        self, generation: generate_model.Generation
+        self,
+        generation: generate_model.Generation,
+        on_content: Optional[Callable[[str], None]] = None,
     ) -> generate_model.OpenAIGenerationResult:
         kwargs = dict(
             model="gpt-3.5-turbo-1106",  # TODO: This is set on the generation
@@ -60,20 +186,19 @@ class OpenAIService:
         logger.info("Calling openai", kwargs=kwargs, generation=generation)
 
         start_time = datetime.datetime.now()
-        from openai.types.chat.chat_completion import ChatCompletion
 
         if False:
-            completion = typing.cast(ChatCompletion, self.client.chat.completions.create(**kwargs))  # type: ignore
+            streamed = self.stream_completion(generation, kwargs, on_content)
             generation_time = datetime.datetime.now() - start_time
 
-            finish_reason = completion.choices[0].finish_reason
-            complete = completion.choices[0].finish_reason == "stop"
-            content = completion.choices[0].message.content
+            finish_reason = streamed.finish_reason
+            complete = streamed.finish_reason == "stop"
+            content = streamed.content
             
             
-            completion_tokens=completion.usage.completion_tokens,
-            prompt_tokens=completion.usage.prompt_tokens,
-            total_tokens=completion.usage.total_tokens,
+            completion_tokens=streamed.completion_tokens
+            prompt_tokens=streamed.prompt_tokens
+            total_tokens=streamed.total_tokens
         
             with open("output/reponses.txt", "a") as f:
                 f.write(content + "\n")
@@ -116,27 +241,48 @@ def get_openai_service() -> OpenAIService:
     if openai_service is not None:
         return openai_service
     service = OpenAIService()
-    service.client = openai.OpenAI()
+    # Retries are handled by create_completion, so they can share the rate limits
+    service.client = openai.OpenAI(max_retries=0)
     openai_service = service
     return service
 
 
+def create_partial_result(raw_text: str) -> generate_model.OpenAIGenerationResult:
+    return generate_model.OpenAIGenerationResult(
+        raw_text=raw_text,
+        completion_tokens=0,
+        prompt_tokens=0,
+        total_tokens=0,
+        finish_reason="",
+    )
+
+
 def run_openai_generation(data_store: Datastore, generation: generate_model.Generation):
     with base_generate_commands.generate_thread_entry(data_store, generation):
         try:
             logger.info("Running OpenAI generation", generation_id=generation.generation_id)
             generation.status = generate_model.GenerationStatus.IN_PROGRESS
+            data_store.generation_changed(generation.generation_id)
 
             service = get_openai_service()
 
-            result = service.generate_json(generation)
+            partial_results = base_generate_commands.PartialResults(
+                datastore=data_store,
+                generation=generation,
+                create_result=create_partial_result,
+            )
+            result = service.generate_json(generation, on_content=partial_results.update)
             base_generate_commands.parse_results(generation, result)
 
             # TODO: move this into the base class
             generation.end_time = datetime.datetime.utcnow()
             generation.status = generate_model.GenerationStatus.COMPLETE
+            if result.finish_reason == "content_filter":
+                generation.stop_reason = generate_model.GenerationStopReason.CONTENT_FILTER
+            else:
+                generation.stop_reason = generate_model.GenerationStopReason.SUCCESS
             logger.info("Completed OpenAI generation", generation_id=generation.generation_id)
-            data_store.save()
+            data_store.save_generation(generation.generation_id)
         except Exception as e:
             logger.exception(
                 "Error running OpenAI generation",
@@ -145,15 +291,21 @@ def run_openai_generation(data_store: Datastore, generation: generate_model.Gene
             )
             generation.end_time = datetime.datetime.utcnow()
             generation.status = generate_model.GenerationStatus.ERROR
+            if isinstance(e, rate_limit.GenerationStopped):
+                generation.stop_reason = e.stop_reason
+            else:
+                generation.stop_reason = generate_model.GenerationStopReason.ERROR
+            data_store.save_generation(generation.generation_id)
             raise
         
 
 
 class OpenAIGenerate(base_generate_commands.BaseGenerate):
     def spawn_generation(self) -> None:
-        # Should rate limit this somehow...
-        # We need to remember this thread so we can cancel it later
-        threading.Thread(target=run_openai_generation, args=(self.datastore, self.generation,)).start()
+        self.datastore.scheduler.submit(
+            self.generation,
+            run=functools.partial(run_openai_generation, self.datastore, self.generation),
+        )
 
 
 class Settings:
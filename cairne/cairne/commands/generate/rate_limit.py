@@ -0,0 +1,116 @@
+import random
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+import cairne.model.generation as generate_model
+
+logger = get_logger(__name__)
+
+
+class RateLimits(BaseModel):
+    requests_per_minute: float = Field()
+    tokens_per_minute: float = Field()
+
+
+class RetryPolicy(BaseModel):
+    max_attempts: int = Field(default=6)
+    base_delay_seconds: float = Field(default=1.0)
+    max_delay_seconds: float = Field(default=60.0)
+
+    def get_delay(self, attempt: int, retry_after: Optional[float] = None) -> float:
+        # Full jitter, so that generations limited at the same time do not retry together
+        delay = random.uniform(0, min(self.max_delay_seconds, self.base_delay_seconds * 2**attempt))
+        if retry_after is not None:
+            delay = max(delay, retry_after)
+        return delay
+
+
+class GenerationStopped(Exception):
+    def __init__(self, stop_reason: generate_model.GenerationStopReason, message: str):
+        super().__init__(message)
+        self.stop_reason = stop_reason
+
+
+class TokenBucket:
+    def __init__(self, per_minute: float):
+        self.capacity = per_minute
+        self.rate = per_minute / 60.0
+        self.available = per_minute
+        self.updated_at = time.monotonic()
+
+    def refill(self, now: float) -> None:
+        self.available = min(self.capacity, self.available + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    def get_wait(self, amount: float) -> float:
+        # Requests larger than the bucket only wait for a full bucket
+        amount = min(amount, self.capacity)
+        if self.available >= amount:
+            return 0.0
+        return (amount - self.available) / self.rate
+
+
+class RateLimiter:
+    """
+    Blocks callers until both the request and token budgets of a model allow the call.
+    """
+
+    def __init__(self, limits: RateLimits):
+        self.limits = limits
+        self._condition = threading.Condition()
+        self._requests = TokenBucket(limits.requests_per_minute)
+        self._tokens = TokenBucket(limits.tokens_per_minute)
+
+    def acquire(self, tokens: int) -> float:
+        waited = 0.0
+        with self._condition:
+            while True:
+                now = time.monotonic()
+                self._requests.refill(now)
+                self._tokens.refill(now)
+                wait = max(self._requests.get_wait(1), self._tokens.get_wait(tokens))
+                if wait <= 0:
+                    break
+                self._condition.wait(wait)
+                waited += wait
+            self._requests.available -= 1
+            self._tokens.available -= min(tokens, self._tokens.capacity)
+        if waited > 0:
+            logger.info("Rate limited generation", waited_seconds=waited, tokens=tokens)
+        return waited
+
+    def settle(self, estimated_tokens: int, actual_tokens: int) -> None:
+        # Gives back what the estimate overcharged, or charges what it missed
+        with self._condition:
+            self._tokens.available = min(
+                self._tokens.capacity,
+                self._tokens.available + estimated_tokens - actual_tokens,
+            )
+            self._condition.notify_all()
+
+    def penalize(self, delay: float) -> None:
+        # The provider rejected the call, so nothing should be sent until it recovers
+        with self._condition:
+            self._requests.available = min(self._requests.available, -delay * self._requests.rate)
+
+
+@dataclass
+class RateLimiters:
+    default_limits: RateLimits
+    model_limits: Dict[str, RateLimits] = field(default_factory=dict)
+    _limiters: Dict[str, RateLimiter] = field(default_factory=dict)
+    _lock: threading.Lock = field(default_factory=threading.Lock)
+
+    def get(self, g_model_id: str) -> RateLimiter:
+        with self._lock:
+            limiter = self._limiters.get(g_model_id, None)
+            if limiter is None:
+                limits = self.model_limits.get(g_model_id, self.default_limits)
+                limiter = RateLimiter(limits)
+                self._limiters[g_model_id] = limiter
+            return limiter
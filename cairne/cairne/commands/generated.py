@@ -7,9 +7,11 @@ from typing import Optional, Tuple
 import cairne.commands.export as export
 import cairne.model.character as characters
 import cairne.model.generated as generated_model
+import cairne.model.generation as generate_model
 import cairne.model.parsing as parsing
 import cairne.model.specification as spec
 import cairne.schema.generated as generated_schema
+import cairne.serve.export_cache as export_cache
 from cairne.commands.base import Command
 from cairne.model.world_spec import WORLD
 import cairne.model.validation as validation
@@ -36,20 +38,24 @@ class CreateEntity(Command):
         )
         entity = typing.cast(generated_model.GeneratedEntity, generated)
 
-        world = self.datastore.worlds.get(self.request.world_id, None)
-        if world is None:
-            raise ValueError(f"World not found: {self.request.world_id}")
+        # Locked like edits, so the world is neither read by compaction or validation while it changes,
+        # nor evicted, losing the new entity, before it is saved
+        with self.datastore.lock:
+            world = self.datastore.worlds.get(self.request.world_id, None)
+            if world is None:
+                raise ValueError(f"World not found: {self.request.world_id}")
 
-        insert_path = self.request.entity_type.get_dictionary_path()
-        entity_dictionary = typing.cast(
-            generated_model.EntityDictionary, world.get(insert_path, 0)
-        )
-        entity_dictionary.entities[entity.entity_id] = entity
+            insert_path = self.request.entity_type.get_dictionary_path()
+            entity_dictionary = typing.cast(
+                generated_model.EntityDictionary, world.get(insert_path, 0)
+            )
+            entity_dictionary.entities[entity.entity_id] = entity
 
-        child_path = insert_path.append(
-            spec.GeneratablePathElement(entity_id=entity.entity_id)
-        )
-        self.datastore.save()
+            child_path = insert_path.append(
+                spec.GeneratablePathElement(entity_id=entity.entity_id)
+            )
+            self.datastore.world_changed(self.request.world_id, child_path)
+            self.datastore.save_world(self.request.world_id)
 
         response = generated_schema.CreateEntityResponse(
             entity_id=entity.entity_id, path=child_path
@@ -62,26 +68,13 @@ class ListEntities(Command):
     request: generated_schema.ListEntitiesRequest
 
     def execute(self) -> generated_schema.ListEntitiesResponse:
-        world = self.datastore.worlds.get(self.request.world_id, None)
-        if world is None:
-            raise ValueError(f"World not found: {self.request.world_id}")
-        path = self.request.entity_type.get_dictionary_path()
-        entity_dictionary = typing.cast(
-            generated_model.EntityDictionary, world.get(path, 0)
+        # Served from the sorted listing, so that a page does not scan the dictionary
+        entries, next_cursor = self.datastore.list_entities(
+            self.request.world_id, self.request.entity_type, self.request.query
         )
+        entities = [export.export_entity_list_entry(entry) for entry in entries]
 
-        entities = [
-            export.export_generated_entity_item(
-                path=path.append(
-                    spec.GeneratablePathElement(entity_id=entity.entity_id)
-                ),
-                generated_entity=entity,
-            )
-            for entity in entity_dictionary.entities.values()
-            if entity.deletion is None
-        ]
-
-        response = generated_schema.ListEntitiesResponse(entities=entities)
+        response = generated_schema.ListEntitiesResponse(entities=entities, next_cursor=next_cursor)
         return response
 
 
@@ -93,12 +86,25 @@ class GetEntity(Command):
         world = self.datastore.worlds.get(self.request.world_id, None)
         if world is None:
             raise ValueError(f"World not found: {self.request.world_id}")
+
+        cache_key = self.get_cache_key()
+        if cache_key is not None:
+            exported = self.datastore.export_cache.get(cache_key)
+            if exported is not None:
+                return generated_schema.GetEntityResponse(entity=exported)
         
+        # Previews write into the copy, so only plain views share the exported subtrees
+        session = None
+        if self.request.template_id is None and self.request.generation_id is None:
+            session = self.datastore.begin_export(self.request.world_id)
+        # Started before copying, results are only kept if the world was not modified since
+        validation_session = self.datastore.begin_validation(self.request.world_id)
+
         # Copying so that excluded fields written for the export don't have a concurrency issue
         world = world.model_copy(deep=True)
 
-        search_path = spec.GeneratablePath(path_elements=[])
-        located_entity = world.search_for_entity(self.request.entity_id, path=search_path)
+        entity_index = self.datastore.get_entity_index(self.request.world_id)
+        located_entity = entity_index.locate(world, self.request.entity_id)
         if located_entity is None:
             raise ValueError(f"Entity not found: {self.request.entity_id}")
         
@@ -106,7 +112,8 @@ class GetEntity(Command):
         specification = generated_entity.entity_type.get_specification()
         validation_context = validation.ValidationContext(
             world=world,
-            current_path=located_entity.path.model_copy(deep=True),
+            current_path=located_entity.path,
+            session=validation_session,
         )
         validation.validate_generated(validation_context, specification, generated_entity)
         
@@ -116,7 +123,7 @@ class GetEntity(Command):
                 raise ValueError(f"Generation not found: {self.request.generation_id}")
 
             context = parsing.ParseContext(source=generation.as_source())
-            specification = WORLD.get(generation.template_snapshot.target_path, 0)
+            specification = spec.resolve(WORLD, generation.template_snapshot.target_path)
             generated = parsing.parse(context, specification, raw=generation.result.raw_text)
             parsed = typing.cast(generated_model.GeneratedEntity, generated)
 
@@ -133,31 +140,47 @@ class GetEntity(Command):
         exported = export.export_generated_entity(
             world=world,
             path=located_entity.path,
-            generated_entity=located_entity.entity
+            generated_entity=located_entity.entity,
+            session=session,
         )
+        if cache_key is not None:
+            self.datastore.export_cache.put(cache_key, exported)
         return generated_schema.GetEntityResponse(entity=exported)
 
+    def get_cache_key(self) -> Optional[export_cache.ExportKey]:
+        # Templates can be edited without changing the world, so their previews are not cached
+        if self.request.template_id is not None:
+            return None
+        if self.request.generation_id is not None:
+            generation = self.datastore.generations.get(self.request.generation_id, None)
+            if generation is None or generation.status != generate_model.GenerationStatus.COMPLETE:
+                return None
+        return (
+            self.request.world_id,
+            self.request.entity_id,
+            self.request.generation_id,
+            self.datastore.get_world_version(self.request.world_id),
+        )
+
 
 @dataclass
 class DeleteEntity(Command):
     request: generated_schema.DeleteEntityRequest
 
     def execute(self) -> generated_schema.DeleteEntityResponse:
-        world = self.datastore.worlds.get(self.request.world_id, None)
-        if world is None:
-            raise ValueError(f"World not found: {self.request.world_id}")
+        with self.datastore.lock:
+            if self.request.world_id not in self.datastore.worlds:
+                raise ValueError(f"World not found: {self.request.world_id}")
 
-        located_entity = world.search_for_entity(
-            self.request.entity_id,
-            path=spec.GeneratablePath(path_elements=[]),
-        )
-        if located_entity is None:
-            raise ValueError(f"Entity not found: {self.request.entity_id}")
+            located_entity = self.datastore.locate_entity(self.request.world_id, self.request.entity_id)
+            if located_entity is None:
+                raise ValueError(f"Entity not found: {self.request.entity_id}")
 
-        located_entity.entity.deletion = generated_model.Deletion(
-            date=datetime.datetime.now(),
-            deleted_by=self.user,
-        )
-        self.datastore.save()
+            located_entity.entity.deletion = generated_model.Deletion(
+                date=datetime.datetime.now(),
+                deleted_by=self.user,
+            )
+            self.datastore.world_changed(self.request.world_id, located_entity.path)
+            self.datastore.save_world(self.request.world_id)
 
         return generated_schema.DeleteEntityResponse()
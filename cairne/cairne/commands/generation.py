@@ -16,13 +16,16 @@ class ListGenerations(Command):
     request: generate_schema.ListGenerationsQuery
     
     def execute(self) -> generate_schema.ListGenerationsResponse:
-        generations = []
-        for generation in self.datastore.generations.values():
-            if generation.deletion is not None:
-                continue
-            if not self.request.includes(generation):
-                continue
-            generations.append(export.export_generation_list_item(generation))
+        generations = [
+            export.export_generation_list_item(generation)
+            for generation in self.datastore.find_generations(
+                world_id=self.request.world_id,
+                entity_id=self.request.entity_id,
+                entity_type=self.request.entity_type,
+                template_id=self.request.template_id,
+                status=self.request.status,
+            )
+        ]
         return generate_schema.ListGenerationsResponse(generations=generations)
 
 
@@ -31,17 +34,35 @@ class GetGeneration(Command):
     generation_id: uuid.UUID
 
     def execute(self) -> generate_schema.GetGenerationResponse:
-        generation = self.datastore.generations.get(self.generation_id, None)
+        generation = self.datastore.get_generation(self.generation_id)
         if generation is None:
             raise ValueError(f"Generation not found: {self.generation_id}")
-        world = self.datastore.worlds.get(generation.template_snapshot.world_id, None)
-        if world is None:
-            raise ValueError(f"World not found: {generation.template_snapshot.world_id}")
-
-        exported = export.export_generation(generation, world)
+        aggregates = self.datastore.find_world_aggregates(generation.template_snapshot.world_id)
+        exported = export.export_generation(generation, aggregates)
         return generate_schema.GetGenerationResponse(generation=exported)
 
 
+@dataclass
+class WaitForGeneration(Command):
+    generation_id: uuid.UUID
+    query: generate_schema.WaitForGenerationQuery
+
+    def execute(self) -> generate_schema.WaitForGenerationResponse:
+        generation, timed_out = self.datastore.wait_for_generation(
+            self.generation_id, status=self.query.status, timeout=self.query.timeout
+        )
+        aggregates = self.datastore.find_world_aggregates(generation.template_snapshot.world_id)
+        exported = export.export_generation(generation, aggregates)
+        return generate_schema.WaitForGenerationResponse(generation=exported, timed_out=timed_out)
+
+
+@dataclass
+class GetGenerationQueue(Command):
+    def execute(self) -> generate_schema.GetGenerationQueueResponse:
+        status = self.datastore.scheduler.status()
+        return generate_schema.GetGenerationQueueResponse(queue=export.export_scheduler_status(status))
+
+
 @dataclass
 class CancelGeneration(Command):
     request: generate_schema.CancelGenerationRequest
@@ -92,11 +113,13 @@ class DeleteGeneration(Command):
     generation_id: uuid.UUID
     
     def execute(self) -> generate_schema.DeleteGenerationResponse:
-        generation = self.datastore.generations.pop(self.generation_id, None)
+        generation = self.datastore.generations.get(self.generation_id, None)
         if generation is None:
             raise ValueError(f"Generation not found: {self.generation_id}")
         generation.deletion = generated_model.Deletion(
             date=datetime.datetime.utcnow(),
             deleted_by=self.user,
         )
+        # Kept until it is archived, like deleted templates and worlds
+        self.datastore.save_generation(self.generation_id)
         return generate_schema.DeleteGenerationResponse()
\ No newline at end of file
@@ -42,7 +42,7 @@ class CreateTemplate(Command):
         if not world:
             raise ValueError(f"World '{self.request.world_id}' not found")
         
-        located_entity = world.search_for_entity(entity_id=self.request.entity_id, path=spec.GeneratablePath(path_elements=[]))
+        located_entity = self.datastore.locate_entity(self.request.world_id, self.request.entity_id)
         if not located_entity:
             raise ValueError(f"Entity '{self.request.entity_id}' not found in world '{self.request.world_id}'")
         
@@ -80,7 +80,7 @@ class CreateTemplate(Command):
         )
         
         self.datastore.generation_templates[template.template_id] = template
-        self.datastore.save()
+        self.datastore.save_template(template.template_id)
         return templates_schema.CreateTemplateResponse(
             template_id=template.template_id
         )
@@ -90,18 +90,13 @@ class ListTemplates(Command):
     request: templates_schema.ListTemplatesQuery
     
     def execute(self) -> templates_schema.ListTemplatesResponse:
-        if self.request.entity_type is not None:
-            print("list templates", self.request, [
-                (template.name, template.entity_type, template.entity_type == self.request.entity_type)
-                for template in self.datastore.generation_templates.values()
-            ])
         templates = [
             export.export_template_list_item(template)
-            for template in self.datastore.generation_templates.values()
-            if template.deletion is None
-            if self.request.world_id is None or template.world_id == self.request.world_id
-            if self.request.entity_id is None or template.entity_id == self.request.entity_id
-            if self.request.entity_type is None or template.entity_type == self.request.entity_type
+            for template in self.datastore.find_templates(
+                world_id=self.request.world_id,
+                entity_id=self.request.entity_id,
+                entity_type=self.request.entity_type,
+            )
         ]
         return templates_schema.ListTemplatesResponse(templates=templates)
 
@@ -160,7 +155,7 @@ class UpdateTemplate(Command):
         if self.request.parameter_updates is not None:
             self.request.parameter_updates.apply(template.parameters)
         
-        self.datastore.save()
+        self.datastore.save_template(template.template_id)
         
         return templates_schema.UpdateTemplateResponse()
 
@@ -170,15 +165,12 @@ class GetTemplate(Command):
     template_id: uuid.UUID
 
     def execute(self) -> templates_schema.GetTemplateResponse:
-        template = self.datastore.generation_templates.get(self.template_id, None)
+        template = self.datastore.get_template(self.template_id)
         if not template:
             raise ValueError(f"Template '{self.template_id}' not found")
         
-        world = self.datastore.worlds.get(template.world_id, None)
-        if not world:
-            raise ValueError(f"World '{template.world_id}' not found")
-        
-        exported = export.export_template(template=template, world=world)
+        aggregates = self.datastore.find_world_aggregates(template.world_id)
+        exported = export.export_template(template=template, aggregates=aggregates)
         return templates_schema.GetTemplateResponse(template=exported)
 
 
@@ -198,6 +190,6 @@ class DeleteTemplate(Command):
             date=datetime.datetime.utcnow(),
             deleted_by=self.user
         )
-        self.datastore.save()
+        self.datastore.save_template(template.template_id)
 
         return templates_schema.DeleteTemplateResponse()
@@ -14,6 +14,7 @@ import cairne.model.specification as spec
 import cairne.model.validation as validation
 import cairne.schema.generated as generated_schema
 import cairne.schema.worlds as worlds_schema
+import cairne.serve.conditional as conditional
 from cairne.commands.base import Command
 from cairne.model.world_spec import WORLD
 
@@ -44,8 +45,9 @@ class CreateWorld(Command):
         generated = parsing.parse(context, WORLD, raw=default_world)
         entity = typing.cast(generated_model.GeneratedEntity, generated)
 
-        self.datastore.worlds[entity.entity_id] = entity
-        self.datastore.save()
+        with self.datastore.lock:
+            self.datastore.worlds[entity.entity_id] = entity
+            self.datastore.save_world(entity.entity_id)
 
         logger.info("Number of worlds", number=len(self.datastore.worlds))
 
@@ -59,13 +61,11 @@ class CreateWorld(Command):
 @dataclass
 class ListWorlds(Command):
     def execute(self) -> generated_schema.ListEntitiesResponse:
+        # Served from the index so that no world has to be loaded
         entities = [
-            export.export_generated_entity_item(
-                path=spec.GeneratablePath(path_elements=[]),
-                generated_entity=world,
-            )
-            for world in self.datastore.worlds.values()
-            if world.deletion is None
+            export.export_world_index_entry(entry)
+            for entry in self.datastore.worlds.list_entries()
+            if not entry.deleted
         ]
         response = generated_schema.ListEntitiesResponse(entities=entities)
         return response
@@ -80,14 +80,67 @@ class GetWorld(Command):
         world = self.datastore.worlds.get(world_uuid, None)
         if world is None:
             raise ValueError(f"World not found: {self.world_id}")
-        exported = export.export_generated_entity(
-            world=world,
-            path=spec.GeneratablePath(path_elements=[]),
-            generated_entity=world,
-        )
+        # Read before exporting, so that an export racing an edit is cached under the old version
+        cache_key = (world_uuid, world_uuid, None, self.datastore.get_world_version(world_uuid))
+        exported = self.datastore.export_cache.get(cache_key)
+        if exported is None:
+            exported = export.export_generated_entity(
+                world=world,
+                path=spec.GeneratablePath(path_elements=[]),
+                generated_entity=world,
+            )
+            self.datastore.export_cache.put(cache_key, exported)
         return generated_schema.GetEntityResponse(entity=exported)
 
 
+@dataclass
+class GetWorldChanges(Command):
+    world_id: uuid.UUID
+    query: generated_schema.GetWorldChangesQuery
+
+    def execute(self) -> generated_schema.GetWorldChangesResponse:
+        if self.world_id not in self.datastore.worlds:
+            raise ValueError(f"World not found: {self.world_id}")
+        since = self.query.since
+        if self.query.epoch != conditional.EPOCH:
+            since = -1
+        version, changes = self.datastore.get_world_changes(self.world_id, since)
+        if changes is not None:
+            return generated_schema.GetWorldChangesResponse(
+                epoch=conditional.EPOCH,
+                version=version,
+                changes=[export.export_world_change(change) for change in changes],
+            )
+        # Exported after reading the version, so that changes made meanwhile are sent again on the next poll
+        snapshot = GetWorld(datastore=self.datastore, user=self.user, world_id=self.world_id).execute()
+        return generated_schema.GetWorldChangesResponse(
+            epoch=conditional.EPOCH,
+            version=version,
+            snapshot=snapshot.entity,
+        )
+
+
+@dataclass
+class ValidateWorld(Command):
+    world_id: uuid.UUID
+
+    def execute(self) -> worlds_schema.ValidateWorldResponse:
+        state = self.datastore.start_world_validation(self.world_id)
+        return worlds_schema.ValidateWorldResponse(validation=export.export_world_validation(state))
+
+
+@dataclass
+class GetWorldValidation(Command):
+    world_id: uuid.UUID
+    validation_id: uuid.UUID
+
+    def execute(self) -> worlds_schema.GetWorldValidationResponse:
+        state = self.datastore.get_world_validation(self.validation_id)
+        if state is None or state.world_id != self.world_id:
+            raise ValueError(f"Validation not found: {self.validation_id}")
+        return worlds_schema.GetWorldValidationResponse(validation=export.export_world_validation(state))
+
+
 @dataclass
 class DeleteWorld(Command):
     world_id: uuid.UUID
@@ -95,19 +148,28 @@ class DeleteWorld(Command):
     def execute(self) -> generated_schema.DeleteEntityResponse:
         world_uuid = self.world_id
 
-        deleted_world = self.datastore.worlds.get(world_uuid, None)
-        if deleted_world is None:
-            raise ValueError(f"World not found: {world_uuid}")
+        with self.datastore.lock:
+            deleted_world = self.datastore.worlds.get(world_uuid, None)
+            if deleted_world is None:
+                raise ValueError(f"World not found: {world_uuid}")
 
-        deleted_world.deletion = generated_model.Deletion(
-            date=datetime.datetime.now(),
-            deleted_by=self.user,
-        )
-        self.datastore.save()
+            deleted_world.deletion = generated_model.Deletion(
+                date=datetime.datetime.now(),
+                deleted_by=self.user,
+            )
+            self.datastore.world_changed(world_uuid, spec.GeneratablePath(path_elements=[]))
+            self.datastore.save_world(world_uuid)
 
         return generated_schema.DeleteEntityResponse()
 
 
+@dataclass
+class GetExportCacheStats(Command):
+    def execute(self) -> worlds_schema.GetExportCacheResponse:
+        stats = self.datastore.export_cache.stats()
+        return worlds_schema.GetExportCacheResponse(cache=export.export_export_cache_stats(stats))
+
+
 @dataclass
 class ListEntityTypes(Command):
     def execute(self) -> worlds_schema.ListEntityTypesResponse:
@@ -139,6 +139,11 @@ class GeneratedBase(BaseModel):
     ) -> Optional[LocatedEntity]:
         raise NotImplementedError
 
+    def index_entities(
+        self, path: spec.GeneratablePath, paths: Dict[uuid.UUID, spec.GeneratablePath]
+    ) -> None:
+        raise NotImplementedError
+
     def get(self, path: spec.GeneratablePath, path_index: int) -> "Generated":
         raise NotImplementedError
 
@@ -170,6 +175,11 @@ class GeneratedValue(GeneratedBase):
     ) -> Optional[LocatedEntity]:
         return None
 
+    def index_entities(
+        self, path: spec.GeneratablePath, paths: Dict[uuid.UUID, spec.GeneratablePath]
+    ) -> None:
+        pass
+
     def get(self, path: spec.GeneratablePath, path_index: int) -> "Generated":
         if path_index == len(path.path_elements):
             return self  # type: ignore
@@ -262,6 +272,12 @@ class GeneratedObject(GeneratedBase):
                 return located
         return None
 
+    def index_entities(
+        self, path: spec.GeneratablePath, paths: Dict[uuid.UUID, spec.GeneratablePath]
+    ) -> None:
+        for key, child in self.children.items():
+            child.index_entities(path.append(spec.GeneratablePathElement(key=key)), paths)
+
     def replace_child(
         self, key: spec.GeneratablePathElement, value: "Generated"
     ) -> None:
@@ -308,6 +324,12 @@ class GeneratedList(GeneratedBase):
                 return located
         return None
 
+    def index_entities(
+        self, path: spec.GeneratablePath, paths: Dict[uuid.UUID, spec.GeneratablePath]
+    ) -> None:
+        for index, child in enumerate(self.elements):
+            child.index_entities(path.append(spec.GeneratablePathElement(index=index)), paths)
+
     def get(self, path: spec.GeneratablePath, path_index: int) -> "Generated":
         if path_index == len(path.path_elements):
             return self
@@ -364,6 +386,12 @@ class GeneratedEntity(GeneratedObject):
             return LocatedEntity(entity=self, path=path)
         return super().search_for_entity(entity_id, path)
 
+    def index_entities(
+        self, path: spec.GeneratablePath, paths: Dict[uuid.UUID, spec.GeneratablePath]
+    ) -> None:
+        paths[self.entity_id] = path
+        super().index_entities(path, paths)
+
     def get_name(self) -> Optional[str]:
         name = self.children.get("name", None)
         if name is None:
@@ -400,6 +428,12 @@ class EntityDictionary(GeneratedBase):
                 return located
         return None
 
+    def index_entities(
+        self, path: spec.GeneratablePath, paths: Dict[uuid.UUID, spec.GeneratablePath]
+    ) -> None:
+        for entity_id, entity in self.entities.items():
+            entity.index_entities(path.append(spec.GeneratablePathElement(entity_id=entity_id)), paths)
+
     def get(self, path: spec.GeneratablePath, path_index: int) -> "Generated":
         if path_index == len(path.path_elements):
             return self
@@ -441,6 +475,11 @@ class GeneratedReference(GeneratedBase):
     ) -> Optional[LocatedEntity]:
         return None
 
+    def index_entities(
+        self, path: spec.GeneratablePath, paths: Dict[uuid.UUID, spec.GeneratablePath]
+    ) -> None:
+        pass
+
     def get(self, path: spec.GeneratablePath, path_index: int) -> "Generated":
         if path_index == len(path.path_elements):
             return self
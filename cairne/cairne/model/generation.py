@@ -15,6 +15,8 @@ import cairne.model.generated as generated_model
 import cairne.model.specification as spec
 import cairne.parsing.parse_incomplete_json as parse_incomplete
 import cairne.model.templates as template_model
+import cairne.model.tokens as tokens
+import cairne.openrpg.world_helpers as world_helpers
 from cairne.model.world_spec import WORLD
 import cairne.model.parsing as parsing
 
@@ -46,6 +48,9 @@ class GenerationStatus(str, Enum):
     ERROR = "error"
     COMPLETE = "complete"
 
+    def is_finished(self) -> bool:
+        return self in (GenerationStatus.ERROR, GenerationStatus.COMPLETE)
+
 
 class GenerationStopReason(str, Enum):
     SUCCESS = "success"
@@ -59,6 +64,8 @@ class GenerationStopReason(str, Enum):
 class BaseGenerationResult(BaseModel):
     raw_text: str = Field()
     parsed: Optional[generated_model.Generated] = Field(default=None)
+    # The json values read so far, while the result is still streaming
+    partial: Optional[Dict[str, Any]] = Field(default=None)
 
 
 class OpenAIGenerationResult(BaseGenerationResult):
@@ -93,6 +100,7 @@ class Generation(BaseModel):
     # TODO: maybe remove this, more for a chat...
     prompt_messages: List[GenerationChatMessage] = Field(default=None)
     filled_instructions: List[template_model.FilledInstruction] = Field(default=None)
+    estimated_prompt_tokens: Optional[int] = Field(default=None)
     
     # Not really needed
     json_structure: Optional[template_model.JsonStructure] = Field(default=None)
@@ -100,8 +108,11 @@ class Generation(BaseModel):
     begin_time: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
     end_time: Optional[datetime.datetime] = Field(default=None)
     status: GenerationStatus = Field(default=GenerationStatus.QUEUED)
+    # Higher priorities are scheduled first
+    priority: int = Field(default=0)
     
     result: Optional[GenerateResult] = Field(default=None)
+    stop_reason: Optional[GenerationStopReason] = Field(default=None)
     deletion: Optional[generated_model.Deletion] = Field(default=None)
     
     def as_source(self) -> generated_model.GenerationSource:
@@ -120,13 +131,14 @@ class Generation(BaseModel):
     @staticmethod
     def create(
         template: template_model.GenerationTemplate,
-        world: generated_model.GeneratedEntity,
+        aggregates: world_helpers.WorldAggregates,
         # TODO: need to add the target entity
     ) -> "Generation":
-        specification = WORLD.get(template.target_path, 0)
-        generation_variables = template_model.GenerationVariables.create(world)
-        instruction_templates = template.get_instructions()
-        filled_instructions = generation_variables.fill_instructions(instruction_templates)
+        specification = spec.resolve(WORLD, template.target_path)
+        template_snapshot = template.model_copy(deep=True)
+        max_tokens = template.get_max_tokens()
+        template_snapshot.parameters.max_tokens = max_tokens
+
         generate_json = True
         if generate_json:
             json_schema = template.create_json_schema()
@@ -135,20 +147,25 @@ class Generation(BaseModel):
                 json_schema=json_schema,
                 example_str=json.dumps(json_example),
             )
-            # TODO: This is actually only for openai...
-            filled_instructions.append(
-                template_model.FilledInstruction(
-                    name="json-example",
-                    message=f"Please format your response as JSON. For example:\n{json_example}"
-                )
+            json_instruction: Optional[template_model.FilledInstruction] = (
+                template_model.GenerationTemplate.create_json_instruction(json_example)
             )
         else:
             json_structure = None
+            json_instruction = None
+
+        instructions_budget = template.get_instructions_budget(max_tokens, json_instruction)
+
+        generation_variables = template_model.GenerationVariables.create(aggregates)
+        instruction_templates = template.get_instructions()
+        filled_instructions = generation_variables.fill_instructions_within(instruction_templates, instructions_budget)
+        if json_instruction is not None:
+            filled_instructions.append(json_instruction)
 
         prompt_messages = [
             GenerationChatMessage(
                 role=ChatRole.SYSTEM,
-                message="You are a game developer, skilled in creating engaging, open-world plots full of suspense.",
+                message=template_model.SYSTEM_PROMPT,
             ),
             GenerationChatMessage(
                 role=ChatRole.ASSISTANT,
@@ -161,10 +178,13 @@ class Generation(BaseModel):
                 message=template.additional_prompt,
             ))
         return Generation(
-            template_snapshot=template.model_copy(deep=True),
+            template_snapshot=template_snapshot,
             filled_instructions=filled_instructions,
             json_structure=json_structure,
             prompt_messages=prompt_messages,
+            estimated_prompt_tokens=tokens.count_message_tokens(
+                [message.message for message in prompt_messages]
+            ),
             status=GenerationStatus.QUEUED,
         )
 
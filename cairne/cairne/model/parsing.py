@@ -1,10 +1,11 @@
 
 import json
+import timeit
 import typing
 import uuid
 from contextlib import contextmanager
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union
 
 from pydantic import BaseModel, Field
 from structlog import get_logger
@@ -16,6 +17,11 @@ import cairne.parsing.parse_incomplete_json as parse_incomplete
 logger = get_logger(__name__)
 
 
+Parser = Callable[["ParseContext", Any], generated_model.Generated]
+# The key of a child, its key within the path and the parser for its value
+ChildParser = Tuple[str, str, Parser]
+
+
 # @dataclass
 # class ParseResult:
 #     errors: List[ValidationError]
@@ -113,6 +119,13 @@ def prefixes(s: str) -> List[str]:
     return [s[:i] for i in range(len(s) + 1)]
 
 
+# Checked in this order, so the empty string is true
+TRUE_STRINGS = frozenset(["1"] + prefixes("true") + prefixes("yes"))
+FALSE_STRINGS = frozenset(
+    ["0"] + prefixes("false") + prefixes("no") + prefixes("null") + prefixes("none")
+)
+
+
 def parse_boolean(
     context: ParseContext, specification: spec.ValueSpecification, raw: Any
 ) -> generated_model.GeneratedBoolean:
@@ -120,11 +133,10 @@ def parse_boolean(
     if isinstance(raw, bool):
         normalized = raw
     elif isinstance(raw, str):
-        if raw.lower() in ["1"] + prefixes("true") + prefixes("yes"):
+        lowered = raw.lower()
+        if lowered in TRUE_STRINGS:
             normalized = True
-        elif raw.lower() in ["0"] + prefixes("false") + prefixes("no") + prefixes(
-            "null"
-        ) + prefixes("none"):
+        elif lowered in FALSE_STRINGS:
             normalized = False
 
     return generated_model.GeneratedBoolean(
@@ -170,18 +182,21 @@ def get_child_input(
 
 
 def parse_object(
-    context: ParseContext, specification: spec.ObjectSpecification, raw: Any
+    context: ParseContext,
+    children_parsers: List[ChildParser],
+    entity_type: Optional[spec.EntityType],
+    raw: Any,
 ) -> generated_model.GeneratedObject:
     dict_value = parse_dict(context, raw)
     if dict_value is None:
         dict_value = {}
 
     children: Dict[str, generated_model.Generated] = {}
-    for key, child_spec in specification.children.items():
+    for key, path_key, child_parser in children_parsers:
         child_input = get_child_input(context, dict_value, key)
-        with context.with_path(key=f".{key}"):
-            child = parse(context, child_spec, child_input)
-        children[key] = child
+        context.current_path.append(path_key)
+        children[key] = child_parser(context, child_input)
+        context.current_path.pop()
 
     kwargs = dict(
         metadata=context.create_metadata(),
@@ -192,20 +207,14 @@ def parse_object(
     if "entity_id" in dict_value:
         kwargs["entity_id"] = uuid.UUID(dict_value["entity_id"])
 
-    if specification.parser.parser_name == spec.ParserName.ENTITY:
-        entity_specification = typing.cast(spec.EntitySpecification, specification)
-        kwargs["entity_type"] = entity_specification.entity_type
+    if entity_type is not None:
+        kwargs["entity_type"] = entity_type
         return generated_model.GeneratedEntity(**kwargs)
-    elif specification.parser.parser_name == spec.ParserName.OBJECT:
-        return generated_model.GeneratedObject(**kwargs)
-    else:
-        raise NotImplementedError(
-            f"Unknown parser name: {specification.parser.parser_name}"
-        )
+    return generated_model.GeneratedObject(**kwargs)
 
 
 def parse_entity_dictionary(
-    context: ParseContext, specification: spec.EntityDictionarySpecification, raw: Any
+    context: ParseContext, entity_parser: Parser, raw: Any
 ) -> generated_model.EntityDictionary:
     if raw is None:
         raw = {}
@@ -219,10 +228,8 @@ def parse_entity_dictionary(
     for key, child_input in raw.items():
         entity_uuid = uuid.UUID(key)
 
-        with context.with_path(key=f'["{uuid}"]'):
-            untyped_child = parse(
-                context, specification.entity_specification, child_input
-            )
+        with context.with_path(key=f'["{key}"]'):
+            untyped_child = entity_parser(context, child_input)
             child = typing.cast(generated_model.GeneratedEntity, untyped_child)
         entities[entity_uuid] = child
 
@@ -263,17 +270,15 @@ def parse_js_list(context: ParseContext, raw: Any) -> Optional[List[Any]]:
 
 
 def parse_list(
-    context: ParseContext, specification: spec.ListSpecification, raw: Any
+    context: ParseContext, element_parser: Parser, raw: Any
 ) -> generated_model.GeneratedList:
     parsed = parse_js_list(context, raw)
     if parsed:
         elements = []
         for index, raw_element in enumerate(parsed):
-            with context.with_path(key=f"[{index}]"):
-                element = parse(
-                    context, specification.element_specification, raw_element
-                )
-            elements.append(element)
+            context.current_path.append(f"[{index}]")
+            elements.append(element_parser(context, raw_element))
+            context.current_path.pop()
     else:
         elements = []
 
@@ -286,52 +291,137 @@ def parse_list(
     )
 
 
-def parse(
-    context: ParseContext, specification: spec.GeneratableSpecification, raw: Any
-) -> generated_model.Generated:
-    if specification.parser.parser_name == spec.ParserName.LIST:
+def compile_parser(specification: spec.GeneratableSpecification) -> Parser:
+    parser_name = specification.parser.parser_name
+    if parser_name == spec.ParserName.LIST:
         if not isinstance(specification, spec.ListSpecification):
             raise ValueError(f"Expected ListSpecification, found {specification}")
-        list_spec = typing.cast(spec.ListSpecification, specification)
-        return parse_list(context, list_spec, raw)
-    elif specification.parser.parser_name == spec.ParserName.OBJECT:
+        element_parser = get_parser(specification.element_specification)
+        return lambda context, raw: parse_list(context, element_parser, raw)
+    elif parser_name in (spec.ParserName.OBJECT, spec.ParserName.ENTITY):
         if not isinstance(specification, spec.ObjectSpecification):
             raise ValueError(f"Expected ObjectSpecification, found {specification}")
-        object_spec = typing.cast(spec.ObjectSpecification, specification)
-        return parse_object(context, object_spec, raw)
-    elif specification.parser.parser_name == spec.ParserName.ENTITY:
-        if not isinstance(specification, spec.EntitySpecification):
-            raise ValueError(f"Expected EntitySpecification, found {specification}")
-        entity_spec = typing.cast(spec.EntitySpecification, specification)
-        return parse_object(context, entity_spec, raw)
-    elif specification.parser.parser_name == spec.ParserName.ENTITY_DICTIONARY:
+        entity_type: Optional[spec.EntityType] = None
+        if parser_name == spec.ParserName.ENTITY:
+            if not isinstance(specification, spec.EntitySpecification):
+                raise ValueError(f"Expected EntitySpecification, found {specification}")
+            entity_type = specification.entity_type
+        children_parsers = [
+            (key, f".{key}", get_parser(child_spec))
+            for key, child_spec in specification.children.items()
+        ]
+        return lambda context, raw: parse_object(context, children_parsers, entity_type, raw)
+    elif parser_name == spec.ParserName.ENTITY_DICTIONARY:
         if not isinstance(specification, spec.EntityDictionarySpecification):
             raise ValueError(
                 f"Expected EntityDictionarySpecification, found {specification}"
             )
-        entity_dict_spec = typing.cast(
-            spec.EntityDictionarySpecification, specification
-        )
-        return parse_entity_dictionary(context, entity_dict_spec, raw)
-    elif specification.parser.parser_name == spec.ParserName.STRING:
-        if not isinstance(specification, spec.ValueSpecification):
-            raise ValueError(f"Expected ValueSpecification, found {specification}")
-        str_spec = typing.cast(spec.ValueSpecification, specification)
-        return parse_string(context, str_spec, raw)
-    elif specification.parser.parser_name == spec.ParserName.FLOAT:
-        if not isinstance(specification, spec.ValueSpecification):
-            raise ValueError(f"Expected ValueSpecification, found {specification}")
-        value_spec = typing.cast(spec.ValueSpecification, specification)
-        return parse_float(context, value_spec, raw)
-    elif specification.parser.parser_name == spec.ParserName.INTEGER:
-        if not isinstance(specification, spec.ValueSpecification):
-            raise ValueError(f"Expected ValueSpecification, found {specification}")
-        value_spec = typing.cast(spec.ValueSpecification, specification)
-        return parse_integer(context, value_spec, raw)
-    elif specification.parser.parser_name == spec.ParserName.BOOLEAN:
-        if not isinstance(specification, spec.ValueSpecification):
-            raise ValueError(f"Expected ValueSpecification, found {specification}")
-        value_spec = typing.cast(spec.ValueSpecification, specification)
-        return parse_boolean(context, value_spec, raw)
-    else:
-        raise NotImplementedError()
+        entity_parser = get_parser(specification.entity_specification)
+        return lambda context, raw: parse_entity_dictionary(context, entity_parser, raw)
+
+    value_parser = VALUE_PARSERS.get(parser_name, None)
+    if value_parser is None:
+        raise NotImplementedError(f"Unknown parser name: {parser_name}")
+    if not isinstance(specification, spec.ValueSpecification):
+        raise ValueError(f"Expected ValueSpecification, found {specification}")
+    value_spec = specification
+    return lambda context, raw: value_parser(context, value_spec, raw)
+
+
+VALUE_PARSERS: Dict[spec.ParserName, Callable[[ParseContext, spec.ValueSpecification, Any], generated_model.Generated]] = {
+    spec.ParserName.STRING: parse_string,
+    spec.ParserName.FLOAT: parse_float,
+    spec.ParserName.INTEGER: parse_integer,
+    spec.ParserName.BOOLEAN: parse_boolean,
+}
+
+
+# Specifications are never modified once built, so each is compiled once.
+# The specification is kept alongside its parser so that its id is not reused.
+COMPILED_PARSERS: Dict[int, Tuple[spec.GeneratableSpecification, Parser]] = {}
+
+
+def get_parser(specification: spec.GeneratableSpecification) -> Parser:
+    compiled = COMPILED_PARSERS.get(id(specification), None)
+    if compiled is not None:
+        return compiled[1]
+    parser = compile_parser(specification)
+    COMPILED_PARSERS[id(specification)] = (specification, parser)
+    return parser
+
+
+def parse(
+    context: ParseContext, specification: spec.GeneratableSpecification, raw: Any
+) -> generated_model.Generated:
+    return get_parser(specification)(context, raw)
+
+
+def parse_interpreted(
+    context: ParseContext, specification: spec.GeneratableSpecification, raw: Any
+) -> generated_model.Generated:
+    # Dispatches on the parser name at every node, as parse did before specifications were compiled.
+    # Only the baseline of benchmark_parse.
+    def interpreted(child_specification: spec.GeneratableSpecification) -> Parser:
+        return lambda context, raw: parse_interpreted(context, child_specification, raw)
+
+    parser_name = specification.parser.parser_name
+    if parser_name == spec.ParserName.LIST:
+        list_specification = typing.cast(spec.ListSpecification, specification)
+        return parse_list(context, interpreted(list_specification.element_specification), raw)
+    elif parser_name in (spec.ParserName.OBJECT, spec.ParserName.ENTITY):
+        object_specification = typing.cast(spec.ObjectSpecification, specification)
+        entity_type: Optional[spec.EntityType] = None
+        if parser_name == spec.ParserName.ENTITY:
+            entity_type = typing.cast(spec.EntitySpecification, specification).entity_type
+        children_parsers = [
+            (key, f".{key}", interpreted(child_spec))
+            for key, child_spec in object_specification.children.items()
+        ]
+        return parse_object(context, children_parsers, entity_type, raw)
+    elif parser_name == spec.ParserName.ENTITY_DICTIONARY:
+        dictionary_specification = typing.cast(spec.EntityDictionarySpecification, specification)
+        return parse_entity_dictionary(context, interpreted(dictionary_specification.entity_specification), raw)
+    value_specification = typing.cast(spec.ValueSpecification, specification)
+    return VALUE_PARSERS[parser_name](context, value_specification, raw)
+
+
+def benchmark_parse(number_of_characters: int = 300, repetitions: int = 5) -> None:
+    from cairne.model.world_spec import WORLD
+
+    def parse_dispatched() -> None:
+        parse_interpreted(ParseContext(source=source), WORLD, raw)
+
+    def parse_uncompiled() -> None:
+        COMPILED_PARSERS.clear()
+        parse(ParseContext(source=source), WORLD, raw)
+
+    def parse_compiled() -> None:
+        parse(ParseContext(source=source), WORLD, raw)
+
+    raw = dict(
+        name="world",
+        theme="western",
+        factions=["cowboys", "aliens"],
+        characters={
+            str(uuid.uuid4()): dict(
+                name=f"character {index}",
+                faction="cowboys",
+                age="31",
+                strengths=["aim", "grit", "luck"],
+                weaknesses=["pride"],
+            )
+            for index in range(number_of_characters)
+        },
+    )
+    source = generated_model.GenerationSource(source_type=generated_model.GenerationSourceType.MODEL_CALL)
+    for name, run in (
+        ("dispatched at every node", parse_dispatched),
+        ("compiled every parse", parse_uncompiled),
+        ("compiled once", parse_compiled),
+    ):
+        best = min(timeit.repeat(run, number=1, repeat=repetitions))
+        print(f"{name}: {best * 1000:.1f}ms")
+
+
+if __name__ == "__main__":
+    benchmark_parse()
@@ -13,6 +13,7 @@ from structlog import get_logger
 import string
 
 import cairne.model.calls as calls
+import cairne.model.tokens as tokens
 import cairne.parsing.parse_incomplete_json as parse_incomplete
 
 logger = get_logger(__name__)
@@ -23,6 +24,26 @@ class GeneratablePathElement(BaseModel):
     index: Optional[int] = Field(default=None)
     entity_id: Optional[uuid.UUID] = Field(default=None)
 
+    class Config:
+        frozen = True
+
+    @staticmethod
+    def create(
+        key: Optional[str], index: Optional[int], entity_id: Optional[uuid.UUID]
+    ) -> "GeneratablePathElement":
+        if entity_id is not None:
+            return GeneratablePathElement.model_construct(key=key, index=index, entity_id=entity_id)
+        # Keys and indices repeat across paths, so their elements are shared
+        element = SHARED_PATH_ELEMENTS.get((key, index), None)
+        if element is None:
+            element = GeneratablePathElement.model_construct(key=key, index=index, entity_id=None)
+            SHARED_PATH_ELEMENTS[(key, index)] = element
+        return element
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        # Paths are sent to other processes, this is much smaller than the model's state
+        return (GeneratablePathElement.create, (self.key, self.index, self.entity_id))
+
     def as_str(self) -> str:
         if self.key is not None:
             return f".{self.key}"
@@ -34,8 +55,23 @@ class GeneratablePathElement(BaseModel):
             raise ValueError(f"Invalid path element: {self}")
 
 
+SHARED_PATH_ELEMENTS: Dict[Tuple[Optional[str], Optional[int]], GeneratablePathElement] = {}
+
+
 class GeneratablePath(BaseModel):
-    path_elements: List[GeneratablePathElement] = Field(default_factory=list)
+    # Immutable, so that paths can share their elements and be used as dictionary keys
+    path_elements: Tuple[GeneratablePathElement, ...] = Field(default_factory=tuple)
+
+    class Config:
+        frozen = True
+
+    @staticmethod
+    def create(path_elements: Tuple[GeneratablePathElement, ...]) -> "GeneratablePath":
+        # The elements are already validated, so there is no need to validate them again
+        return GeneratablePath.model_construct(path_elements=path_elements)
+
+    def __reduce__(self) -> Tuple[Any, ...]:
+        return (GeneratablePath.create, (self.path_elements,))
 
     def at(self, index: int) -> GeneratablePathElement:
         if index >= len(self.path_elements):
@@ -47,18 +83,23 @@ class GeneratablePath(BaseModel):
         return self.path_elements[index]
     
     def replace_entity(self, old_entity_id: uuid.UUID, entity_id: uuid.UUID) -> "GeneratablePath":
-        return GeneratablePath(path_elements=[
-            path_element
-            if path_element.entity_id and path_element.entity_id != old_entity_id
-            else GeneratablePathElement(entity_id=entity_id)
-            for path_element in self.model_copy(deep=True).path_elements
-        ])
+        return GeneratablePath.create(tuple(
+            GeneratablePathElement(entity_id=entity_id)
+            if path_element.entity_id == old_entity_id
+            else path_element
+            for path_element in self.path_elements
+        ))
 
     def append(self, element: GeneratablePathElement) -> "GeneratablePath":
-        return GeneratablePath(
-            path_elements=[element.model_copy(deep=True) for element in self.path_elements]
-            + [element]
-        )
+        return GeneratablePath.create(self.path_elements + (element,))
+
+    def starts_with(self, prefix: "GeneratablePath") -> bool:
+        return self.path_elements[: len(prefix.path_elements)] == prefix.path_elements
+
+    def split(self) -> Tuple["GeneratablePath", GeneratablePathElement]:
+        if len(self.path_elements) == 0:
+            raise InvalidPathError(path=self, index=0, message="Cannot split an empty path")
+        return GeneratablePath.create(self.path_elements[:-1]), self.path_elements[-1]
 
     def as_str(self) -> str:
         return "".join([element.as_str() for element in self.path_elements])
@@ -274,6 +315,14 @@ class PredefinedInstruction(BaseModel):
         ]
 
 
+# Used to size completions for values without an expected number of tokens
+LONG_STRING_TOKENS = 96
+SHORT_STRING_TOKENS = 8
+SCALAR_TOKENS = 2
+# For specifications that do not know how large their json is
+UNKNOWN_TOKENS = 32
+
+
 class GenerationSpecification(BaseModel):
     instructions: List[PredefinedInstruction] = Field(default_factory=list)
 
@@ -307,6 +356,17 @@ class GeneratableSpecification(BaseModel):
     def create_example(self) -> Any:
         raise NotImplementedError()
 
+    def estimate_completion_tokens(self) -> int:
+        """
+        Estimates the number of tokens needed to generate the json of the example.
+        """
+        if self.generation.expected_num_tokens is not None:
+            return self.generation.expected_num_tokens
+        return self.estimate_default_tokens()
+
+    def estimate_default_tokens(self) -> int:
+        return UNKNOWN_TOKENS
+
     def get(self, path: GeneratablePath, path_index: int) -> "GeneratableSpecification":
         raise NotImplementedError()
 
@@ -356,6 +416,13 @@ class ValueSpecification(GeneratableSpecification):
         else:
             raise NotImplementedError(f"Unknown parser name: {self.parser.parser_name}")
 
+    def estimate_default_tokens(self) -> int:
+        if self.editor.editor_name == EditorName.LONG_STRING:
+            return LONG_STRING_TOKENS
+        if self.parser.parser_name == ParserName.STRING:
+            return SHORT_STRING_TOKENS
+        return SCALAR_TOKENS
+
     def get(self, path: GeneratablePath, path_index: int) -> "GeneratableSpecification":
         if path_index != len(path.path_elements):
             raise InvalidPathError(
@@ -378,6 +445,13 @@ class ObjectSpecification(GeneratableSpecification):
             example[key] = child.create_example()
         return example
 
+    def estimate_default_tokens(self) -> int:
+        # The braces, and a key and separator for each child
+        return 2 + sum(
+            tokens.count_tokens(json.dumps(key) + ": ") + child.estimate_completion_tokens() + 1
+            for key, child in self.children.items()
+        )
+
     def get(self, path: GeneratablePath, path_index: int) -> "GeneratableSpecification":
         if path_index == len(path.path_elements):
             return self
@@ -417,6 +491,12 @@ class ListSpecification(GeneratableSpecification):
             self.element_specification.create_example() for _ in range(num_examples)
         ]
 
+    def estimate_default_tokens(self) -> int:
+        num_examples = self.generation.num_examples
+        if num_examples is None:
+            num_examples = 2
+        return 2 + num_examples * (self.element_specification.estimate_completion_tokens() + 1)
+
     # @classmethod
     # def create_list_of_strings(cls) -> "ListSpecification":
     # 	return ListSpecification(
@@ -458,6 +538,26 @@ class EntityDictionarySpecification(GeneratableSpecification):
     )
     entity_specification: EntitySpecification
 
+    def create_example(self) -> Any:
+        num_examples = self.generation.num_examples
+        if num_examples is None:
+            num_examples = 2
+        return {
+            str(uuid.uuid4()): self.entity_specification.create_example()
+            for _ in range(num_examples)
+        }
+
+    def estimate_default_tokens(self) -> int:
+        num_examples = self.generation.num_examples
+        if num_examples is None:
+            num_examples = 2
+        # Each entity is keyed by its id
+        return 2 + num_examples * (
+            tokens.count_tokens(json.dumps(str(uuid.UUID(int=0))) + ": ")
+            + self.entity_specification.estimate_completion_tokens()
+            + 1
+        )
+
     def get(self, path: GeneratablePath, path_index: int) -> "GeneratableSpecification":
         if path_index == len(path.path_elements):
             return self
@@ -486,3 +586,29 @@ class ReferenceSpecification(GeneratableSpecification):
             index=path_index,
             message=f"Cannot descend into a reference.",
         )
+
+
+# Which specification a path leads to only depends on the kind of each element,
+# so paths that differ in their list indices or entity ids have the same shape
+PathShape = Tuple[Tuple[Optional[str], bool, bool], ...]
+
+
+def get_path_shape(path: GeneratablePath) -> PathShape:
+    return tuple(
+        (element.key, element.index is not None, element.entity_id is not None)
+        for element in path.path_elements
+    )
+
+
+RESOLVED_SPECIFICATIONS: Dict[Tuple[int, PathShape], Tuple[GeneratableSpecification, GeneratableSpecification]] = {}
+
+
+def resolve(root: GeneratableSpecification, path: GeneratablePath) -> GeneratableSpecification:
+    key = (id(root), get_path_shape(path))
+    resolved = RESOLVED_SPECIFICATIONS.get(key, None)
+    if resolved is not None:
+        return resolved[1]
+    # Invalid paths are not remembered, they raise with the path that was asked for
+    specification = root.get(path, 0)
+    RESOLVED_SPECIFICATIONS[key] = (root, specification)
+    return specification
@@ -2,13 +2,15 @@ import datetime
 import json
 import uuid
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple, Union, Literal, Annotated
+from typing import Any, Callable, Dict, List, Optional, Tuple, Union, Literal, Annotated
 
 from pydantic import BaseModel, Field
 from structlog import get_logger
 
 import cairne.model.generated as generated_model
 import cairne.model.specification as spec
+import cairne.model.tokens as tokens
+import cairne.openrpg.world_helpers as world_helpers
 from cairne.model.world_spec import WORLD
 import typing
 
@@ -18,6 +20,32 @@ import typing
 logger = get_logger(__name__)
 
 
+# The number of tokens each model accepts for the prompt and completion together
+MODEL_CONTEXT_TOKENS: Dict[str, int] = {
+    'gpt-4-1106-preview': 128000,
+    'gpt-4-vision-preview': 128000,
+    'gpt-4': 8192,
+    'gpt-4-0314': 8192,
+    'gpt-4-0613': 8192,
+    'gpt-4-32k': 32768,
+    'gpt-4-32k-0314': 32768,
+    'gpt-4-32k-0613': 32768,
+    'gpt-3.5-turbo': 4096,
+    'gpt-3.5-turbo-16k': 16385,
+    'gpt-3.5-turbo-0301': 4096,
+    'gpt-3.5-turbo-0613': 4096,
+    'gpt-3.5-turbo-1106': 16385,
+    'gpt-3.5-turbo-16k-0613': 16385,
+}
+DEFAULT_CONTEXT_TOKENS = 4096
+SYSTEM_PROMPT = "You are a game developer, skilled in creating engaging, open-world plots full of suspense."
+# Bounds the cost of a prompt, even when the model accepts much more
+MAX_PROMPT_TOKENS = 3072
+# The completion is given room beyond the estimate of the specification
+COMPLETION_TOKENS_HEADROOM = 1.5
+MIN_COMPLETION_TOKENS = 64
+
+
 class GeneratorType(str, Enum):
     OLLAMA = "ollama"
     OPENAI = "openai"
@@ -85,6 +113,9 @@ class GeneratorModel(BaseModel):
     generator_type: GeneratorType = Field()
     g_model_id: str = Field()
 
+    def get_context_tokens(self) -> int:
+        return MODEL_CONTEXT_TOKENS.get(self.g_model_id, DEFAULT_CONTEXT_TOKENS)
+
 
 class GenerationRequestParameters(BaseModel):
     max_tokens: Optional[int] = Field(default=None)
@@ -140,6 +171,10 @@ class FilledInstruction(BaseModel):
 
 class GenerationVariables(BaseModel):
     variables: Dict[str, str] = Field(default_factory=dict)
+    # The variables that list something about the world, which grow with the world.
+    # Each takes as many of its last items as fit within a budget when joined by a separator,
+    # returning them and the number left out.
+    lists: Dict[str, Callable[[str, int], Tuple[List[str], int]]] = Field(default_factory=dict)
 
     def can_evaluate(self, instruction: spec.PredefinedInstruction) -> bool:
         for req in instruction.get_required_variables():
@@ -169,14 +204,73 @@ class GenerationVariables(BaseModel):
             logger.warning(f"Could not fill instructions: {remaining_instructions}")
         return filled_instructions
 
+    def shorten_list(self, name: str, budget: int) -> Optional[str]:
+        take_within = self.lists[name]
+        taken, omitted = take_within(", ", budget)
+        if omitted > 0:
+            # Leaves room for the number of items left out
+            taken, omitted = take_within(", ", budget - tokens.count_tokens(f" and {len(taken) + omitted} more"))
+            if len(taken) == 0:
+                return None
+            return f"{', '.join(taken)} and {omitted} more"
+        return ", ".join(taken)
+
+    def fill_instructions_within(
+        self, unfilled_instructions: List[spec.PredefinedInstruction], budget: int
+    ) -> List[FilledInstruction]:
+        """
+        Fills the instructions, only listing as many of the most recent items of the list variables as fit within the budget.
+        Instructions that do not fit at all are left out.
+        """
+        fixed_instructions: List[spec.PredefinedInstruction] = []
+        listing_instructions: List[spec.PredefinedInstruction] = []
+        for instruction in unfilled_instructions:
+            if any(name in self.lists for name in instruction.get_required_variables()):
+                listing_instructions.append(instruction)
+            else:
+                fixed_instructions.append(instruction)
+
+        filled_by_name = {
+            filled.name: filled for filled in self.fill_instructions(fixed_instructions)
+        }
+        # Each instruction is on its own line
+        remaining = budget - sum(
+            tokens.count_tokens(filled.message) + 1 for filled in filled_by_name.values()
+        )
+        for instruction in listing_instructions:
+            names = [name for name in instruction.get_required_variables() if name in self.lists]
+            if any(req not in self.variables and req not in names for req in instruction.get_required_variables()):
+                logger.warning(f"Could not fill instruction: {instruction}")
+                continue
+            without_lists = instruction.template.format(**dict(self.variables, **{name: "" for name in names}))
+            # Shared between the lists of the instruction
+            list_budget = (remaining - tokens.count_tokens(without_lists) - 1) // len(names)
+            variables = dict(self.variables)
+            for name in names:
+                shortened = self.shorten_list(name, list_budget)
+                if shortened is None:
+                    break
+                variables[name] = shortened
+            else:
+                filled = FilledInstruction.format(instruction, variables)
+                filled_by_name[filled.name] = filled
+                remaining -= tokens.count_tokens(filled.message) + 1
+                continue
+            logger.warning("Instruction does not fit in the prompt", instruction=instruction.name, budget=remaining)
+
+        return [
+            filled_by_name[instruction.name]
+            for instruction in unfilled_instructions
+            if instruction.name in filled_by_name
+        ]
+
     @staticmethod
-    def create(world: generated_model.GeneratedEntity) -> "GenerationVariables":
-        import cairne.openrpg.world_helpers as world_helpers
+    def create(aggregates: world_helpers.WorldAggregates) -> "GenerationVariables":
         import cairne.model.character as character_model
         
         variables: Dict[str, str] = dict(
             possible_factions=", ".join(
-                faction for faction in world_helpers.get_factions(world)
+                faction for faction in aggregates.get_factions()
             ),
             possible_genders=", ".join(
                 gender.value for gender in character_model.Gender
@@ -184,12 +278,14 @@ class GenerationVariables(BaseModel):
             possible_archetypes=", ".join(
                 archetype.value for archetype in character_model.Archetype
             ),
-            existing_characters=world_helpers.describe_existing_characters(world),
         )
-        theme = world_helpers.get_theme(world)
+        lists = dict(
+            existing_characters=aggregates.describe_last_characters,
+        )
+        theme = aggregates.get_theme()
         if theme is not None:
             variables["theme"] = theme
-        character_counts = world_helpers.CharacterCounts.get_character_counts(world)
+        character_counts = aggregates.get_character_counts()
 
         # TODO: when we generate more than one character:
         generation_target = world_helpers.CharacterGenerationTarget(
@@ -199,7 +295,7 @@ class GenerationVariables(BaseModel):
         character_counts.format_count_instructions(generation_target)
         "Do not generate more than what is needed."
 
-        return GenerationVariables(variables=variables)
+        return GenerationVariables(variables=variables, lists=lists)
 
 
 class TargetFields(BaseModel):
@@ -279,19 +375,51 @@ class GenerationTemplate(BaseModel):
         
         old_entity_id = cloned.entity_id
         cloned.entity_id = entity_id
-        cloned.target_path = cloned.target_path.replace_entity(old_entity_id, self.entity_id)
+        cloned.target_path = cloned.target_path.replace_entity(old_entity_id, entity_id)
         return cloned
     
     def get_instructions(self) -> List[spec.PredefinedInstruction]:
-        specification = WORLD.get(self.target_path, 0)
+        specification = spec.resolve(WORLD, self.target_path)
         return [
             instruction
             for instruction in specification.generation.instructions
             if instruction.name not in self.excluded_instruction_names
         ]
 
+    def get_max_tokens(self) -> int:
+        if self.parameters.max_tokens is not None:
+            return self.parameters.max_tokens
+        specification = spec.resolve(WORLD, self.target_path)
+        estimated = int(specification.estimate_completion_tokens() * COMPLETION_TOKENS_HEADROOM)
+        # Leaves at least half of the context for the prompt
+        return min(
+            max(estimated, MIN_COMPLETION_TOKENS),
+            self.generator_model.get_context_tokens() // 2,
+        )
+
+    def get_prompt_budget(self, max_tokens: int) -> int:
+        return min(MAX_PROMPT_TOKENS, self.generator_model.get_context_tokens() - max_tokens)
+
+    @staticmethod
+    def create_json_instruction(json_example: Any) -> FilledInstruction:
+        # TODO: This is actually only for openai...
+        return FilledInstruction(
+            name="json-example",
+            message=f"Please format your response as JSON. For example:\n{json_example}"
+        )
+
+    def get_instructions_budget(self, max_tokens: int, json_instruction: Optional[FilledInstruction]) -> int:
+        # The instructions get what is left of the budget after the messages that do not depend on the world,
+        # and are sent in a message of their own
+        fixed_messages = [SYSTEM_PROMPT, ""]
+        if json_instruction is not None:
+            fixed_messages.append(json_instruction.message)
+        if self.additional_prompt:
+            fixed_messages.append(self.additional_prompt)
+        return self.get_prompt_budget(max_tokens) - tokens.count_message_tokens(fixed_messages)
+
     def create_json_schema(self) -> str:
-        specification = WORLD.get(self.target_path, 0)
+        specification = spec.resolve(WORLD, self.target_path)
         return json.dumps(specification.create_schema(
             [field.path for field in self.fields_to_include]
         ))
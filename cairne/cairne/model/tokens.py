@@ -0,0 +1,64 @@
+import math
+import re
+from typing import Iterable, List, Tuple
+
+
+# Splits text roughly the way the byte pair encoders of the chat models pre-tokenize it:
+# contractions, words with their leading space, up to three digits, punctuation runs and whitespace
+TOKEN_PATTERN = re.compile(
+    r"'(?:[sdmt]|ll|ve|re)| ?[^\W\d_]+| ?\d{1,3}| ?(?:[^\s\w]|_)+|\s+(?!\S)|\s+"
+)
+# Common words are a single token, longer ones are split into pieces of about this many characters
+CHARACTERS_PER_WORD_TOKEN = 6
+CHARACTERS_PER_PUNCTUATION_TOKEN = 2
+# Each chat message is wrapped in a few tokens, and the reply is primed with a few more
+TOKENS_PER_MESSAGE = 4
+TOKENS_PER_REPLY = 3
+
+
+def count_piece_tokens(piece: str) -> int:
+    if not piece.isascii():
+        return len(piece)
+    stripped = piece.strip()
+    if len(stripped) == 0:
+        return 1
+    if stripped[0].isalpha():
+        return math.ceil(len(piece) / CHARACTERS_PER_WORD_TOKEN)
+    if stripped[0].isdigit():
+        return 1
+    return math.ceil(len(stripped) / CHARACTERS_PER_PUNCTUATION_TOKEN)
+
+
+def count_tokens(text: str) -> int:
+    """
+    Estimates the number of tokens in some text without the model's tokenizer.
+    The estimate is on the high side for english, so prompts fit within their budget.
+    """
+    return sum(count_piece_tokens(piece) for piece in TOKEN_PATTERN.findall(text))
+
+
+def count_message_tokens(messages: List[str]) -> int:
+    return sum(count_tokens(message) + TOKENS_PER_MESSAGE for message in messages) + TOKENS_PER_REPLY
+
+
+def take_last_within(
+    reversed_items: Iterable[Tuple[str, int]], number_of_items: int, separator: str, budget: int
+) -> Tuple[List[str], int]:
+    """
+    Takes as many of the last items as fit within the budget once joined by the separator,
+    given the items from last to first along with their number of tokens.
+    Only the items that are taken are read, so this is bounded by the budget rather than the number of items.
+    Returns the items taken, in their original order, and the number of items omitted.
+    """
+    separator_tokens = count_tokens(separator)
+    taken: List[str] = []
+    used = 0
+    for item, item_tokens in reversed_items:
+        if len(taken) > 0:
+            item_tokens += separator_tokens
+        if used + item_tokens > budget:
+            break
+        taken.append(item)
+        used += item_tokens
+    taken.reverse()
+    return taken, number_of_items - len(taken)
@@ -1,11 +1,12 @@
 import datetime
 import json
+import threading
 import typing
 import uuid
 from contextlib import contextmanager
 from dataclasses import dataclass, field
 from enum import Enum
-from typing import Any, Dict, List, Optional, Tuple, Union, Generator
+from typing import Any, Dict, List, Optional, Set, Tuple, Union, Generator
 
 from pydantic import BaseModel, Field
 from structlog import get_logger
@@ -28,6 +29,14 @@ class ValidationContext:
     generated_stack: List[generated_model.GeneratedBase] = field(default_factory=list)
     errors: List[spec.ValidationError] = field(default_factory=list)
     success: bool = field(default=True)
+    # Without one, every node is validated
+    session: Optional["ValidationSession"] = field(default=None)
+    # The options of each one of generated validator's source, by their case folded representation
+    generated_options: Dict[spec.GeneratablePath, Dict[str, str]] = field(default_factory=dict)
+    # The errors of each node that has any, in the order they were found
+    node_errors: List[Tuple[spec.GeneratablePath, List[spec.ValidationError]]] = field(default_factory=list)
+    # The cache node of the node being validated, its children are looked up from it rather than from the root
+    cache_node: Optional["ValidationNode"] = field(default=None)
     # validated?
 
     def create_path(self) -> str:
@@ -57,6 +66,235 @@ class ValidationContext:
     # options: List[Tuple[Any, List[str]]]
 
 
+@dataclass
+class NodeValidation:
+    # Only the errors of the node itself, its children have their own
+    errors: List[spec.ValidationError] = field(default_factory=list)
+    # Whether the node has the type of its specification, otherwise its children are not validated
+    valid_type: bool = field(default=True)
+    # Set when a one of validator replaced the result with the option it matched
+    resolved: bool = field(default=False)
+    result: Any = field(default=None)
+
+
+# Shared by every node without errors, most nodes of a world
+VALID_NODE = NodeValidation()
+
+
+@dataclass
+class SubtreeValidation:
+    # The errors of each node of the subtree that has any, in the order they were found
+    node_errors: List[Tuple[spec.GeneratablePath, List[spec.ValidationError]]] = field(default_factory=list)
+
+
+# Shared by every subtree without errors
+VALID_SUBTREE = SubtreeValidation()
+
+
+@dataclass
+class ValidationNode:
+    validation: Optional[NodeValidation] = field(default=None)
+    # Set while nothing in the subtree was modified since it was validated
+    subtree: Optional[SubtreeValidation] = field(default=None)
+    children: Dict[spec.GeneratablePathElement, "ValidationNode"] = field(default_factory=dict)
+
+
+class ValidationCache:
+    """
+    The validation results of one world, stored in a tree mirroring the paths of the validated nodes.
+    A modification invalidates the modified subtree, its ancestors and the nodes validated against it.
+    Subtrees that were not modified are not walked again, only their errors are.
+    """
+
+    def __init__(self) -> None:
+        self.version = 0
+        # The nodes validated against each of the paths of the world
+        self.dependents: Dict[spec.GeneratablePath, Set[spec.GeneratablePath]] = {}
+        self.generated_options: Dict[spec.GeneratablePath, Dict[str, str]] = {}
+        self._lock = threading.Lock()
+        self._root = ValidationNode()
+
+    def _find(self, path: spec.GeneratablePath) -> Optional[ValidationNode]:
+        node: Optional[ValidationNode] = self._root
+        for element in path.path_elements:
+            node = node.children.get(element, None)
+            if node is None:
+                return None
+        return node
+
+    def _create(self, path: spec.GeneratablePath) -> ValidationNode:
+        node = self._root
+        for element in path.path_elements:
+            child = node.children.get(element, None)
+            if child is None:
+                child = ValidationNode()
+                node.children[element] = child
+            node = child
+        return node
+
+    def _dirty(self, path: spec.GeneratablePath) -> Optional[ValidationNode]:
+        # The subtrees containing the path are no longer clean
+        node = self._root
+        node.subtree = None
+        for element in path.path_elements:
+            child = node.children.get(element, None)
+            if child is None:
+                return None
+            node = child
+            node.subtree = None
+        return node
+
+    def get(
+        self, path: spec.GeneratablePath, version: int
+    ) -> Tuple[Optional[NodeValidation], Optional[SubtreeValidation]]:
+        with self._lock:
+            if version != self.version:
+                return None, None
+            node = self._find(path)
+            if node is None:
+                return None, None
+            return node.validation, node.subtree
+
+    def enter(
+        self, path: spec.GeneratablePath, parent: Optional[ValidationNode], version: int
+    ) -> Tuple[Optional[ValidationNode], Optional[NodeValidation], Optional[SubtreeValidation]]:
+        with self._lock:
+            if version != self.version:
+                return None, None, None
+            if parent is None or len(path.path_elements) == 0:
+                node = self._create(path)
+            else:
+                element = path.path_elements[-1]
+                node = parent.children.get(element, None)
+                if node is None:
+                    node = ValidationNode()
+                    parent.children[element] = node
+            return node, node.validation, node.subtree
+
+    def put(
+        self,
+        path: spec.GeneratablePath,
+        validation: Optional[NodeValidation],
+        dependency_paths: List[spec.GeneratablePath],
+        subtree: Optional[SubtreeValidation],
+        version: int,
+        node: Optional[ValidationNode] = None,
+    ) -> None:
+        with self._lock:
+            # The world was modified while validating
+            if version != self.version:
+                return
+            if node is None:
+                node = self._create(path)
+            if validation is not None:
+                node.validation = validation
+                for dependency_path in dependency_paths:
+                    self.dependents.setdefault(dependency_path, set()).add(path)
+            if subtree is not None:
+                node.subtree = subtree
+
+    def merge(
+        self,
+        subtrees: List[Tuple[spec.GeneratablePath, SubtreeValidation]],
+        dependents: Dict[spec.GeneratablePath, Set[spec.GeneratablePath]],
+        version: int,
+    ) -> None:
+        # Adds the results of validating subtrees of the world elsewhere
+        with self._lock:
+            if version != self.version:
+                return
+            for path, subtree in subtrees:
+                self._create(path).subtree = subtree
+            for dependency_path, paths in dependents.items():
+                self.dependents.setdefault(dependency_path, set()).update(paths)
+
+    def get_options(self, path: spec.GeneratablePath, version: int) -> Optional[Dict[str, str]]:
+        with self._lock:
+            if version != self.version:
+                return None
+            return self.generated_options.get(path, None)
+
+    def put_options(self, path: spec.GeneratablePath, options: Dict[str, str], version: int) -> None:
+        with self._lock:
+            if version != self.version:
+                return
+            self.generated_options[path] = options
+
+    def begin(self) -> "ValidationSession":
+        with self._lock:
+            return ValidationSession(cache=self, version=self.version)
+
+    def invalidate(self, path: spec.GeneratablePath) -> None:
+        with self._lock:
+            self.version += 1
+            for options_path in list(self.generated_options.keys()):
+                if options_path.starts_with(path) or path.starts_with(options_path):
+                    del self.generated_options[options_path]
+            for dependency_path in list(self.dependents.keys()):
+                if not (dependency_path.starts_with(path) or path.starts_with(dependency_path)):
+                    continue
+                # Validated again when next visited, which records them as dependents again
+                for dependent_path in self.dependents.pop(dependency_path):
+                    dependent = self._dirty(dependent_path)
+                    if dependent is not None:
+                        dependent.validation = None
+            node = self._root
+            for element in path.path_elements:
+                # Ancestors are validated again, for example required objects check their children
+                node.validation = None
+                node.subtree = None
+                child = node.children.get(element, None)
+                if child is None:
+                    return
+                node = child
+            node.validation = None
+            node.subtree = None
+            node.children = {}
+
+
+@dataclass
+class ValidationSession:
+    """
+    Reuses the validation results of a single validation, made from the world as of the version it was started at.
+    """
+
+    cache: ValidationCache
+    version: int
+
+    def get(
+        self, path: spec.GeneratablePath
+    ) -> Tuple[Optional[NodeValidation], Optional[SubtreeValidation]]:
+        return self.cache.get(path, self.version)
+
+    def enter(
+        self, path: spec.GeneratablePath, parent: Optional[ValidationNode]
+    ) -> Tuple[Optional[ValidationNode], Optional[NodeValidation], Optional[SubtreeValidation]]:
+        return self.cache.enter(path, parent, self.version)
+
+    def put(
+        self,
+        path: spec.GeneratablePath,
+        validation: Optional[NodeValidation],
+        dependency_paths: List[spec.GeneratablePath],
+        subtree: Optional[SubtreeValidation] = None,
+        node: Optional[ValidationNode] = None,
+    ) -> None:
+        self.cache.put(path, validation, dependency_paths, subtree, self.version, node)
+
+    def merge(
+        self,
+        subtrees: List[Tuple[spec.GeneratablePath, SubtreeValidation]],
+        dependents: Dict[spec.GeneratablePath, Set[spec.GeneratablePath]],
+    ) -> None:
+        self.cache.merge(subtrees, dependents, self.version)
+
+    def get_options(self, path: spec.GeneratablePath) -> Optional[Dict[str, str]]:
+        return self.cache.get_options(path, self.version)
+
+    def put_options(self, path: spec.GeneratablePath, options: Dict[str, str]) -> None:
+        self.cache.put_options(path, options, self.version)
+
+
 # def parse_value(context: ValidationContext, spec: spec.OneOfLiteralValidator, generated: gen.GeneratedValue) -> None:
 #     return None
 
@@ -121,14 +359,28 @@ def validate_required(
         return
 
 
+COMPILED_OPTIONS: Dict[int, Tuple[spec.OneOfLiteralValidator, Dict[str, Any]]] = {}
+
+
+def get_literal_options(specification: spec.OneOfLiteralValidator) -> Dict[str, Any]:
+    compiled = COMPILED_OPTIONS.get(id(specification), None)
+    if compiled is not None:
+        return compiled[1]
+    options: Dict[str, Any] = {}
+    for option, representations in specification.options:
+        for representation in representations:
+            # The first option with a representation wins
+            options.setdefault(representation.casefold(), option)
+    COMPILED_OPTIONS[id(specification)] = (specification, options)
+    return options
+
+
 def find_option(
     specification: spec.OneOfLiteralValidator, parsed: generated_model.GeneratedString
 ) -> Optional[Any]:
-    for option, representations in specification.options:
-        for repr in representations:
-            if repr.lower() == repr.lower():
-                return option
-    return None
+    if parsed.parsed is None:
+        return None
+    return get_literal_options(specification).get(parsed.parsed.casefold(), None)
 
 
 def validate_one_of_literal(
@@ -167,25 +419,50 @@ def validate_one_of_literal(
     )
 
 
+def compile_generated_options(generated_list: generated_model.GeneratedList) -> Dict[str, str]:
+    options: Dict[str, str] = {}
+    for element in generated_list.elements:
+        generated_string = typing.cast(generated_model.GeneratedString, element)
+        if generated_string.parsed is None:
+            continue
+        options.setdefault(generated_string.parsed.casefold(), generated_string.parsed)
+    return options
+
+
+def get_generated_options(
+    context: ValidationContext,
+    path: spec.GeneratablePath,
+    generated_list: generated_model.GeneratedList,
+) -> Dict[str, str]:
+    options = context.generated_options.get(path, None)
+    if options is not None:
+        return options
+    if context.session is not None:
+        options = context.session.get_options(path)
+    if options is None:
+        options = compile_generated_options(generated_list)
+        if context.session is not None:
+            context.session.put_options(path, options)
+    context.generated_options[path] = options
+    return options
+
+
 def validate_one_of_generated_list_of_strings(
     context: ValidationContext,
+    path: spec.GeneratablePath,
     generated_list: generated_model.GeneratedList,
     parsed: generated_model.GeneratedBase,
 ) -> None:
-    possible_values: List[str] = []
-    for element in generated_list.elements:
-        generated_string = typing.cast(generated_model.GeneratedString, element)
-        if generated_string.parsed is None:
-            continue
-        possible_values.append(generated_string.parsed)
     string_to_validate = typing.cast(generated_model.GeneratedString, parsed).parsed
     if string_to_validate is None:
         # This can have its own required validator
         return
-    for possible_value in possible_values:
-        if possible_value.lower() == string_to_validate.lower():
-            parsed.result = possible_value
-            return
+    options = get_generated_options(context, path, generated_list)
+    option = options.get(string_to_validate.casefold(), None)
+    if option is not None:
+        parsed.result = option
+        return
+    possible_values = list(options.values())
     context.add_error(
         spec.ValidationError(
             path=context.create_path(),
@@ -200,7 +477,7 @@ def validate_one_of_generated(
 ) -> None:
     # We need to get this from the world...
     generated_options: generated_model.Generated = context.world.get(specification.path, 0)
-    generated_options_specification = WORLD.get(specification.path, 0)
+    generated_options_specification = spec.resolve(WORLD, specification.path)
 
     if not isinstance(generated_options, generated_model.GeneratedList):
         context.add_error(
@@ -234,6 +511,7 @@ def validate_one_of_generated(
     if element_specification.parser.parser_name == spec.ParserName.STRING:
         validate_one_of_generated_list_of_strings(
             context=context,
+            path=specification.path,
             generated_list=generated_list,
             parsed=parsed,
         )
@@ -253,6 +531,28 @@ def validate_one_of_generated(
         return
 
 
+def get_validator_dependency_paths(specification: spec.GeneratableSpecification) -> List[spec.GeneratablePath]:
+    # The paths of the world that values of this specification are validated against
+    return [
+        typing.cast(spec.OneOfGeneratedValidator, validator).path
+        for validator in specification.validators
+        if isinstance(validator, spec.OneOfGeneratedValidator)
+    ]
+
+
+def get_dependency_paths(specification: spec.GeneratableSpecification) -> List[spec.GeneratablePath]:
+    # The paths of the world that values under this specification are validated against
+    paths = get_validator_dependency_paths(specification)
+    if isinstance(specification, spec.ObjectSpecification):
+        for child_specification in specification.children.values():
+            paths.extend(get_dependency_paths(child_specification))
+    elif isinstance(specification, spec.ListSpecification):
+        paths.extend(get_dependency_paths(specification.element_specification))
+    elif isinstance(specification, spec.EntityDictionarySpecification):
+        paths.extend(get_dependency_paths(specification.entity_specification))
+    return paths
+
+
 def validate_field(
     context: ValidationContext,
     specification: spec.ValidatorSpecification,
@@ -279,12 +579,12 @@ def validate_field(
         raise NotImplementedError()
 
 
-def validate_generated(
+def validate_node(
     context: ValidationContext,
     specification: spec.GeneratableSpecification,
     generatable: generated_model.GeneratedBase,
-):
-    generatable.validation_errors = []
+) -> bool:
+    # Returns whether the node has the type of its specification
     for validator in specification.validators:
         validate_field(context, validator, generatable)
 
@@ -296,8 +596,7 @@ def validate_generated(
                     message=f"expected a value, found {generatable}",
                 )
             )
-            return
-        value = typing.cast(generated_model.GeneratedValue, generatable)
+            return False
     # elif isinstance(specification, spec.EntitySpecification):
     # 	if not isinstance(generatable, gen.GeneratedEntity):
     # 		context.add_error(
@@ -316,7 +615,46 @@ def validate_generated(
                     message=f"expected a dictionary, found {generatable}",
                 )
             )
-            return
+            return False
+    elif isinstance(specification, spec.ListSpecification):
+        if not isinstance(generatable, generated_model.GeneratedList):
+            context.add_error(
+                spec.ValidationError(
+                    path=context.create_path(),
+                    message=f"expected a list, found {generatable}",
+                )
+            )
+            return False
+    elif isinstance(specification, spec.ObjectSpecification):
+        if not isinstance(generatable, generated_model.GeneratedObject):
+            context.add_error(
+                spec.ValidationError(
+                    path=context.create_path(),
+                    message=f"expected an object, found {generatable}",
+                )
+            )
+            return False
+        generated_object = typing.cast(generated_model.GeneratedObject, generatable)
+        for child_key in generated_object.children.keys():
+            if not specification.children.get(child_key, None):
+                context.add_error(
+                    spec.ValidationError(
+                        path=context.create_path(),
+                        message=f"field {child_key} not in the specification",
+                    )
+                )
+    else:
+        logger.error(f"unknown specification {specification}")
+        raise NotImplementedError()
+    return True
+
+
+def validate_children(
+    context: ValidationContext,
+    specification: spec.GeneratableSpecification,
+    generatable: generated_model.GeneratedBase,
+):
+    if isinstance(specification, spec.EntityDictionarySpecification):
         dictionary = typing.cast(generated_model.EntityDictionary, generatable)
         for uuid_key, child_entity in dictionary.entities.items():
             with context.with_path(
@@ -328,14 +666,6 @@ def validate_generated(
                     generatable=child_entity,
                 )
     elif isinstance(specification, spec.ListSpecification):
-        if not isinstance(generatable, generated_model.GeneratedList):
-            context.add_error(
-                spec.ValidationError(
-                    path=context.create_path(),
-                    message=f"expected a list, found {generatable}",
-                )
-            )
-            return
         generated_list = typing.cast(generated_model.GeneratedList, generatable)
         for index, element in enumerate(generated_list.elements):
             with context.with_path(
@@ -347,24 +677,10 @@ def validate_generated(
                     generatable=element,
                 )
     elif isinstance(specification, spec.ObjectSpecification):
-        if not isinstance(generatable, generated_model.GeneratedObject):
-            context.add_error(
-                spec.ValidationError(
-                    path=context.create_path(),
-                    message=f"expected an object, found {generatable}",
-                )
-            )
-            return
         generated_object = typing.cast(generated_model.GeneratedObject, generatable)
         for child_key, child_field in generated_object.children.items():
             child_specification = specification.children.get(child_key, None)
             if not child_specification:
-                context.add_error(
-                    spec.ValidationError(
-                        path=context.create_path(),
-                        message=f"field {child_key} not in the specification",
-                    )
-                )
                 continue
             with context.with_path(
                 spec.GeneratablePathElement(key=child_key), generated=child_field
@@ -374,6 +690,109 @@ def validate_generated(
                     specification=child_specification,
                     generatable=child_field,
                 )
+
+
+def validate_node_once(
+    context: ValidationContext,
+    specification: spec.GeneratableSpecification,
+    generatable: generated_model.GeneratedBase,
+    cached: Optional[NodeValidation],
+) -> Tuple[NodeValidation, bool]:
+    # Validates the node without its children, returning whether it was validated rather than cached
+    generatable.validation_errors = []
+    validated = cached is None
+    if cached is not None:
+        validation = cached
+        for error in validation.errors:
+            context.add_error(error)
+        if validation.resolved:
+            generatable.result = validation.result
     else:
-        logger.error(f"unknown specification {specification}")
-        raise NotImplementedError()
+        number_of_errors = len(context.errors)
+        result = generatable.result
+        valid_type = validate_node(context, specification, generatable)
+        if valid_type and len(context.errors) == number_of_errors and generatable.result is result:
+            validation = VALID_NODE
+        else:
+            validation = NodeValidation(
+                errors=context.errors[number_of_errors:],
+                valid_type=valid_type,
+                resolved=generatable.result is not result,
+                result=generatable.result,
+            )
+    if len(validation.errors) > 0:
+        context.node_errors.append((context.current_path, validation.errors))
+    return validation, validated
+
+
+def validate_own(
+    context: ValidationContext,
+    specification: spec.GeneratableSpecification,
+    generatable: generated_model.GeneratedBase,
+) -> NodeValidation:
+    # Validates the node without its children
+    session = context.session
+    cached = session.get(context.current_path)[0] if session is not None else None
+    validation, validated = validate_node_once(context, specification, generatable, cached)
+    if session is not None and validated:
+        session.put(context.current_path, validation, get_validator_dependency_paths(specification))
+    return validation
+
+
+def replay_subtree(
+    context: ValidationContext,
+    generatable: generated_model.GeneratedBase,
+    subtree: SubtreeValidation,
+) -> None:
+    # Adds the errors of a subtree that was not modified since it was validated, without walking it
+    generatable.validation_errors = []
+    depth = len(context.current_path.path_elements)
+    for path, errors in subtree.node_errors:
+        context.node_errors.append((path, errors))
+        if len(path.path_elements) == depth:
+            for error in errors:
+                context.add_error(error)
+            continue
+        generatable.get(path, depth).validation_errors = list(errors)
+        context.errors.extend(errors)
+        context.success = False
+
+
+def create_subtree_validation(
+    context: ValidationContext, number_of_node_errors: int
+) -> SubtreeValidation:
+    if len(context.node_errors) == number_of_node_errors:
+        return VALID_SUBTREE
+    return SubtreeValidation(node_errors=context.node_errors[number_of_node_errors:])
+
+
+def validate_generated(
+    context: ValidationContext,
+    specification: spec.GeneratableSpecification,
+    generatable: generated_model.GeneratedBase,
+):
+    session = context.session
+    if session is None:
+        validation, _ = validate_node_once(context, specification, generatable, None)
+        if validation.valid_type:
+            validate_children(context, specification, generatable)
+        return
+    parent = context.cache_node
+    node, cached, subtree = session.enter(context.current_path, parent)
+    if subtree is not None:
+        replay_subtree(context, generatable, subtree)
+        return
+    number_of_node_errors = len(context.node_errors)
+    validation, validated = validate_node_once(context, specification, generatable, cached)
+    if validation.valid_type:
+        context.cache_node = node
+        validate_children(context, specification, generatable)
+        context.cache_node = parent
+    if node is not None:
+        session.put(
+            context.current_path,
+            validation if validated else None,
+            get_validator_dependency_paths(specification),
+            create_subtree_validation(context, number_of_node_errors),
+            node,
+        )
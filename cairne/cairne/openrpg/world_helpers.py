@@ -1,6 +1,7 @@
 import datetime
 import json
 import string
+import threading
 import typing
 import uuid
 from contextlib import contextmanager
@@ -14,6 +15,7 @@ from structlog import get_logger
 import cairne.model.calls as calls
 import cairne.model.generated as generated_model
 import cairne.model.specification as spec
+import cairne.model.tokens as tokens
 import cairne.parsing.parse_incomplete_json as parse_incomplete
 
 
@@ -44,29 +46,42 @@ def get_theme(world: generated_model.GeneratedEntity) -> Optional[str]:
     return generated_theme.parsed
 
 
+def describe_character(incomplete: generated_model.GeneratedEntity) -> str:
+    generated_name = typing.cast(
+        generated_model.GeneratedString, incomplete.children["name"]
+    )
+    generated_faction = typing.cast(
+        generated_model.GeneratedString, incomplete.children["faction"]
+    )
+    name = (
+        generated_name.parsed
+        if generated_name.parsed is not None
+        else f"Unnamed character ({incomplete.entity_id})"
+    )
+    if generated_faction.parsed is None:
+        return f"{name} has no faction yet"
+    return f"{name} has faction {generated_faction.parsed}"
+
+
 def describe_existing_characters(world: generated_model.GeneratedEntity) -> str:
-    result = []
     characters_dict = typing.cast(
         generated_model.EntityDictionary, world.children["characters"]
     )
-    for incomplete in characters_dict.entities.values():
-        generated_name = typing.cast(
-            generated_model.GeneratedString, incomplete.children["name"]
-        )
-        generated_faction = typing.cast(
-            generated_model.GeneratedString, incomplete.children["faction"]
-        )
-        name = (
-            generated_name.parsed
-            if generated_name.parsed is not None
-            else f"Unnamed character ({incomplete.entity_id})"
-        )
-        if generated_faction.parsed is None:
-            result.append(f"{name} has no faction yet")
-            continue
+    return ", ".join(
+        describe_character(incomplete) for incomplete in characters_dict.entities.values()
+    )
+
 
-        result.append(f"{name} has faction {generated_faction.parsed}")
-    return ", ".join(result)
+def get_character_faction(incomplete: generated_model.GeneratedEntity) -> Optional[str]:
+    faction = incomplete.children["faction"]
+    if not isinstance(faction, generated_model.GeneratedString):
+        logger.warning(
+            "Unexpected type of faction to be string",
+            type=type(faction),
+            faction=faction,
+        )
+        return None
+    return faction.parsed
 
 
 class CharacterGenerationTarget(BaseModel):
@@ -135,17 +150,120 @@ class CharacterCounts(BaseModel):
                 )
                 continue
             ret.total += 1
-            faction = incomplete.children["faction"]
-            if not isinstance(faction, generated_model.GeneratedString):
-                logger.warning(
-                    "Unexpected type of faction to be string",
-                    type=type(faction),
-                    faction=faction,
-                )
-                continue
-            if faction.parsed is None:
+            faction = get_character_faction(incomplete)
+            if faction is None:
                 continue
-            if faction.parsed not in factions:
+            if faction not in factions:
                 continue
-            ret.per_faction[faction.parsed] += 1
+            ret.per_faction[faction] += 1
         return ret
+
+
+FACTIONS_PATH = spec.GeneratablePath.create((spec.GeneratablePathElement(key="factions"),))
+THEME_PATH = spec.GeneratablePath.create((spec.GeneratablePathElement(key="theme"),))
+CHARACTERS_PATH = spec.GeneratablePath.create((spec.GeneratablePathElement(key="characters"),))
+
+
+@dataclass
+class CharacterSummary:
+    description: str
+    description_tokens: int
+    faction: Optional[str]
+
+
+class WorldAggregates:
+    """
+    The parts of a world that instructions are filled in with, kept up to date as the world is modified.
+    A modified character only updates its own summary, so filling in instructions does not read every character.
+    """
+
+    def __init__(self, world: generated_model.GeneratedEntity):
+        self.world = world
+        self._lock = threading.Lock()
+        self.factions = get_factions(world)
+        self.theme = get_theme(world)
+        # In the order of the characters dictionary, a replaced summary keeps its position
+        self.characters: Dict[uuid.UUID, CharacterSummary] = {}
+        self.faction_counts: Dict[str, int] = {}
+        self.total = 0
+        self._rebuild_characters()
+
+    def _rebuild_characters(self) -> None:
+        self.characters = {}
+        self.faction_counts = {}
+        self.total = 0
+        characters = typing.cast(generated_model.EntityDictionary, self.world.children["characters"])
+        for entity_id, incomplete in characters.entities.items():
+            self._add_character(entity_id, incomplete)
+
+    def _add_character(self, entity_id: uuid.UUID, incomplete: generated_model.GeneratedEntity) -> None:
+        description = describe_character(incomplete)
+        summary = CharacterSummary(
+            description=description,
+            description_tokens=tokens.count_tokens(description),
+            faction=get_character_faction(incomplete),
+        )
+        self.characters[entity_id] = summary
+        self.total += 1
+        if summary.faction is not None:
+            self.faction_counts[summary.faction] = self.faction_counts.get(summary.faction, 0) + 1
+
+    def _remove_character(self, entity_id: uuid.UUID) -> None:
+        summary = self.characters.get(entity_id, None)
+        if summary is None:
+            return
+        self.total -= 1
+        if summary.faction is not None:
+            self.faction_counts[summary.faction] -= 1
+            if self.faction_counts[summary.faction] == 0:
+                del self.faction_counts[summary.faction]
+
+    def _refresh_character(self, entity_id: uuid.UUID) -> None:
+        characters = typing.cast(generated_model.EntityDictionary, self.world.children["characters"])
+        incomplete = characters.entities.get(entity_id, None)
+        self._remove_character(entity_id)
+        if incomplete is None:
+            self.characters.pop(entity_id, None)
+        else:
+            self._add_character(entity_id, incomplete)
+
+    def update(self, path: spec.GeneratablePath) -> None:
+        with self._lock:
+            if FACTIONS_PATH.starts_with(path) or path.starts_with(FACTIONS_PATH):
+                self.factions = get_factions(self.world)
+            if THEME_PATH.starts_with(path) or path.starts_with(THEME_PATH):
+                self.theme = get_theme(self.world)
+            if CHARACTERS_PATH.starts_with(path):
+                self._rebuild_characters()
+            elif path.starts_with(CHARACTERS_PATH) and len(path.path_elements) > 1:
+                entity_id = path.path_elements[1].entity_id
+                if entity_id is not None:
+                    self._refresh_character(entity_id)
+
+    def get_factions(self) -> List[str]:
+        with self._lock:
+            return list(self.factions)
+
+    def get_theme(self) -> Optional[str]:
+        with self._lock:
+            return self.theme
+
+    def describe_last_characters(self, separator: str, budget: int) -> Tuple[List[str], int]:
+        # Only reads the characters that fit, starting from the most recent
+        with self._lock:
+            return tokens.take_last_within(
+                (
+                    (summary.description, summary.description_tokens)
+                    for summary in reversed(self.characters.values())
+                ),
+                len(self.characters),
+                separator,
+                budget,
+            )
+
+    def get_character_counts(self) -> CharacterCounts:
+        with self._lock:
+            return CharacterCounts(
+                total=self.total,
+                per_faction={faction: self.faction_counts.get(faction, 0) for faction in self.factions},
+            )
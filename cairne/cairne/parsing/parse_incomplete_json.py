@@ -1,6 +1,7 @@
+import re
 from dataclasses import dataclass, field
 from enum import Enum, auto
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Tuple, Union
 
 from structlog import get_logger
 
@@ -31,6 +32,8 @@ class StackState:
     state_type: StackStateType
     current_key: Optional[str] = None
     current_value: Union[None, dict, list, float, int, bool] = None
+    # Set between a name separator and the value it names
+    awaiting_value: bool = False
 
 
 @dataclass
@@ -45,6 +48,23 @@ class ParsingContext:
     json_str: str
     position: int = field(default_factory=int)
     parsing_stack: List[StackState] = field(default_factory=list)
+    # The outermost value, filled in as far as the input allows
+    root: Any = None
+    # When more input may be fed, tokens that touch the end of the input are not consumed
+    more_input_expected: bool = False
+    # The decoded pieces of a string whose closing quote has not been read yet
+    partial_string: Optional[List[str]] = None
+    failed: bool = False
+    # Where an unfinished string value was placed, so it can be replaced once it is complete
+    provisional: Optional[Tuple[Union[dict, list], Optional[str]]] = None
+
+    def feed(self, chunk: str) -> None:
+        # Drop the consumed input, so nothing before the position is ever scanned again
+        self.json_str = self.json_str[self.position :] + chunk
+        self.position = 0
+
+    def finish(self) -> None:
+        self.more_input_expected = False
 
     def get_current_object(self) -> Any:
         if (
@@ -70,32 +90,128 @@ class ParsingContext:
             return None
         return self.parsing_stack[-1].current_key
 
-    def add_value(self, value):
+    def add_value(self, value) -> bool:
         if len(self.parsing_stack) == 0:
-            return
+            if self.root is not None:
+                return False
+            self.root = value
+            return True
         if self.parsing_stack[-1].state_type == StackStateType.IN_OBJECT:
+            if self.parsing_stack[-1].current_key is None:
+                return False
             self.parsing_stack[-1].current_value[
                 self.parsing_stack[-1].current_key
             ] = value
+            self.parsing_stack[-1].current_key = None
+            self.parsing_stack[-1].awaiting_value = False
+            return True
         elif self.parsing_stack[-1].state_type == StackStateType.IN_ARRAY:
             self.parsing_stack[-1].current_value.append(value)
+            return True
         else:
+            return False
+
+    def add_provisional_string(self) -> None:
+        if self.partial_string is None or len(self.parsing_stack) == 0:
+            return
+        state = self.parsing_stack[-1]
+        value = "".join(self.partial_string)
+        if state.state_type == StackStateType.IN_OBJECT and state.awaiting_value:
+            state.current_value[state.current_key] = value
+            self.provisional = (state.current_value, state.current_key)
+        elif state.state_type == StackStateType.IN_ARRAY:
+            state.current_value.append(value)
+            self.provisional = (state.current_value, None)
+
+    def remove_provisional_string(self) -> None:
+        if self.provisional is None:
             return
+        container, key = self.provisional
+        if isinstance(container, list):
+            container.pop()
+        else:
+            del container[key]
+        self.provisional = None
 
 
-def parse_string(context: ParsingContext) -> Optional[ParseNextTokenResult]:
-    # TODO: save as much of the string as possible
-    end_quote_pos = context.json_str.find('"', context.position + 1)
-    while end_quote_pos != -1 and context.json_str[end_quote_pos - 1] == "\\":
-        end_quote_pos = context.json_str.find('"', end_quote_pos + 1)
-    if end_quote_pos == -1:
-        # print(f"Could not find end quote for string starting at position {context.position}")
+STRING_RUN = re.compile(r'[^"\\]*')
+
+ESCAPED_CHARACTERS = {
+    '"': '"',
+    "\\": "\\",
+    "/": "/",
+    "b": "\b",
+    "f": "\f",
+    "n": "\n",
+    "r": "\r",
+    "t": "\t",
+}
+
+
+def parse_unicode_escape(json_str: str, position: int) -> Optional[int]:
+    digits = json_str[position + 2 : position + 6]
+    if len(digits) < 4:
         return None
-    ret = ParseNextTokenResult(
-        JsonTokenType.STRING, context.json_str[context.position + 1 : end_quote_pos]
-    )
-    context.position = end_quote_pos + 1
-    return ret
+    try:
+        return int(digits, 16)
+    except ValueError:
+        # Not a valid escape, keep the text as it is
+        return -1
+
+
+def parse_string(context: ParsingContext) -> Optional[ParseNextTokenResult]:
+    if context.partial_string is None:
+        # Skip the opening quote
+        context.position += 1
+        context.partial_string = []
+    pieces = context.partial_string
+    json_str = context.json_str
+    position = context.position
+    while True:
+        # Copy everything up to the next quote or escape at once
+        run_end = STRING_RUN.match(json_str, position).end()  # type: ignore
+        if run_end > position:
+            pieces.append(json_str[position:run_end])
+            position = run_end
+        if position >= len(json_str):
+            break
+        if json_str[position] == '"':
+            context.position = position + 1
+            context.partial_string = None
+            return ParseNextTokenResult(JsonTokenType.STRING, "".join(pieces))
+
+        # An escape, which might not have been completely read yet
+        if position + 1 >= len(json_str):
+            break
+        escaped = json_str[position + 1]
+        if escaped != "u":
+            pieces.append(ESCAPED_CHARACTERS.get(escaped, escaped))
+            position += 2
+            continue
+        code = parse_unicode_escape(json_str, position)
+        if code is None:
+            break
+        if code < 0:
+            pieces.append(json_str[position : position + 6])
+            position += 6
+            continue
+        if 0xD800 <= code < 0xDC00:
+            # A high surrogate, combined with the low surrogate escape that follows it
+            if json_str[position + 6 : position + 8] == "\\u":
+                low = parse_unicode_escape(json_str, position + 6)
+                if low is None:
+                    break
+                if 0xDC00 <= low < 0xE000:
+                    pieces.append(chr(0x10000 + ((code - 0xD800) << 10) + (low - 0xDC00)))
+                    position += 12
+                    continue
+            elif len(json_str) < position + 8 and context.more_input_expected:
+                break
+        pieces.append(chr(code))
+        position += 6
+
+    context.position = position
+    return None
 
 
 def parse_number(context: ParsingContext) -> Optional[ParseNextTokenResult]:
@@ -129,6 +245,9 @@ def parse_number(context: ParsingContext) -> Optional[ParseNextTokenResult]:
             end_pos += 1
         else:
             break
+    if end_pos >= len(context.json_str) and context.more_input_expected:
+        # More digits might follow
+        return None
     if has_exponent and not has_exponent_sign:
         # print(f"Expected sign at position {end_pos}")
         return None
@@ -137,11 +256,11 @@ def parse_number(context: ParsingContext) -> Optional[ParseNextTokenResult]:
         return None
     if has_decimal_point or has_exponent:
         ret = ParseNextTokenResult(
-            JsonTokenType.NUMBER, float(context.json_str[context.position : end_pos])
+            JsonTokenType.NUMBER, number_value=float(context.json_str[context.position : end_pos])
         )
     else:
         ret = ParseNextTokenResult(
-            JsonTokenType.NUMBER, int(context.json_str[context.position : end_pos])
+            JsonTokenType.NUMBER, number_value=int(context.json_str[context.position : end_pos])
         )
     context.position = end_pos
     return ret
@@ -155,7 +274,16 @@ def skip_whitespace(context: ParsingContext):
         context.position += 1
 
 
+LITERALS = {
+    "t": ("true", JsonTokenType.TRUE),
+    "f": ("false", JsonTokenType.FALSE),
+    "n": ("null", JsonTokenType.NULL),
+}
+
+
 def parse_next_json_token(context: ParsingContext) -> Optional[ParseNextTokenResult]:
+    if context.partial_string is not None:
+        return parse_string(context)
     skip_whitespace(context)
     if context.position >= len(context.json_str):
         return None
@@ -182,28 +310,18 @@ def parse_next_json_token(context: ParsingContext) -> Optional[ParseNextTokenRes
         return ParseNextTokenResult(JsonTokenType.VALUE_SEPARATOR)
     elif char == '"':
         return parse_string(context)
-    elif char == "t":
-        if context.json_str[context.position : context.position + 4] == "true":
-            # TODO: still return true if it is the end of the string
-            context.position += 4
-            return ParseNextTokenResult(JsonTokenType.TRUE)
-        else:
-            # print(f"Expected 'true' at position {context.position}")
-            return None
-    elif char == "f":
-        if context.json_str[context.position : context.position + 5] == "false":
-            context.position += 5
-            # TODO: still return false if it is the end of the string
-            return ParseNextTokenResult(JsonTokenType.FALSE)
+    elif char in LITERALS:
+        literal, token_type = LITERALS[char]
+        remaining = context.json_str[context.position : context.position + len(literal)]
+        if remaining == literal:
+            context.position += len(literal)
+            return ParseNextTokenResult(token_type)
+        elif literal.startswith(remaining) and not context.more_input_expected:
+            # The input ends within the literal
+            context.position += len(remaining)
+            return ParseNextTokenResult(token_type)
         else:
-            # print(f"Expected 'false' at position {context.position}")
-            return None
-    elif char == "n":
-        if context.json_str[context.position : context.position + 4] == "null":
-            context.position += 4
-            return ParseNextTokenResult(JsonTokenType.NULL)
-        else:
-            # print(f"Expected 'null' at position {context.position}")
+            # print(f"Expected '{literal}' at position {context.position}")
             return None
     elif char.isdigit() or char == "-":
         return parse_number(context)
@@ -212,69 +330,90 @@ def parse_next_json_token(context: ParsingContext) -> Optional[ParseNextTokenRes
         return None
 
 
-def parse_incomplete_json(context: ParsingContext) -> Optional[Dict[str, Any]]:
+def parse_incomplete_json(context: ParsingContext, include_partial_string: bool = True) -> Any:
+    """
+    Parses as much of the input as possible. The context can be fed more input
+    and parsed again, which continues where the previous call stopped.
+    An unfinished string value is only included if include_partial_string is set.
+    """
+    if context.failed:
+        return None
+    context.remove_provisional_string()
     while True:
         result = parse_next_json_token(context)
         if result is None:
             break
         elif result.json_token_type == JsonTokenType.BEGIN_OBJECT:
-            context.parsing_stack.append(StackState(StackStateType.IN_OBJECT))
+            value: Any = {}
+            if not context.add_value(value):
+                # print(f"Unexpected object at position {context.position}")
+                context.failed = True
+                return None
+            context.parsing_stack.append(StackState(StackStateType.IN_OBJECT, current_value=value))
         elif result.json_token_type == JsonTokenType.END_OBJECT:
             if (
                 len(context.parsing_stack) == 0
                 or context.parsing_stack[-1].state_type != StackStateType.IN_OBJECT
             ):
                 # print(f"Unexpected end of object at position {context.position}")
+                context.failed = True
                 return None
             context.parsing_stack.pop()
         elif result.json_token_type == JsonTokenType.BEGIN_ARRAY:
-            context.parsing_stack.append(StackState(StackStateType.IN_ARRAY))
+            value = []
+            if not context.add_value(value):
+                # print(f"Unexpected array at position {context.position}")
+                context.failed = True
+                return None
+            context.parsing_stack.append(StackState(StackStateType.IN_ARRAY, current_value=value))
         elif result.json_token_type == JsonTokenType.END_ARRAY:
             if (
                 len(context.parsing_stack) == 0
                 or context.parsing_stack[-1].state_type != StackStateType.IN_ARRAY
             ):
                 # print(f"Unexpected end of array at position {context.position}")
+                context.failed = True
                 return None
             context.parsing_stack.pop()
         elif result.json_token_type == JsonTokenType.NAME_SEPARATOR:
-            if (
-                len(context.parsing_stack) == 0
-                or context.parsing_stack[-1].state_type != StackStateType.IN_OBJECT
-            ):
+            if context.get_current_key() is None:
                 # print(f"Unexpected name separator at position {context.position}")
+                context.failed = True
                 return None
+            context.parsing_stack[-1].awaiting_value = True
         elif result.json_token_type == JsonTokenType.VALUE_SEPARATOR:
-            if (
-                len(context.parsing_stack) == 0
-                or context.parsing_stack[-1].state_type != StackStateType.IN_ARRAY
-            ):
+            if len(context.parsing_stack) == 0:
                 # print(f"Unexpected value separator at position {context.position}")
+                context.failed = True
                 return None
             context.parsing_stack[-1].current_key = None
         elif result.json_token_type == JsonTokenType.STRING:
-            if len(context.parsing_stack) == 0:
-                # print(f"Unexpected string at position {context.position}")
-                return None
-            if context.parsing_stack[-1].state_type == StackStateType.IN_OBJECT:
-                context.parsing_stack[-1].current_key = result.string_value
-            elif context.parsing_stack[-1].state_type == StackStateType.IN_ARRAY:
-                context.parsing_stack[-1].current_value.append(result.string_value)
-            else:
+            if (
+                len(context.parsing_stack) > 0
+                and context.parsing_stack[-1].state_type == StackStateType.IN_OBJECT
+                and context.get_current_key() is None
+            ):
+                context.set_key(result.string_value)
+            elif not context.add_value(result.string_value):
                 # print(f"Unexpected string at position {context.position}")
+                context.failed = True
                 return None
-        elif result.json_token_type == JsonTokenType.NUMBER:
-            if len(context.parsing_stack) == 0:
-                # print(f"Unexpected number at position {context.position}")
-                return None
-            if context.parsing_stack[-1].state_type == StackStateType.IN_OBJECT:
-                context.parsing_stack[-1].current_key = result.number_value
-            elif context.parsing_stack[-1].state_type == StackStateType.IN_ARRAY:
-                context.parsing_stack[-1].current_value.append(result.number_value)
+        else:
+            if result.json_token_type == JsonTokenType.NUMBER:
+                value = result.number_value
+            elif result.json_token_type == JsonTokenType.TRUE:
+                value = True
+            elif result.json_token_type == JsonTokenType.FALSE:
+                value = False
             else:
-                # print(f"Unexpected number at position {context.position}")
+                value = None
+            if not context.add_value(value):
+                # print(f"Unexpected value at position {context.position}")
+                context.failed = True
                 return None
-    return context.get_current_object()
+    if include_partial_string:
+        context.add_provisional_string()
+    return context.root
 
 
 def test_tokenizer():
@@ -309,6 +448,30 @@ def test_tokenizer():
     result = parse_next_json_token(context=context)
     assert result is None
 
+    incomplete_json = """{"a": {"b": [1, 2.5, true, null, "c"]}, "d": "e", "f": ["g", "h"""
+    context = ParsingContext(json_str=incomplete_json)
+    result = parse_incomplete_json(context)
+    assert result == {"a": {"b": [1, 2.5, True, None, "c"]}, "d": "e", "f": ["g", "h"]}
+
+    escaped_json = r"""{"a": "say \"hi\" \\", "b": "\u00e9\ud83d\ude00\n"}"""
+    context = ParsingContext(json_str="", more_input_expected=True)
+    snapshots = []
+    for character in escaped_json:
+        context.feed(character)
+        snapshots.append(dict(parse_incomplete_json(context) or {}))
+    context.finish()
+    assert parse_incomplete_json(context) == {"a": 'say "hi" \\', "b": "\u00e9\U0001F600\n"}
+    assert {"a": 'say "h'} in snapshots
+    assert all(snapshot.get("b", "") in ("", "\u00e9", "\u00e9\U0001F600", "\u00e9\U0001F600\n") for snapshot in snapshots)
+
+    context = ParsingContext(json_str="", more_input_expected=True)
+    context.feed("""[12""")
+    assert parse_incomplete_json(context) == []
+    context.feed("""3, tr""")
+    assert parse_incomplete_json(context) == [123]
+    context.finish()
+    assert parse_incomplete_json(context) == [123, True]
+
 
 if __name__ == "__main__":
     # invalid_json = completion.choices[0].message.content
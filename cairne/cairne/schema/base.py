@@ -25,6 +25,7 @@ class Response(BaseModel):
 
 def generate_json_schema():
     import cairne.schema.edits
+    import cairne.schema.events
     import cairne.schema.generate
     import cairne.schema.generated
     import cairne.schema.loaded_models
@@ -32,6 +33,11 @@ def generate_json_schema():
     import cairne.schema.templates
 
     models = [
+        cairne.schema.events.GenerationEvent,
+        cairne.schema.events.ResyncEvent,
+        cairne.schema.events.SubscribeQuery,
+        cairne.schema.events.WorldChangedEvent,
+        cairne.schema.events.WorldValidationEvent,
         cairne.schema.edits.AppendElementRequest,
         cairne.schema.edits.AppendElementResponse,
         cairne.schema.edits.RemoveValueRequest,
@@ -47,12 +53,16 @@ def generate_json_schema():
         cairne.schema.generate.GenerateRequest,
         cairne.schema.generate.GenerateResponse,
         cairne.schema.generate.GenerationListItem,
+        cairne.schema.generate.GenerationQueueView,
         cairne.schema.generate.GenerationView,
+        cairne.schema.generate.GetGenerationQueueResponse,
         cairne.schema.generate.GetGenerationResponse,
         cairne.schema.generate.JsonStructureRequest,
         cairne.schema.generate.ListGenerationModels,
         cairne.schema.generate.ListGenerationsQuery,
         cairne.schema.generate.ListGenerationsResponse,
+        cairne.schema.generate.WaitForGenerationQuery,
+        cairne.schema.generate.WaitForGenerationResponse,
         cairne.schema.generated.CreateEntityRequest,
         cairne.schema.generated.CreateEntityResponse,
         cairne.schema.generated.DeleteEntityRequest,
@@ -65,6 +75,9 @@ def generate_json_schema():
         cairne.schema.generated.GetEntityQuery,
         cairne.schema.generated.GetEntityRequest,
         cairne.schema.generated.GetEntityResponse,
+        cairne.schema.generated.GetWorldChangesQuery,
+        cairne.schema.generated.GetWorldChangesResponse,
+        cairne.schema.generated.ListEntitiesQuery,
         cairne.schema.generated.ListEntitiesRequest,
         cairne.schema.generated.ListEntitiesResponse,
         cairne.schema.generated.NumberToGenerate,
@@ -94,8 +107,14 @@ def generate_json_schema():
         cairne.schema.worlds.CreateWorldRequest,
         cairne.schema.worlds.EntityTypeSummary,
         cairne.schema.worlds.EntityTypeView,
+        cairne.schema.worlds.ExportCacheView,
+        cairne.schema.worlds.GetExportCacheResponse,
+        cairne.schema.worlds.GetWorldValidationResponse,
         cairne.schema.worlds.ListEntityTypesResponse,
+        cairne.schema.worlds.ValidateWorldResponse,
         cairne.schema.worlds.WorldSummary,
+        cairne.schema.worlds.WorldValidationErrorView,
+        cairne.schema.worlds.WorldValidationView,
         
         # cairne.schema.generated.GeneratedValueEditor,
     ]
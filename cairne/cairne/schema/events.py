@@ -0,0 +1,47 @@
+import datetime
+import uuid
+from typing import Any, Dict, Optional
+
+from pydantic import BaseModel, Field
+
+import cairne.model.generation as generation_model
+import cairne.model.specification as spec
+import cairne.schema.worlds as worlds_schema
+
+
+class SubscribeQuery(BaseModel):
+    # Both are optional, without them every event is sent
+    world_id: Optional[uuid.UUID] = Field(default=None)
+    generation_id: Optional[uuid.UUID] = Field(default=None)
+
+
+class GenerationEvent(BaseModel):
+    generation_id: uuid.UUID = Field()
+    world_id: uuid.UUID = Field()
+    version: int = Field()
+    status: generation_model.GenerationStatus = Field()
+    stop_reason: Optional[generation_model.GenerationStopReason] = Field(default=None)
+    partial_json: Optional[Dict[str, Any]] = Field(default=None)
+
+
+class WorldChangedEvent(BaseModel):
+    world_id: uuid.UUID = Field()
+    # Events of a world are coalesced, so clients fetch the changes since the version they have
+    version: int = Field()
+    path: spec.GeneratablePath = Field()
+    entity_id: Optional[uuid.UUID] = Field(default=None)
+    date: datetime.datetime = Field()
+
+
+class WorldValidationEvent(BaseModel):
+    validation_id: uuid.UUID = Field()
+    world_id: uuid.UUID = Field()
+    status: worlds_schema.WorldValidationStatus = Field()
+    completed_partitions: int = Field()
+    number_of_partitions: int = Field()
+    number_of_errors: int = Field()
+
+
+class ResyncEvent(BaseModel):
+    # Sent when the client fell too far behind and events were dropped
+    dropped: int = Field()
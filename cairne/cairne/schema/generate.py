@@ -66,7 +66,9 @@ class GenerationView(BaseModel):
     begin_time: datetime.datetime = Field()
     end_time: Optional[datetime.datetime] = Field()
     status: generation_model.GenerationStatus = Field()
+    stop_reason: Optional[generation_model.GenerationStopReason] = Field(default=None)
     raw_generated_text: Optional[str] = Field()
+    partial_json: Optional[Dict[str, Any]] = Field(default=None)
 
 
 class JsonStructureRequest(BaseModel):
@@ -78,6 +80,7 @@ class JsonStructureRequest(BaseModel):
 class GenerateRequest(BaseModel):
     template_id: uuid.UUID = Field()
     target_entity_id: Optional[uuid.UUID] = Field(default=None)
+    priority: int = Field(default=0)
 
 
 class GenerateResponse(Response):
@@ -92,6 +95,31 @@ class GetGenerationResponse(Response):
     generation: GenerationView = Field()
 
 
+class WaitForGenerationQuery(BaseModel):
+    timeout: float = Field(default=30.0, ge=0.0, le=120.0)
+    # Finished generations are returned too, even when waiting for another status
+    status: generation_model.GenerationStatus = Field(default=generation_model.GenerationStatus.COMPLETE)
+
+
+class WaitForGenerationResponse(Response):
+    generation: GenerationView = Field()
+    timed_out: bool = Field()
+
+
+class GenerationQueueView(BaseModel):
+    queue_depth: int = Field()
+    running: int = Field()
+    number_of_workers: int = Field()
+    running_per_generator_type: Dict[str, int] = Field(default_factory=dict)
+    running_per_model: Dict[str, int] = Field(default_factory=dict)
+    average_wait_seconds: Optional[float] = Field(default=None)
+    longest_wait_seconds: Optional[float] = Field(default=None)
+
+
+class GetGenerationQueueResponse(Response):
+    queue: GenerationQueueView = Field()
+
+
 class CancelGenerationRequest(BaseModel):
     generation_id: uuid.UUID = Field()
 
@@ -129,9 +157,8 @@ class ListGenerationModels(Response):
 
 
 class ListGenerationsQuery(BaseModel):
+    world_id: Optional[uuid.UUID] = None
     entity_id: Optional[uuid.UUID] = None
-    
-    def includes(self, generation: generation_model.Generation) -> bool:
-        if self.entity_id is None:
-            return True
-        return generation.template_snapshot.entity_id == self.entity_id
+    entity_type: Optional[spec.EntityType] = None
+    template_id: Optional[uuid.UUID] = None
+    status: Optional[generation_model.GenerationStatus] = None
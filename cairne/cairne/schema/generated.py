@@ -100,14 +100,32 @@ class GeneratedEntityListItem(BaseModel):
 ###################################################
 
 
+class EntitySortField(str, Enum):
+    NAME = "name"
+    CREATED = "created"
+    UPDATED = "updated"
+
+
+class ListEntitiesQuery(BaseModel):
+    # Without a limit, every entity is returned
+    limit: Optional[int] = Field(default=None, ge=1)
+    cursor: Optional[str] = Field(default=None)
+    sort: EntitySortField = Field(default=EntitySortField.CREATED)
+    descending: bool = Field(default=False)
+    name_prefix: Optional[str] = Field(default=None)
+
+
 class ListEntitiesRequest(BaseModel):
     world_id: uuid.UUID = Field()
     entity_type: spec.EntityType = Field()
     # path: generated_model.GeneratablePath = Field()
+    query: ListEntitiesQuery = Field(default_factory=ListEntitiesQuery)
 
 
 class ListEntitiesResponse(Response):
     entities: List[GeneratedEntityListItem] = Field(default_factory=list)
+    # Passed as the cursor to get the next page, None on the last page
+    next_cursor: Optional[str] = Field(default=None)
 
 
 class GetEntityQuery(BaseModel):
@@ -135,6 +153,28 @@ class GetEntityResponse(Response):
     entity: GeneratedEntity = Field()
 
 
+class GetWorldChangesQuery(BaseModel):
+    since: int = Field(default=0)
+    # Versions restart with the server, so a version is only meaningful with the epoch it was read in.
+    # Without the epoch, or with that of another server, the changes are answered with a snapshot
+    epoch: Optional[str] = Field(default=None)
+
+
+class WorldChangeView(BaseModel):
+    version: int = Field()
+    path: spec.GeneratablePath = Field()
+    entity_id: Optional[uuid.UUID] = Field(default=None)
+    date: datetime.datetime = Field()
+
+
+class GetWorldChangesResponse(Response):
+    epoch: str = Field()
+    version: int = Field()
+    changes: List[WorldChangeView] = Field(default_factory=list)
+    # Only sent when the changes since the requested version are no longer known
+    snapshot: Optional[GeneratedEntity] = Field(default=None)
+
+
 class CreateEntityRequest(BaseModel):
     world_id: uuid.UUID = Field()
     entity_type: spec.EntityType = Field()
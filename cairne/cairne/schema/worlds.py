@@ -1,5 +1,6 @@
 import datetime
 import uuid
+from enum import Enum
 from typing import Any, Dict, List, Optional, Union
 
 from pydantic import BaseModel, Field
@@ -26,6 +27,54 @@ class EntityTypeSummary(BaseModel):
     total_number: int = Field()
 
 
+class ExportCacheView(BaseModel):
+    size: int = Field()
+    capacity: int = Field()
+    hits: int = Field()
+    misses: int = Field()
+    evictions: int = Field()
+    hit_rate: Optional[float] = Field(default=None)
+
+
+class GetExportCacheResponse(Response):
+    cache: ExportCacheView = Field()
+
+
+class WorldValidationStatus(str, Enum):
+    RUNNING = "running"
+    COMPLETE = "complete"
+    FAILED = "failed"
+
+
+class WorldValidationErrorView(BaseModel):
+    path: str = Field()
+    message: str = Field()
+
+
+class WorldValidationView(BaseModel):
+    validation_id: uuid.UUID = Field()
+    world_id: uuid.UUID = Field()
+    status: WorldValidationStatus = Field()
+    started_at: datetime.datetime = Field()
+    finished_at: Optional[datetime.datetime] = Field(default=None)
+    number_of_partitions: int = Field()
+    completed_partitions: int = Field()
+    number_of_entities: int = Field()
+    validated_entities: int = Field()
+    number_of_errors: int = Field()
+    # Only sent once the validation is complete
+    errors: List[WorldValidationErrorView] = Field(default_factory=list)
+    failure: Optional[str] = Field(default=None)
+
+
+class ValidateWorldResponse(Response):
+    validation: WorldValidationView = Field()
+
+
+class GetWorldValidationResponse(Response):
+    validation: WorldValidationView = Field()
+
+
 class WorldSummary(BaseModel):
     id: uuid.UUID = Field(..., description="ID of the world")
     name: str = Field(..., description="Name of the world")
@@ -0,0 +1,104 @@
+import gzip
+import json
+import os
+import threading
+import uuid
+from typing import Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+from cairne.serve.storage import AggregateKind
+
+logger = get_logger(__name__)
+
+
+ARCHIVE_DIR = "archive"
+ARCHIVE_INDEX_FILE = "archive.index.json"
+# Segments are only appended to, a new one is started past this size
+MAX_SEGMENT_BYTES = 16 * 1024 * 1024
+
+
+class ArchiveLocation(BaseModel):
+    segment: str = Field()
+    # Of the compressed batch containing the record
+    offset: int = Field()
+    length: int = Field()
+
+
+class ArchiveIndex(BaseModel):
+    locations: Dict[AggregateKind, Dict[uuid.UUID, ArchiveLocation]] = Field(default_factory=dict)
+    current_segment: int = Field(default=0)
+
+
+class Archive:
+    """
+    Cold storage for records that are no longer kept in the datastore.
+    Every call to append writes one gzip member to the current segment,
+    so a record is read back by decompressing only the batch it was archived with.
+    """
+
+    def __init__(self, root: str):
+        self.directory = os.path.join(root, ARCHIVE_DIR)
+        self.index = ArchiveIndex()
+        self._lock = threading.Lock()
+
+    def load(self) -> None:
+        path = os.path.join(self.directory, ARCHIVE_INDEX_FILE)
+        if os.path.exists(path):
+            with open(path, "r") as f:
+                self.index = ArchiveIndex.model_validate_json(f.read())
+
+    def contains(self, kind: AggregateKind, aggregate_id: uuid.UUID) -> bool:
+        return aggregate_id in self.index.locations.get(kind, {})
+
+    def append(self, records: List[Tuple[AggregateKind, uuid.UUID, str]]) -> None:
+        if len(records) == 0:
+            return
+        lines = [
+            json.dumps({"kind": kind.value, "id": str(aggregate_id), "js": js})
+            for kind, aggregate_id, js in records
+        ]
+        compressed = gzip.compress(("\n".join(lines) + "\n").encode("utf-8"))
+        with self._lock:
+            os.makedirs(self.directory, exist_ok=True)
+            segment = self._get_segment(len(compressed))
+            with open(os.path.join(self.directory, segment), "ab") as f:
+                offset = f.tell()
+                f.write(compressed)
+                f.flush()
+                os.fsync(f.fileno())
+            location = ArchiveLocation(segment=segment, offset=offset, length=len(compressed))
+            for kind, aggregate_id, _ in records:
+                self.index.locations.setdefault(kind, {})[aggregate_id] = location
+            # Only written once the batch is on disk, the caller removes the originals after this
+            self._save_index()
+        logger.info("Archived records", number_of_records=len(records), segment=segment)
+
+    def read(self, kind: AggregateKind, aggregate_id: uuid.UUID) -> Optional[str]:
+        location = self.index.locations.get(kind, {}).get(aggregate_id, None)
+        if location is None:
+            return None
+        with open(os.path.join(self.directory, location.segment), "rb") as f:
+            f.seek(location.offset)
+            compressed = f.read(location.length)
+        for line in gzip.decompress(compressed).decode("utf-8").splitlines():
+            record = json.loads(line)
+            if record["kind"] == kind.value and record["id"] == str(aggregate_id):
+                return record["js"]
+        return None
+
+    def _get_segment(self, number_of_bytes: int) -> str:
+        segment = f"segment-{self.index.current_segment:06d}.jsonl.gz"
+        path = os.path.join(self.directory, segment)
+        if os.path.exists(path) and os.path.getsize(path) + number_of_bytes > MAX_SEGMENT_BYTES:
+            self.index.current_segment += 1
+            segment = f"segment-{self.index.current_segment:06d}.jsonl.gz"
+        return segment
+
+    def _save_index(self) -> None:
+        path = os.path.join(self.directory, ARCHIVE_INDEX_FILE)
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write(self.index.model_dump_json())
+        os.replace(temporary_path, path)
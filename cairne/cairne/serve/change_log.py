@@ -0,0 +1,55 @@
+import datetime
+import itertools
+import uuid
+from collections import deque
+from dataclasses import dataclass, field
+from typing import Deque, List, Optional
+
+import cairne.model.specification as spec
+
+
+# Clients further behind than this many changes are sent a snapshot instead
+MAX_CHANGES_PER_WORLD = 500
+
+
+@dataclass
+class WorldChange:
+    version: int
+    path: spec.GeneratablePath
+    # The innermost entity containing the path
+    entity_id: Optional[uuid.UUID]
+    date: datetime.datetime = field(default_factory=datetime.datetime.utcnow)
+
+    @staticmethod
+    def create(version: int, path: spec.GeneratablePath) -> "WorldChange":
+        entity_id = None
+        for element in reversed(path.path_elements):
+            if element.entity_id is not None:
+                entity_id = element.entity_id
+                break
+        return WorldChange(version=version, path=path, entity_id=entity_id)
+
+
+class WorldChangeLog:
+    """
+    The most recent changes of a world, in version order.
+    Not thread safe, it is only used under the datastore's lock.
+    """
+
+    def __init__(self, capacity: int = MAX_CHANGES_PER_WORLD):
+        self.changes: Deque[WorldChange] = deque(maxlen=capacity)
+
+    def append(self, change: WorldChange) -> None:
+        self.changes.append(change)
+
+    def since(self, version: int, current_version: int) -> Optional[List[WorldChange]]:
+        # None when some of the changes after the version are no longer kept
+        if version > current_version:
+            return None
+        if version == current_version:
+            return []
+        if len(self.changes) == 0 or self.changes[0].version > version + 1:
+            return None
+        # Versions are consecutive
+        start = version + 1 - self.changes[0].version
+        return list(itertools.islice(self.changes, start, None))
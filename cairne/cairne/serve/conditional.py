@@ -0,0 +1,55 @@
+import functools
+import uuid
+from typing import Any, Callable, Dict, Optional
+
+from flask import Response, make_response, request
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+
+# Versions restart from zero with the process, so tags of earlier processes must not match
+EPOCH = uuid.uuid4().hex[:12]
+
+
+def make_etag(*parts: Any) -> str:
+    return "-".join([EPOCH] + [str(part) for part in parts])
+
+
+def parse_uuid(value: Optional[str]) -> Optional[uuid.UUID]:
+    if value is None:
+        return None
+    try:
+        return uuid.UUID(value)
+    except ValueError:
+        return None
+
+
+def conditional(get_etag: Callable[[Dict[str, Any], Dict[str, str]], Optional[str]]) -> Callable:
+    """
+    Answers GET requests with 304 Not Modified when the client already has the current version.
+    The tag is computed from the raw view and query arguments, before the request is validated.
+    It is computed before the view runs, so a modification made while it runs is only seen on the next request.
+    """
+
+    def decorator(view: Callable) -> Callable:
+        @functools.wraps(view)
+        def wrapper(*args: Any, **kwargs: Any) -> Any:
+            if request.method != "GET":
+                return view(*args, **kwargs)
+            etag = get_etag(request.view_args or {}, request.args.to_dict())
+            if etag is None:
+                # Unknown aggregates, the view reports the error
+                return view(*args, **kwargs)
+            if request.if_none_match.contains(etag):
+                not_modified = Response(status=304)
+                not_modified.set_etag(etag)
+                return not_modified
+            response = make_response(view(*args, **kwargs))
+            if response.status_code == 200:
+                response.set_etag(etag)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -1,45 +1,674 @@
+import datetime
 import json
+import os
+import time
 import uuid
 from dataclasses import dataclass, field
-from typing import Any, Dict, List, Optional, Union
+from typing import Any, Dict, List, Optional, Set, Tuple, Union
 
 from pydantic import BaseModel, Field
 from structlog import get_logger
 
 import threading
 import cairne.model.generated as generated_model
+import cairne.model.specification as spec
 import cairne.model.generation as generate_model
 import cairne.model.templates as template_model
+import cairne.model.validation as validation
+import cairne.openrpg.world_helpers as world_helpers
+import cairne.schema.events as events_schema
+import cairne.schema.generated as generated_schema
+import cairne.schema.worlds as worlds_schema
+import cairne.serve.archive as archive_module
+import cairne.serve.change_log as change_log_module
+import cairne.serve.entity_index as entity_index_module
+import cairne.serve.entity_listing as entity_listing_module
+import cairne.serve.export_cache as export_cache_module
+import cairne.serve.export_memo as export_memo_module
+import cairne.serve.journal as journal_module
+import cairne.serve.push as push_module
+import cairne.serve.secondary_index as secondary_index
+import cairne.serve.scheduler as scheduler_module
+import cairne.serve.storage as storage_module
+import cairne.serve.world_cache as world_cache
+import cairne.serve.world_validation as world_validation_module
+from cairne.serve.storage import AggregateKind
+from cairne.model.world_spec import WORLD
 
 
 logger = get_logger()
 
 
+# The original single file format, only read to migrate into the sharded storage
 SAVE_PATH = "output/datastore.json"
 
+COMPACTION_INTERVAL_SECONDS = 30.0
+COMPACTION_MAX_RECORDS = 1000
+
+WORLD_INDEX_FILE = "worlds.index.json"
+
+# Finished generations older than this, and deleted worlds and templates, are moved to the archive
+GENERATION_RETENTION = datetime.timedelta(days=30)
+ARCHIVE_INTERVAL_SECONDS = 3600.0
+# Older finished validations are forgotten
+MAX_WORLD_VALIDATIONS = 64
+
+
+class WorldSnapshot(BaseModel):
+    # The last journal record already contained in this snapshot
+    journal_sequence: int = Field(default=0)
+    world: generated_model.GeneratedEntity = Field()
+
+
+def create_template_index() -> secondary_index.SecondaryIndex[template_model.GenerationTemplate]:
+    return secondary_index.SecondaryIndex({
+        "world_id": lambda template: template.world_id,
+        "entity_id": lambda template: template.entity_id,
+        "entity_type": lambda template: template.entity_type,
+    })
+
+
+def create_generation_index() -> secondary_index.SecondaryIndex[generate_model.Generation]:
+    return secondary_index.SecondaryIndex({
+        "world_id": lambda generation: generation.template_snapshot.world_id,
+        "entity_id": lambda generation: generation.template_snapshot.entity_id,
+        "entity_type": lambda generation: generation.template_snapshot.entity_type,
+        "template_id": lambda generation: generation.template_snapshot.template_id,
+        "status": lambda generation: generation.status,
+    })
+
+
+class LegacyDatastore(BaseModel):
+    worlds: Dict[uuid.UUID, generated_model.GeneratedEntity] = Field(default_factory=dict)
+    generation_templates: Dict[uuid.UUID, template_model.GenerationTemplate] = Field(default_factory=dict)
+    generations: Dict[uuid.UUID, generate_model.Generation] = Field(default_factory=dict)
 
 
 class Datastore(BaseModel):
-    worlds: Dict[uuid.UUID, generated_model.GeneratedEntity] = Field(
-        default_factory=dict
-    )
+    # Filled in after construction, it needs to call back into the datastore
+    worlds: world_cache.WorldCache = Field(default=None, exclude=True)  # type: ignore
     generation_templates: Dict[uuid.UUID, template_model.GenerationTemplate] = Field(default_factory=dict)
     generations: Dict[uuid.UUID, generate_model.Generation] = Field(default_factory=dict)
-    
+
     generation_threads: Dict[uuid.UUID, threading.Thread] = Field(default_factory=dict, exclude=True)
+    scheduler: scheduler_module.GenerationScheduler = Field(
+        default_factory=scheduler_module.GenerationScheduler, exclude=True
+    )
+    storage: storage_module.ShardedStorage = Field(
+        default_factory=storage_module.ShardedStorage, exclude=True
+    )
+    journal: Optional[journal_module.EditJournal] = Field(default=None, exclude=True)
+    archive: Optional[archive_module.Archive] = Field(default=None, exclude=True)
+    journal_sequences: Dict[uuid.UUID, int] = Field(default_factory=dict, exclude=True)
+    dirty_worlds: Set[uuid.UUID] = Field(default_factory=set, exclude=True)
+    entity_indexes: Dict[uuid.UUID, entity_index_module.EntityIndex] = Field(default_factory=dict, exclude=True)
+    entity_listings: Dict[uuid.UUID, entity_listing_module.EntityListings] = Field(default_factory=dict, exclude=True)
+    world_aggregates: Dict[uuid.UUID, world_helpers.WorldAggregates] = Field(default_factory=dict, exclude=True)
+    # Bumped by every modification, kept across evictions so that versions are never reused
+    world_versions: Dict[uuid.UUID, int] = Field(default_factory=dict, exclude=True)
+    change_logs: Dict[uuid.UUID, change_log_module.WorldChangeLog] = Field(default_factory=dict, exclude=True)
+    generation_updated: threading.Condition = Field(default_factory=threading.Condition, exclude=True)
+    push_hub: push_module.PushHub = Field(default_factory=push_module.PushHub, exclude=True)
+    # Deleted templates and generations are not indexed
+    template_index: secondary_index.SecondaryIndex = Field(default_factory=create_template_index, exclude=True)
+    generation_index: secondary_index.SecondaryIndex = Field(default_factory=create_generation_index, exclude=True)
+    template_versions: Dict[uuid.UUID, int] = Field(default_factory=dict, exclude=True)
+    generation_versions: Dict[uuid.UUID, int] = Field(default_factory=dict, exclude=True)
+    export_cache: export_cache_module.ExportCache = Field(
+        default_factory=export_cache_module.ExportCache, exclude=True
+    )
+    export_memos: Dict[uuid.UUID, export_memo_module.SubtreeExportMemo] = Field(default_factory=dict, exclude=True)
+    validation_caches: Dict[uuid.UUID, validation.ValidationCache] = Field(default_factory=dict, exclude=True)
+    world_validations: Dict[uuid.UUID, world_validation_module.WorldValidation] = Field(default_factory=dict, exclude=True)
+    lock: Any = Field(default_factory=threading.RLock, exclude=True)
+    compaction_requested: threading.Event = Field(default_factory=threading.Event, exclude=True)
+
+    def model_post_init(self, __context: Any) -> None:
+        if self.worlds is None:
+            self.worlds = world_cache.WorldCache(
+                index=world_cache.WorldIndex(),
+                load_world=self.load_world,
+                evict_world=self.evict_world,
+                lock=self.lock,
+                capacity=world_cache.MAX_RESIDENT_WORLDS,
+            )
 
     @staticmethod
     def load() -> "Datastore":
+        storage = storage_module.ShardedStorage()
+        if not storage.exists() and os.path.exists(SAVE_PATH):
+            datastore = Datastore.migrate(storage)
+        else:
+            storage.initialize()
+            datastore = Datastore(storage=storage)
+            datastore.load_world_index()
+            for template_id, js in storage.read_all(AggregateKind.TEMPLATE):
+                datastore.generation_templates[template_id] = template_model.GenerationTemplate.model_validate_json(js)
+            for generation_id, js in storage.read_all(AggregateKind.GENERATION):
+                datastore.generations[generation_id] = generate_model.Generation.model_validate_json(js)
+            datastore.build_secondary_indexes()
+
+        datastore.archive = archive_module.Archive(storage.root)
+        datastore.archive.load()
+        datastore.journal = journal_module.EditJournal(storage.root)
+        datastore.replay_journal()
+        return datastore
+
+    @staticmethod
+    def migrate(storage: storage_module.ShardedStorage) -> "Datastore":
+        logger.info("Migrating single file datastore", source=SAVE_PATH, destination=storage.root)
         with open(SAVE_PATH, "r") as f:
             js = f.read()
-        datastore = Datastore.model_validate_json(js)
+        legacy = LegacyDatastore.model_validate_json(js)
+        storage.initialize()
+        datastore = Datastore(
+            storage=storage,
+            generation_templates=legacy.generation_templates,
+            generations=legacy.generations,
+        )
+        for world_id, world in legacy.worlds.items():
+            datastore.worlds[world_id] = world
+            datastore.save_world(world_id)
+        for template_id in datastore.generation_templates:
+            datastore.save_template(template_id)
+        for generation_id in datastore.generations:
+            datastore.save_generation(generation_id)
+        # Keep the original around, but make sure it is not migrated twice
+        os.replace(SAVE_PATH, SAVE_PATH + ".migrated")
         return datastore
 
-    def save(self):
-        js = self.model_dump_json(indent=2)
-        with open(SAVE_PATH, "w") as f:
-            f.write(js)
-    
-    
+    def load_world_index(self) -> None:
+        js = self.storage.read_file(WORLD_INDEX_FILE)
+        if js is not None:
+            self.worlds.index = world_cache.WorldIndex.model_validate_json(js)
+        # Shards written without making it into the index, for example before a crash
+        missing_ids = [
+            world_id
+            for world_id in self.storage.list_ids(AggregateKind.WORLD)
+            if world_id not in self.worlds.index.entries
+        ]
+        if len(missing_ids) == 0:
+            return
+        logger.info("Indexing worlds", number_of_worlds=len(missing_ids))
+        for world_id in missing_ids:
+            world = self.load_world(world_id)
+            if world is None:
+                continue
+            self.worlds.index.entries[world_id] = world_cache.WorldIndexEntry.create(world)
+        self.save_world_index()
+
+    def build_secondary_indexes(self) -> None:
+        for template_id, template in self.generation_templates.items():
+            self.template_index.update(template_id, template if template.deletion is None else None)
+        for generation_id, generation in self.generations.items():
+            self.generation_index.update(generation_id, generation if generation.deletion is None else None)
+
+    def find_templates(self, **criteria: Any) -> List[template_model.GenerationTemplate]:
+        with self.lock:
+            return [self.generation_templates[template_id] for template_id in self.template_index.find(**criteria)]
+
+    def find_generations(self, **criteria: Any) -> List[generate_model.Generation]:
+        with self.lock:
+            return [self.generations[generation_id] for generation_id in self.generation_index.find(**criteria)]
+
+    def save_world_index(self) -> None:
+        with self.lock:
+            js = self.worlds.index.model_dump_json()
+            self.worlds.index_modified = False
+        self.storage.write_file(WORLD_INDEX_FILE, js)
+
+    def load_world(self, world_id: uuid.UUID) -> Optional[generated_model.GeneratedEntity]:
+        js = self.storage.read(AggregateKind.WORLD, world_id)
+        if js is None:
+            return None
+        snapshot = WorldSnapshot.model_validate_json(js)
+        self.journal_sequences[world_id] = snapshot.journal_sequence
+        return snapshot.world
+
+    def evict_world(self, world_id: uuid.UUID) -> None:
+        if world_id in self.dirty_worlds:
+            self.save_world(world_id)
+        self.entity_indexes.pop(world_id, None)
+        self.entity_listings.pop(world_id, None)
+        self.world_aggregates.pop(world_id, None)
+        self.export_memos.pop(world_id, None)
+        self.validation_caches.pop(world_id, None)
+
+    def get_entity_index(self, world_id: uuid.UUID) -> entity_index_module.EntityIndex:
+        with self.lock:
+            world = self.worlds.get(world_id, None)
+            if world is None:
+                raise ValueError(f"World not found: {world_id}")
+            index = self.entity_indexes.get(world_id, None)
+            # Rebuilt when the world was reloaded or replaced
+            if index is None or index.world is not world:
+                index = entity_index_module.EntityIndex(world)
+                self.entity_indexes[world_id] = index
+            return index
+
+    def list_entities(
+        self, world_id: uuid.UUID, entity_type: spec.EntityType, query: generated_schema.ListEntitiesQuery
+    ) -> Tuple[List[entity_listing_module.EntityListEntry], Optional[str]]:
+        with self.lock:
+            world = self.worlds.get(world_id, None)
+            if world is None:
+                raise ValueError(f"World not found: {world_id}")
+            listings = self.entity_listings.get(world_id, None)
+            if listings is None or listings.world is not world:
+                listings = entity_listing_module.EntityListings(world)
+                self.entity_listings[world_id] = listings
+            return listings.get(entity_type).page(
+                sort_field=query.sort,
+                descending=query.descending,
+                cursor=query.cursor,
+                name_prefix=query.name_prefix,
+                limit=query.limit,
+            )
+
+    def get_world_aggregates(self, world_id: uuid.UUID) -> world_helpers.WorldAggregates:
+        aggregates = self.find_world_aggregates(world_id)
+        if aggregates is None:
+            raise ValueError(f"World not found: {world_id}")
+        return aggregates
+
+    def find_world_aggregates(self, world_id: uuid.UUID) -> Optional[world_helpers.WorldAggregates]:
+        with self.lock:
+            world = self.worlds.get(world_id, None)
+            if world is None:
+                return None
+            aggregates = self.world_aggregates.get(world_id, None)
+            if aggregates is None or aggregates.world is not world:
+                aggregates = world_helpers.WorldAggregates(world)
+                self.world_aggregates[world_id] = aggregates
+            return aggregates
+
+    def locate_entity(
+        self, world_id: uuid.UUID, entity_id: uuid.UUID
+    ) -> Optional[generated_model.LocatedEntity]:
+        with self.lock:
+            index = self.get_entity_index(world_id)
+            return index.locate(index.world, entity_id)
+
+    def get_world_version(self, world_id: uuid.UUID) -> int:
+        with self.lock:
+            return self.world_versions.get(world_id, 0)
+
+    def get_world_changes(
+        self, world_id: uuid.UUID, since: int
+    ) -> Tuple[int, Optional[List[change_log_module.WorldChange]]]:
+        with self.lock:
+            version = self.world_versions.get(world_id, 0)
+            change_log = self.change_logs.get(world_id, None)
+            if change_log is None:
+                return version, [] if since == version else None
+            return version, change_log.since(since, version)
+
+    def get_template_version(self, template_id: uuid.UUID) -> int:
+        with self.lock:
+            return self.template_versions.get(template_id, 0)
+
+    def get_generation_version(self, generation_id: uuid.UUID) -> int:
+        with self.lock:
+            return self.generation_versions.get(generation_id, 0)
+
+    def template_changed(self, template_id: uuid.UUID) -> None:
+        with self.lock:
+            self.template_versions[template_id] = self.template_versions.get(template_id, 0) + 1
+            template = self.generation_templates.get(template_id, None)
+            if template is not None and template.deletion is not None:
+                template = None
+            self.template_index.update(template_id, template)
+
+    def generation_changed(self, generation_id: uuid.UUID) -> None:
+        """
+        Called after a generation has been modified, including by its generation thread.
+        """
+        with self.lock:
+            version = self.generation_versions.get(generation_id, 0) + 1
+            self.generation_versions[generation_id] = version
+            with self.generation_updated:
+                self.generation_updated.notify_all()
+            generation = self.generations.get(generation_id, None)
+            self.generation_index.update(
+                generation_id, generation if generation is not None and generation.deletion is None else None
+            )
+            if generation is None or not self.push_hub.has_subscribers():
+                return
+            event = events_schema.GenerationEvent(
+                generation_id=generation_id,
+                world_id=generation.template_snapshot.world_id,
+                version=version,
+                status=generation.status,
+                stop_reason=generation.stop_reason,
+                partial_json=generation.result.partial if generation.result is not None else None,
+            )
+            self.push_hub.publish(push_module.PushEvent(
+                event="generation",
+                key=f"generation:{generation_id}",
+                data=event.model_dump_json(),
+                world_id=event.world_id,
+                generation_id=generation_id,
+            ))
+
+    def wait_for_generation(
+        self,
+        generation_id: uuid.UUID,
+        status: generate_model.GenerationStatus,
+        timeout: float,
+    ) -> Tuple[generate_model.Generation, bool]:
+        """
+        Blocks until the generation reaches the status or finishes, returns whether it timed out.
+        """
+        deadline = time.monotonic() + timeout
+        with self.generation_updated:
+            while True:
+                generation = self.generations.get(generation_id, None)
+                if generation is None:
+                    raise ValueError(f"Generation not found: {generation_id}")
+                if generation.status == status or generation.status.is_finished():
+                    return generation, False
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return generation, True
+                self.generation_updated.wait(remaining)
+
+    def begin_export(self, world_id: uuid.UUID) -> export_memo_module.ExportSession:
+        with self.lock:
+            memo = self.export_memos.get(world_id, None)
+            if memo is None:
+                memo = export_memo_module.SubtreeExportMemo(validation.get_dependency_paths(WORLD))
+                self.export_memos[world_id] = memo
+            return memo.begin()
+
+    def begin_validation(self, world_id: uuid.UUID) -> validation.ValidationSession:
+        with self.lock:
+            cache = self.validation_caches.get(world_id, None)
+            if cache is None:
+                cache = validation.ValidationCache()
+                self.validation_caches[world_id] = cache
+            return cache.begin()
+
+    def start_world_validation(self, world_id: uuid.UUID) -> world_validation_module.WorldValidation:
+        with self.lock:
+            world = self.worlds.get(world_id, None)
+            if world is None:
+                raise ValueError(f"World not found: {world_id}")
+            session = self.begin_validation(world_id)
+            # Copied while locked, the validation itself runs without the lock
+            world = world.model_copy(deep=True)
+            state = world_validation_module.WorldValidation(world_id=world_id)
+            finished = [
+                validation_id
+                for validation_id, other in self.world_validations.items()
+                if other.status != worlds_schema.WorldValidationStatus.RUNNING
+            ]
+            for validation_id in finished[: max(0, len(self.world_validations) + 1 - MAX_WORLD_VALIDATIONS)]:
+                del self.world_validations[validation_id]
+            self.world_validations[state.validation_id] = state
+
+        def run() -> None:
+            try:
+                world_validation_module.validate_world(
+                    world, session, state, on_progress=self.world_validation_changed
+                )
+            except Exception as e:
+                logger.exception("World validation failed", world_id=world_id)
+                state.failure = str(e)
+                state.finished_at = datetime.datetime.now()
+                state.status = worlds_schema.WorldValidationStatus.FAILED
+                self.world_validation_changed(state)
+
+        threading.Thread(target=run, daemon=True).start()
+        return state
+
+    def get_world_validation(self, validation_id: uuid.UUID) -> Optional[world_validation_module.WorldValidation]:
+        with self.lock:
+            return self.world_validations.get(validation_id, None)
+
+    def world_validation_changed(self, state: world_validation_module.WorldValidation) -> None:
+        if not self.push_hub.has_subscribers():
+            return
+        event = events_schema.WorldValidationEvent(
+            validation_id=state.validation_id,
+            world_id=state.world_id,
+            status=state.status,
+            completed_partitions=state.completed_partitions,
+            number_of_partitions=state.number_of_partitions,
+            number_of_errors=state.number_of_errors,
+        )
+        self.push_hub.publish(push_module.PushEvent(
+            event="validation",
+            key=f"validation:{state.validation_id}",
+            data=event.model_dump_json(),
+            world_id=state.world_id,
+        ))
+
+    def world_changed(self, world_id: uuid.UUID, path: spec.GeneratablePath) -> None:
+        """
+        Called after the value at the path of a resident world has been modified.
+        """
+        with self.lock:
+            version = self.world_versions.get(world_id, 0) + 1
+            self.world_versions[world_id] = version
+            change_log = self.change_logs.get(world_id, None)
+            if change_log is None:
+                change_log = change_log_module.WorldChangeLog()
+                self.change_logs[world_id] = change_log
+            change = change_log_module.WorldChange.create(version, path)
+            change_log.append(change)
+            if self.push_hub.has_subscribers():
+                event = events_schema.WorldChangedEvent(
+                    world_id=world_id,
+                    version=version,
+                    path=path,
+                    entity_id=change.entity_id,
+                    date=change.date,
+                )
+                self.push_hub.publish(push_module.PushEvent(
+                    event="world",
+                    key=f"world:{world_id}",
+                    data=event.model_dump_json(),
+                    world_id=world_id,
+                ))
+            self.export_cache.discard_world(world_id)
+            memo = self.export_memos.get(world_id, None)
+            if memo is not None:
+                memo.invalidate(path)
+            validation_cache = self.validation_caches.get(world_id, None)
+            if validation_cache is not None:
+                validation_cache.invalidate(path)
+            index = self.entity_indexes.get(world_id, None)
+            if index is not None:
+                index.update(path)
+            listings = self.entity_listings.get(world_id, None)
+            if listings is not None:
+                listings.update(path)
+            aggregates = self.world_aggregates.get(world_id, None)
+            if aggregates is not None:
+                aggregates.update(path)
+
+    def replay_journal(self) -> None:
+        if self.journal is None:
+            return
+        records = self.journal.read()
+        sequences = list(self.journal_sequences.values())
+        self.journal.next_sequence = max([self.journal.next_sequence] + [s + 1 for s in sequences])
+        if len(records) == 0:
+            return
+
+        logger.info("Replaying edit journal", number_of_records=len(records))
+        for record in records:
+            world = self.worlds.get(record.world_id, None)
+            if world is None:
+                logger.warning("Skipping journal record for unknown world", world_id=record.world_id)
+                continue
+            if record.sequence <= self.journal_sequences.get(record.world_id, 0):
+                # Already contained in the world's snapshot
+                continue
+            try:
+                record.apply(world)
+            except (ValueError, spec.InvalidPathError) as e:
+                logger.warning("Skipping journal record that could not be applied", sequence=record.sequence, error=e)
+                continue
+            self.journal_sequences[record.world_id] = record.sequence
+            self.dirty_worlds.add(record.world_id)
+            self.worlds.update_index(record.world_id)
+            self.world_changed(record.world_id, record.path)
+        self.compact()
+
+    def apply_edit(self, record: journal_module.EditRecord) -> None:
+        with self.lock:
+            world = self.worlds.get(record.world_id, None)
+            if world is None:
+                raise ValueError(f"World not found: {record.world_id}")
+            if self.journal is None:
+                record.apply(world)
+                self.world_changed(record.world_id, record.path)
+                self.save_world(record.world_id)
+                return
+            record.sequence = self.journal.allocate_sequence()
+            # Written ahead of applying, applying fills in the value's history
+            self.journal.append(record)
+            record.apply(world)
+            self.journal_sequences[record.world_id] = record.sequence
+            self.dirty_worlds.add(record.world_id)
+            self.worlds.update_index(record.world_id)
+            self.world_changed(record.world_id, record.path)
+            if self.journal.number_of_records >= COMPACTION_MAX_RECORDS:
+                self.compaction_requested.set()
+
+    def compact(self) -> None:
+        with self.lock:
+            for world_id in list(self.dirty_worlds):
+                self.save_world(world_id)
+            if self.journal is not None:
+                self.journal.truncate()
+
+    def get_generation(self, generation_id: uuid.UUID) -> Optional[generate_model.Generation]:
+        # Archived generations are read back, but not kept
+        generation = self.generations.get(generation_id, None)
+        if generation is not None or self.archive is None:
+            return generation
+        js = self.archive.read(AggregateKind.GENERATION, generation_id)
+        if js is None:
+            return None
+        return generate_model.Generation.model_validate_json(js)
+
+    def get_template(self, template_id: uuid.UUID) -> Optional[template_model.GenerationTemplate]:
+        template = self.generation_templates.get(template_id, None)
+        if template is not None or self.archive is None:
+            return template
+        js = self.archive.read(AggregateKind.TEMPLATE, template_id)
+        if js is None:
+            return None
+        return template_model.GenerationTemplate.model_validate_json(js)
+
+    def archive_records(self, now: Optional[datetime.datetime] = None) -> int:
+        if self.archive is None:
+            return 0
+        if now is None:
+            now = datetime.datetime.utcnow()
+        with self.lock:
+            # Archived worlds must not have edits that are only in the journal
+            self.compact()
+            generation_ids = [
+                generation_id
+                for generation_id, generation in self.generations.items()
+                if generation.status.is_finished()
+                and (
+                    generation.deletion is not None
+                    or generation.end_time is not None
+                    and now - generation.end_time > GENERATION_RETENTION
+                )
+            ]
+            template_ids = [
+                template_id
+                for template_id, template in self.generation_templates.items()
+                if template.deletion is not None
+            ]
+            world_ids = [entry.world_id for entry in self.worlds.list_entries() if entry.deleted]
+
+            records: List[Tuple[AggregateKind, uuid.UUID, str]] = []
+            for kind, ids in (
+                (AggregateKind.GENERATION, generation_ids),
+                (AggregateKind.TEMPLATE, template_ids),
+                (AggregateKind.WORLD, world_ids),
+            ):
+                for aggregate_id in ids:
+                    js = self.storage.read(kind, aggregate_id)
+                    if js is not None:
+                        records.append((kind, aggregate_id, js))
+            if len(records) == 0:
+                return 0
+            self.archive.append(records)
+
+            for generation_id in generation_ids:
+                self.generations.pop(generation_id, None)
+                self.generation_index.remove(generation_id)
+                self.generation_versions.pop(generation_id, None)
+                self.storage.delete(AggregateKind.GENERATION, generation_id)
+            for template_id in template_ids:
+                self.generation_templates.pop(template_id, None)
+                self.template_index.remove(template_id)
+                self.template_versions.pop(template_id, None)
+                self.storage.delete(AggregateKind.TEMPLATE, template_id)
+            for world_id in world_ids:
+                self.worlds.remove(world_id)
+                self.entity_indexes.pop(world_id, None)
+                self.entity_listings.pop(world_id, None)
+                self.world_aggregates.pop(world_id, None)
+                self.export_memos.pop(world_id, None)
+                self.validation_caches.pop(world_id, None)
+                self.export_cache.discard_world(world_id)
+                self.journal_sequences.pop(world_id, None)
+                self.storage.delete(AggregateKind.WORLD, world_id)
+            if len(world_ids) > 0:
+                self.save_world_index()
+            return len(records)
+
+    def start_compaction(self) -> None:
+        def compaction_loop() -> None:
+            last_archival = 0.0
+            while True:
+                self.compaction_requested.wait(COMPACTION_INTERVAL_SECONDS)
+                self.compaction_requested.clear()
+                try:
+                    if len(self.dirty_worlds) > 0:
+                        self.compact()
+                except Exception as e:
+                    logger.exception("Unable to compact the edit journal", exception=e)
+                try:
+                    if time.monotonic() - last_archival > ARCHIVE_INTERVAL_SECONDS:
+                        last_archival = time.monotonic()
+                        self.archive_records()
+                except Exception as e:
+                    logger.exception("Unable to archive records", exception=e)
+
+        threading.Thread(target=compaction_loop, daemon=True).start()
+
+    def save_world(self, world_id: uuid.UUID) -> None:
+        with self.lock:
+            snapshot = WorldSnapshot(
+                journal_sequence=self.journal_sequences.get(world_id, 0),
+                world=self.worlds[world_id],
+            )
+            self.storage.write(AggregateKind.WORLD, world_id, snapshot.model_dump_json(indent=2))
+            self.dirty_worlds.discard(world_id)
+            self.worlds.update_index(world_id)
+            # Only the summary of each world is indexed, which most saves leave unchanged
+            if self.worlds.index_modified:
+                self.save_world_index()
+
+    def save_template(self, template_id: uuid.UUID) -> None:
+        self.template_changed(template_id)
+        template = self.generation_templates[template_id]
+        self.storage.write(AggregateKind.TEMPLATE, template_id, template.model_dump_json(indent=2))
+
+    def save_generation(self, generation_id: uuid.UUID) -> None:
+        self.generation_changed(generation_id)
+        generation = self.generations[generation_id]
+        self.storage.write(AggregateKind.GENERATION, generation_id, generation.model_dump_json(indent=2))
+
+
     class Config:
         arbitrary_types_allowed = True
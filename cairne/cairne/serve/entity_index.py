@@ -0,0 +1,87 @@
+import uuid
+from dataclasses import dataclass, field
+from typing import Dict, Optional
+
+from structlog import get_logger
+
+import cairne.model.generated as generated_model
+import cairne.model.specification as spec
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class EntityPathNode:
+    entity_id: Optional[uuid.UUID] = field(default=None)
+    children: Dict[spec.GeneratablePathElement, "EntityPathNode"] = field(default_factory=dict)
+
+
+class EntityIndex:
+    """
+    The path of every entity in a world, by entity id.
+    Only paths are kept, so it can be used to locate entities in copies of the world too.
+    The paths are also kept in a tree, so that an update only visits the entities below the changed path.
+    """
+
+    def __init__(self, world: generated_model.GeneratedEntity):
+        self.world = world
+        self.paths: Dict[uuid.UUID, spec.GeneratablePath] = {}
+        self._root = EntityPathNode()
+        self._add(spec.GeneratablePath(path_elements=[]), world)
+
+    def _add(self, path: spec.GeneratablePath, generated: generated_model.GeneratedBase) -> None:
+        paths: Dict[uuid.UUID, spec.GeneratablePath] = {}
+        generated.index_entities(path, paths)
+        for entity_id, entity_path in paths.items():
+            self.paths[entity_id] = entity_path
+            node = self._root
+            for element in entity_path.path_elements:
+                child = node.children.get(element, None)
+                if child is None:
+                    child = EntityPathNode()
+                    node.children[element] = child
+                node = child
+            node.entity_id = entity_id
+
+    def _remove(self, path: spec.GeneratablePath) -> None:
+        parent: Optional[EntityPathNode] = None
+        node = self._root
+        for element in path.path_elements:
+            child = node.children.get(element, None)
+            if child is None:
+                return
+            parent, node = node, child
+        if parent is None:
+            self._root = EntityPathNode()
+        else:
+            del parent.children[path.path_elements[-1]]
+        stack = [node]
+        while len(stack) > 0:
+            node = stack.pop()
+            if node.entity_id is not None:
+                self.paths.pop(node.entity_id, None)
+            stack.extend(node.children.values())
+
+    def locate(
+        self, world: generated_model.GeneratedEntity, entity_id: uuid.UUID
+    ) -> Optional[generated_model.LocatedEntity]:
+        path = self.paths.get(entity_id, None)
+        if path is None:
+            return None
+        try:
+            entity = world.get(path, 0)
+        except spec.InvalidPathError:
+            return None
+        if not isinstance(entity, generated_model.GeneratedEntity) or entity.entity_id != entity_id:
+            logger.warning("Entity index is out of date", entity_id=entity_id, path=path)
+            return None
+        return generated_model.LocatedEntity(entity=entity, path=path)
+
+    def update(self, path: spec.GeneratablePath) -> None:
+        # Everything below the path may have been replaced
+        self._remove(path)
+        try:
+            changed = self.world.get(path, 0)
+        except spec.InvalidPathError:
+            return
+        self._add(path, changed)
@@ -0,0 +1,200 @@
+import base64
+import bisect
+import datetime
+import json
+import typing
+import uuid
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+import cairne.model.generated as generated_model
+import cairne.model.specification as spec
+from cairne.schema.generated import EntitySortField
+
+logger = get_logger(__name__)
+
+
+class EntityListEntry(BaseModel):
+    entity_id: uuid.UUID = Field()
+    name: Optional[str] = Field(default=None)
+    created_at: datetime.datetime = Field()
+    updated_at: datetime.datetime = Field()
+    path: spec.GeneratablePath = Field()
+
+    @staticmethod
+    def create(path: spec.GeneratablePath, entity: generated_model.GeneratedEntity) -> "EntityListEntry":
+        return EntityListEntry(
+            entity_id=entity.entity_id,
+            name=entity.get_name(),
+            created_at=entity.get_creation_date(),
+            updated_at=entity.metadata.date,
+            path=path,
+        )
+
+    def get_sort_value(self, sort_field: EntitySortField) -> Any:
+        if sort_field == EntitySortField.NAME:
+            return (self.name or "").lower()
+        elif sort_field == EntitySortField.CREATED:
+            return self.created_at
+        else:
+            return self.updated_at
+
+
+# Ties are broken by the entity id, so every entry has a distinct position
+SortKey = Tuple[Any, str]
+
+
+def encode_cursor(sort_field: EntitySortField, key: SortKey) -> str:
+    value = key[0].isoformat() if isinstance(key[0], datetime.datetime) else key[0]
+    js = json.dumps([sort_field.value, value, key[1]])
+    return base64.urlsafe_b64encode(js.encode("utf-8")).decode("ascii")
+
+
+def decode_cursor(sort_field: EntitySortField, cursor: str) -> SortKey:
+    try:
+        field_name, value, entity_id = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+    except ValueError as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+    if field_name != sort_field.value:
+        raise ValueError(f"Cursor was created for sorting by {field_name}, not {sort_field.value}")
+    if sort_field != EntitySortField.NAME:
+        value = datetime.datetime.fromisoformat(value)
+    return (value, entity_id)
+
+
+class EntityListing:
+    """
+    The entities of one entity dictionary, kept sorted by each of the sort fields.
+    Deleted entities are not listed.
+    """
+
+    def __init__(self, dictionary_path: spec.GeneratablePath):
+        self.dictionary_path = dictionary_path
+        self.entries: Dict[uuid.UUID, EntityListEntry] = {}
+        self.sorted_keys: Dict[EntitySortField, List[SortKey]] = {
+            sort_field: [] for sort_field in EntitySortField
+        }
+
+    def rebuild(self, world: generated_model.GeneratedEntity) -> None:
+        self.entries = {}
+        dictionary = world.get(self.dictionary_path, 0)
+        if isinstance(dictionary, generated_model.EntityDictionary):
+            for entity_id, entity in dictionary.entities.items():
+                if entity.deletion is not None:
+                    continue
+                path = self.dictionary_path.append(spec.GeneratablePathElement(entity_id=entity_id))
+                self.entries[entity_id] = EntityListEntry.create(path, entity)
+        for sort_field in EntitySortField:
+            self.sorted_keys[sort_field] = sorted(
+                self.get_key(entry, sort_field) for entry in self.entries.values()
+            )
+
+    @staticmethod
+    def get_key(entry: EntityListEntry, sort_field: EntitySortField) -> SortKey:
+        return (entry.get_sort_value(sort_field), str(entry.entity_id))
+
+    def refresh(self, world: generated_model.GeneratedEntity, entity_id: uuid.UUID) -> None:
+        old_entry = self.entries.pop(entity_id, None)
+        if old_entry is not None:
+            for sort_field, keys in self.sorted_keys.items():
+                key = self.get_key(old_entry, sort_field)
+                position = bisect.bisect_left(keys, key)
+                if position < len(keys) and keys[position] == key:
+                    del keys[position]
+
+        path = self.dictionary_path.append(spec.GeneratablePathElement(entity_id=entity_id))
+        try:
+            entity = world.get(path, 0)
+        except spec.InvalidPathError:
+            return
+        if not isinstance(entity, generated_model.GeneratedEntity) or entity.deletion is not None:
+            return
+        entry = EntityListEntry.create(path, entity)
+        self.entries[entity_id] = entry
+        for sort_field, keys in self.sorted_keys.items():
+            bisect.insort(keys, self.get_key(entry, sort_field))
+
+    def update(self, world: generated_model.GeneratedEntity, path: spec.GeneratablePath) -> None:
+        depth = len(self.dictionary_path.path_elements)
+        if self.dictionary_path.starts_with(path):
+            # The whole dictionary may have been replaced
+            self.rebuild(world)
+        elif path.starts_with(self.dictionary_path):
+            entity_id = path.path_elements[depth].entity_id
+            if entity_id is not None:
+                self.refresh(world, entity_id)
+
+    def iterate(
+        self,
+        sort_field: EntitySortField,
+        descending: bool,
+        after: Optional[SortKey],
+        name_prefix: Optional[str],
+    ) -> Iterator[Tuple[SortKey, EntityListEntry]]:
+        keys = self.sorted_keys[sort_field]
+        prefix = name_prefix.lower() if name_prefix else None
+        if sort_field == EntitySortField.NAME and prefix is not None and not descending:
+            # Only the names starting with the prefix are visited
+            start = bisect.bisect_left(keys, (prefix, ""))
+            if after is not None:
+                start = max(start, bisect.bisect_right(keys, after))
+            for position in range(start, len(keys)):
+                if not keys[position][0].startswith(prefix):
+                    return
+                yield keys[position], self.entries[uuid.UUID(keys[position][1])]
+            return
+
+        if descending:
+            end = len(keys) if after is None else bisect.bisect_left(keys, after)
+            positions: Iterator[int] = iter(range(end - 1, -1, -1))
+        else:
+            start = 0 if after is None else bisect.bisect_right(keys, after)
+            positions = iter(range(start, len(keys)))
+        for position in positions:
+            entry = self.entries[uuid.UUID(keys[position][1])]
+            if prefix is not None and not (entry.name or "").lower().startswith(prefix):
+                continue
+            yield keys[position], entry
+
+    def page(
+        self,
+        sort_field: EntitySortField,
+        descending: bool,
+        cursor: Optional[str],
+        name_prefix: Optional[str],
+        limit: Optional[int],
+    ) -> Tuple[List[EntityListEntry], Optional[str]]:
+        after = decode_cursor(sort_field, cursor) if cursor is not None else None
+        entries: List[EntityListEntry] = []
+        last_key: Optional[SortKey] = None
+        for key, entry in self.iterate(sort_field, descending, after, name_prefix):
+            if limit is not None and len(entries) >= limit:
+                # There is at least one more entry
+                return entries, encode_cursor(sort_field, typing.cast(SortKey, last_key))
+            entries.append(entry)
+            last_key = key
+        return entries, None
+
+
+class EntityListings:
+    """
+    The listings of every entity dictionary of a world, created when first listed.
+    """
+
+    def __init__(self, world: generated_model.GeneratedEntity):
+        self.world = world
+        self.listings: Dict[spec.EntityType, EntityListing] = {}
+
+    def get(self, entity_type: spec.EntityType) -> EntityListing:
+        listing = self.listings.get(entity_type, None)
+        if listing is None:
+            listing = EntityListing(entity_type.get_dictionary_path())
+            listing.rebuild(self.world)
+            self.listings[entity_type] = listing
+        return listing
+
+    def update(self, path: spec.GeneratablePath) -> None:
+        for listing in self.listings.values():
+            listing.update(self.world, path)
@@ -0,0 +1,76 @@
+import threading
+import uuid
+from collections import OrderedDict
+from typing import Any, Hashable, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+
+# Exported entities beyond this many are evicted, least recently used first
+MAX_CACHED_EXPORTS = 256
+
+
+# (world_id, entity_id, query, world version)
+ExportKey = Tuple[uuid.UUID, uuid.UUID, Hashable, int]
+
+
+class ExportCacheStats(BaseModel):
+    size: int = Field()
+    capacity: int = Field()
+    hits: int = Field()
+    misses: int = Field()
+    evictions: int = Field()
+    hit_rate: Optional[float] = Field(default=None)
+
+
+class ExportCache:
+    """
+    Exported entity views, keyed by the version of the world they were exported from.
+    Entries of older versions can no longer be hit, they are evicted as the cache fills up.
+    """
+
+    def __init__(self, capacity: int = MAX_CACHED_EXPORTS):
+        self.capacity = capacity
+        self._lock = threading.Lock()
+        self._entries: "OrderedDict[ExportKey, Any]" = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+        self._evictions = 0
+
+    def get(self, key: ExportKey) -> Optional[Any]:
+        with self._lock:
+            exported = self._entries.get(key, None)
+            if exported is None:
+                self._misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self._hits += 1
+            return exported
+
+    def put(self, key: ExportKey, exported: Any) -> None:
+        with self._lock:
+            self._entries[key] = exported
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.capacity:
+                self._entries.popitem(last=False)
+                self._evictions += 1
+
+    def discard_world(self, world_id: uuid.UUID) -> None:
+        with self._lock:
+            for key in [key for key in self._entries if key[0] == world_id]:
+                del self._entries[key]
+
+    def stats(self) -> ExportCacheStats:
+        with self._lock:
+            lookups = self._hits + self._misses
+            return ExportCacheStats(
+                size=len(self._entries),
+                capacity=self.capacity,
+                hits=self._hits,
+                misses=self._misses,
+                evictions=self._evictions,
+                hit_rate=self._hits / lookups if lookups > 0 else None,
+            )
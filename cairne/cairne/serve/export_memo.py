@@ -0,0 +1,103 @@
+import threading
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Tuple
+
+from structlog import get_logger
+
+import cairne.model.specification as spec
+import cairne.schema.generated as generated_schema
+
+logger = get_logger(__name__)
+
+
+@dataclass
+class MemoNode:
+    # The label is part of the export, so it is checked on every lookup
+    exported: Optional[Tuple[str, generated_schema.GeneratedField]] = field(default=None)
+    children: Dict[spec.GeneratablePathElement, "MemoNode"] = field(default_factory=dict)
+
+
+class SubtreeExportMemo:
+    """
+    Exported fields of one world, stored in a tree mirroring the paths they were exported from.
+    A modification only invalidates the modified subtree and its ancestors.
+    """
+
+    def __init__(self, dependency_paths: List[spec.GeneratablePath]):
+        # Paths other values are validated against, modifying them invalidates everything
+        self.dependency_paths = dependency_paths
+        self.version = 0
+        self._lock = threading.Lock()
+        self._root = MemoNode()
+
+    def get(
+        self, path: spec.GeneratablePath, label: str, version: int
+    ) -> Optional[generated_schema.GeneratedField]:
+        with self._lock:
+            if version != self.version:
+                return None
+            node: Optional[MemoNode] = self._root
+            for element in path.path_elements:
+                node = node.children.get(element, None)
+                if node is None:
+                    return None
+            if node.exported is None or node.exported[0] != label:
+                return None
+            return node.exported[1]
+
+    def put(
+        self,
+        path: spec.GeneratablePath,
+        label: str,
+        exported: generated_schema.GeneratedField,
+        version: int,
+    ) -> None:
+        with self._lock:
+            # The world was modified while exporting
+            if version != self.version:
+                return
+            node = self._root
+            for element in path.path_elements:
+                child = node.children.get(element, None)
+                if child is None:
+                    child = MemoNode()
+                    node.children[element] = child
+                node = child
+            node.exported = (label, exported)
+
+    def begin(self) -> "ExportSession":
+        with self._lock:
+            return ExportSession(memo=self, version=self.version)
+
+    def invalidate(self, path: spec.GeneratablePath) -> None:
+        with self._lock:
+            self.version += 1
+            for dependency_path in self.dependency_paths:
+                if dependency_path.starts_with(path) or path.starts_with(dependency_path):
+                    self._root = MemoNode()
+                    return
+            node = self._root
+            for element in path.path_elements:
+                node.exported = None
+                child = node.children.get(element, None)
+                if child is None:
+                    return
+                node = child
+            node.exported = None
+            node.children = {}
+
+
+@dataclass
+class ExportSession:
+    """
+    Memoizes the exports of a single request, made from the world as of the version it was started at.
+    """
+
+    memo: SubtreeExportMemo
+    version: int
+
+    def get(self, path: spec.GeneratablePath, label: str) -> Optional[generated_schema.GeneratedField]:
+        return self.memo.get(path, label, self.version)
+
+    def put(self, path: spec.GeneratablePath, label: str, exported: generated_schema.GeneratedField) -> None:
+        self.memo.put(path, label, exported, self.version)
@@ -0,0 +1,122 @@
+import datetime
+import os
+import threading
+import time
+import uuid
+from enum import Enum
+from typing import List
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+import cairne.model.generated as generated_model
+import cairne.model.specification as spec
+
+logger = get_logger(__name__)
+
+
+JOURNAL_FILE = "edits.jsonl"
+
+
+class EditOperation(str, Enum):
+    REPLACE = "replace"
+    APPEND = "append"
+
+
+class EditRecord(BaseModel):
+    sequence: int = Field(default=0)
+    world_id: uuid.UUID = Field()
+    operation: EditOperation = Field()
+    path: spec.GeneratablePath = Field()
+    # The parsed value, including the source it came from
+    generated: generated_model.Generated = Field()
+    date: datetime.datetime = Field(default_factory=datetime.datetime.utcnow)
+
+    def apply(self, world: generated_model.GeneratedEntity) -> None:
+        if self.operation == EditOperation.REPLACE:
+            parent_path, key = self.path.split()
+            parent = world.get(parent_path, 0)
+            parent.replace_child(key, self.generated)
+        elif self.operation == EditOperation.APPEND:
+            parent = world.get(self.path, 0)
+            if not isinstance(parent, generated_model.GeneratedList):
+                raise ValueError(f"Cannot append to non-list: {self.path}")
+            parent.append_child(self.generated)
+        else:
+            raise NotImplementedError(f"Unknown edit operation: {self.operation}")
+
+
+class EditJournal:
+    """
+    Append-only log of edits. Appends are flushed immediately and fsynced in
+    batches by a background thread, the snapshot is only rewritten on compaction.
+    """
+
+    def __init__(self, directory: str, batch_size: int = 32, sync_interval: float = 0.05):
+        self.path = os.path.join(directory, JOURNAL_FILE)
+        self.batch_size = batch_size
+        self.sync_interval = sync_interval
+        self.next_sequence = 1
+        self.number_of_records = 0
+
+        self._condition = threading.Condition()
+        self._unsynced = 0
+        self._file = open(self.path, "a")
+        self._syncer = threading.Thread(target=self._sync_loop, daemon=True)
+        self._syncer.start()
+
+    def read(self) -> List[EditRecord]:
+        records: List[EditRecord] = []
+        with open(self.path, "r") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                try:
+                    records.append(EditRecord.model_validate_json(line))
+                except ValueError as e:
+                    # Most likely the last line was only partially written before a crash
+                    logger.warning("Skipping unreadable journal record", error=e)
+        self.number_of_records = len(records)
+        if len(records) > 0:
+            self.next_sequence = max(self.next_sequence, records[-1].sequence + 1)
+        return records
+
+    def append(self, record: EditRecord) -> None:
+        with self._condition:
+            self._file.write(record.model_dump_json() + "\n")
+            self._file.flush()
+            self.number_of_records += 1
+            self._unsynced += 1
+            if self._unsynced >= self.batch_size:
+                self._sync()
+            else:
+                self._condition.notify()
+
+    def allocate_sequence(self) -> int:
+        with self._condition:
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            return sequence
+
+    def truncate(self) -> None:
+        with self._condition:
+            self._file.truncate(0)
+            self._file.seek(0)
+            os.fsync(self._file.fileno())
+            self._unsynced = 0
+            self.number_of_records = 0
+
+    def _sync(self) -> None:
+        os.fsync(self._file.fileno())
+        self._unsynced = 0
+
+    def _sync_loop(self) -> None:
+        while True:
+            with self._condition:
+                while self._unsynced == 0:
+                    self._condition.wait()
+            # Give other edits in the same burst a chance to join this sync
+            time.sleep(self.sync_interval)
+            with self._condition:
+                if self._unsynced > 0:
+                    self._sync()
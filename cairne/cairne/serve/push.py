@@ -0,0 +1,132 @@
+import threading
+import uuid
+from collections import OrderedDict
+from dataclasses import dataclass, field
+from typing import Callable, Iterator, List, Optional
+
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+
+# A connection with more distinct pending events than this is told to resynchronize
+MAX_PENDING_EVENTS = 64
+HEARTBEAT_SECONDS = 15.0
+
+
+@dataclass
+class PushEvent:
+    event: str
+    # Pending events with the same key are replaced by the newest one
+    key: str
+    data: str
+    world_id: Optional[uuid.UUID] = field(default=None)
+    generation_id: Optional[uuid.UUID] = field(default=None)
+
+    def as_sse(self) -> str:
+        return f"event: {self.event}\ndata: {self.data}\n\n"
+
+
+class Subscription:
+    """
+    The events waiting to be written to one connection.
+    A slow connection coalesces its events instead of queueing every one of them.
+    """
+
+    def __init__(
+        self,
+        world_id: Optional[uuid.UUID],
+        generation_id: Optional[uuid.UUID],
+        max_pending: int = MAX_PENDING_EVENTS,
+    ):
+        self.world_id = world_id
+        self.generation_id = generation_id
+        self.max_pending = max_pending
+        self.closed = False
+        self.dropped = 0
+        self._condition = threading.Condition()
+        self._pending: "OrderedDict[str, PushEvent]" = OrderedDict()
+
+    def matches(self, event: PushEvent) -> bool:
+        if self.world_id is not None and event.world_id != self.world_id:
+            return False
+        if self.generation_id is not None and event.generation_id != self.generation_id:
+            return False
+        return True
+
+    def offer(self, event: PushEvent) -> None:
+        with self._condition:
+            if event.key in self._pending or len(self._pending) < self.max_pending:
+                self._pending[event.key] = event
+            else:
+                self.dropped += 1
+            self._condition.notify()
+
+    def take(self, timeout: float) -> List[PushEvent]:
+        with self._condition:
+            if len(self._pending) == 0 and self.dropped == 0 and not self.closed:
+                self._condition.wait(timeout)
+            events = list(self._pending.values())
+            self._pending.clear()
+            return events
+
+    def take_dropped(self) -> int:
+        with self._condition:
+            dropped = self.dropped
+            self.dropped = 0
+            return dropped
+
+    def close(self) -> None:
+        with self._condition:
+            self.closed = True
+            self._condition.notify()
+
+
+class PushHub:
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._subscriptions: List[Subscription] = []
+
+    def has_subscribers(self) -> bool:
+        return len(self._subscriptions) > 0
+
+    def subscribe(self, world_id: Optional[uuid.UUID], generation_id: Optional[uuid.UUID]) -> Subscription:
+        subscription = Subscription(world_id=world_id, generation_id=generation_id)
+        with self._lock:
+            self._subscriptions = self._subscriptions + [subscription]
+        logger.info("Subscribed to events", world_id=world_id, generation_id=generation_id)
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscription.close()
+        with self._lock:
+            self._subscriptions = [s for s in self._subscriptions if s is not subscription]
+
+    def publish(self, event: PushEvent) -> None:
+        # Replaced rather than modified, so it can be read without the lock
+        for subscription in self._subscriptions:
+            if subscription.matches(event):
+                subscription.offer(event)
+
+
+def stream_events(
+    hub: PushHub,
+    subscription: Subscription,
+    create_resync: Callable[[int], str],
+    heartbeat_seconds: float = HEARTBEAT_SECONDS,
+) -> Iterator[str]:
+    try:
+        # Sent right away, so that the response starts without waiting for the first event
+        yield ": subscribed\n\n"
+        while not subscription.closed:
+            events = subscription.take(heartbeat_seconds)
+            dropped = subscription.take_dropped()
+            if dropped > 0:
+                yield PushEvent(event="resync", key="resync", data=create_resync(dropped)).as_sse()
+            if len(events) == 0 and dropped == 0:
+                # Lets the server notice closed connections
+                yield ": heartbeat\n\n"
+            for event in events:
+                yield event.as_sse()
+    finally:
+        hub.unsubscribe(subscription)
@@ -0,0 +1,172 @@
+import heapq
+import threading
+import time
+import uuid
+from dataclasses import dataclass, field
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+import cairne.model.generation as generate_model
+import cairne.model.templates as template_model
+
+logger = get_logger(__name__)
+
+
+class SchedulerSettings(BaseModel):
+    number_of_workers: int = Field(default=4)
+    max_per_generator_type: Dict[template_model.GeneratorType, int] = Field(
+        default_factory=lambda: {template_model.GeneratorType.OPENAI: 4}
+    )
+    max_per_model: Dict[str, int] = Field(default_factory=dict)
+    default_max_per_model: int = Field(default=2)
+    # Only used to report the average wait time
+    wait_time_window: int = Field(default=100)
+
+
+class SchedulerStatus(BaseModel):
+    queue_depth: int = Field()
+    running: int = Field()
+    number_of_workers: int = Field()
+    running_per_generator_type: Dict[str, int] = Field(default_factory=dict)
+    running_per_model: Dict[str, int] = Field(default_factory=dict)
+    average_wait_seconds: Optional[float] = Field(default=None)
+    longest_wait_seconds: Optional[float] = Field(default=None)
+
+
+@dataclass(order=True)
+class QueuedGeneration:
+    # Higher priorities are run first, ties are run in submission order
+    sort_key: int
+    sequence: int
+    generation_id: uuid.UUID = field(compare=False)
+    generator_type: template_model.GeneratorType = field(compare=False)
+    g_model_id: str = field(compare=False)
+    enqueued_at: float = field(compare=False)
+    run: Callable[[], None] = field(compare=False)
+
+
+class GenerationScheduler:
+    """
+    Runs generations on a fixed pool of workers, highest priority first,
+    without exceeding the concurrency limits per generator type and per model.
+    """
+
+    def __init__(self, settings: Optional[SchedulerSettings] = None):
+        self.settings = settings if settings is not None else SchedulerSettings()
+        self._condition = threading.Condition()
+        # A heap per generator type and model, so saturated ones are skipped without looking at their generations
+        self._queues: Dict[Tuple[template_model.GeneratorType, str], List[QueuedGeneration]] = {}
+        self._queued_ids: Dict[uuid.UUID, QueuedGeneration] = {}
+        self._sequence = 0
+        self._running_per_generator_type: Dict[template_model.GeneratorType, int] = {}
+        self._running_per_model: Dict[str, int] = {}
+        self._recent_waits: List[float] = []
+        self._workers: List[threading.Thread] = []
+
+    def submit(self, generation: generate_model.Generation, run: Callable[[], None]) -> None:
+        generator_model = generation.template_snapshot.generator_model
+        with self._condition:
+            if generation.generation_id in self._queued_ids:
+                return
+            self._start_workers()
+            self._sequence += 1
+            queued = QueuedGeneration(
+                sort_key=-generation.priority,
+                sequence=self._sequence,
+                generation_id=generation.generation_id,
+                generator_type=generator_model.generator_type,
+                g_model_id=generator_model.g_model_id,
+                enqueued_at=time.monotonic(),
+                run=run,
+            )
+            key = (queued.generator_type, queued.g_model_id)
+            heapq.heappush(self._queues.setdefault(key, []), queued)
+            self._queued_ids[generation.generation_id] = queued
+            queue_depth = len(self._queued_ids)
+            self._condition.notify()
+        logger.info("Queued generation", generation_id=generation.generation_id, queue_depth=queue_depth)
+
+    def status(self) -> SchedulerStatus:
+        with self._condition:
+            now = time.monotonic()
+            return SchedulerStatus(
+                queue_depth=len(self._queued_ids),
+                running=sum(self._running_per_generator_type.values()),
+                number_of_workers=self.settings.number_of_workers,
+                running_per_generator_type={
+                    generator_type.value: count
+                    for generator_type, count in self._running_per_generator_type.items()
+                },
+                running_per_model=dict(self._running_per_model),
+                average_wait_seconds=(
+                    sum(self._recent_waits) / len(self._recent_waits)
+                    if len(self._recent_waits) > 0
+                    else None
+                ),
+                longest_wait_seconds=(
+                    max(now - queued.enqueued_at for queued in self._queued_ids.values())
+                    if len(self._queued_ids) > 0
+                    else None
+                ),
+            )
+
+    def _start_workers(self) -> None:
+        while len(self._workers) < self.settings.number_of_workers:
+            worker = threading.Thread(
+                target=self._work,
+                name=f"generation-worker-{len(self._workers)}",
+                daemon=True,
+            )
+            self._workers.append(worker)
+            worker.start()
+
+    def _can_run(self, generator_type: template_model.GeneratorType, g_model_id: str) -> bool:
+        type_limit = self.settings.max_per_generator_type.get(generator_type, None)
+        if type_limit is not None and self._running_per_generator_type.get(generator_type, 0) >= type_limit:
+            return False
+        model_limit = self.settings.max_per_model.get(g_model_id, self.settings.default_max_per_model)
+        return self._running_per_model.get(g_model_id, 0) < model_limit
+
+    def _take_next(self) -> Optional[QueuedGeneration]:
+        # The best first generation among the generator types and models that are not saturated
+        best_key: Optional[Tuple[template_model.GeneratorType, str]] = None
+        for key, queue in self._queues.items():
+            if not self._can_run(*key):
+                continue
+            if best_key is None or queue[0] < self._queues[best_key][0]:
+                best_key = key
+        if best_key is None:
+            return None
+        queue = self._queues[best_key]
+        queued = heapq.heappop(queue)
+        if len(queue) == 0:
+            del self._queues[best_key]
+        del self._queued_ids[queued.generation_id]
+        return queued
+
+    def _work(self) -> None:
+        while True:
+            with self._condition:
+                queued = self._take_next()
+                while queued is None:
+                    self._condition.wait()
+                    queued = self._take_next()
+                self._running_per_generator_type[queued.generator_type] = (
+                    self._running_per_generator_type.get(queued.generator_type, 0) + 1
+                )
+                self._running_per_model[queued.g_model_id] = self._running_per_model.get(queued.g_model_id, 0) + 1
+                self._recent_waits.append(time.monotonic() - queued.enqueued_at)
+                del self._recent_waits[: -self.settings.wait_time_window]
+
+            try:
+                queued.run()
+            except Exception as e:
+                logger.exception("Generation failed", generation_id=queued.generation_id, exception=e)
+            finally:
+                with self._condition:
+                    self._running_per_generator_type[queued.generator_type] -= 1
+                    self._running_per_model[queued.g_model_id] -= 1
+                    # A finished generation can unblock generations of any model
+                    self._condition.notify_all()
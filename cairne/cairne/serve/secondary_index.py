@@ -0,0 +1,72 @@
+import uuid
+from typing import Any, Callable, Dict, Generic, Hashable, List, Optional, TypeVar
+
+T = TypeVar("T")
+
+
+class SecondaryIndex(Generic[T]):
+    """
+    The ids of the items with each value of a set of attributes, used to look items up without scanning them.
+    Results are returned in the order the items were first added.
+    """
+
+    def __init__(self, attributes: Dict[str, Callable[[T], Hashable]]):
+        self.attributes = attributes
+        self.buckets: Dict[str, Dict[Hashable, Dict[uuid.UUID, None]]] = {name: {} for name in attributes}
+        self.values: Dict[uuid.UUID, Dict[str, Hashable]] = {}
+        self.sequences: Dict[uuid.UUID, int] = {}
+        self.next_sequence = 0
+
+    def __len__(self) -> int:
+        return len(self.values)
+
+    def update(self, item_id: uuid.UUID, item: Optional[T]) -> None:
+        # Items that are None are removed, for example once deleted
+        if item is None:
+            self.remove(item_id)
+            return
+        old_values = self.values.get(item_id, {})
+        new_values = {name: get_value(item) for name, get_value in self.attributes.items()}
+        for name, value in new_values.items():
+            if name in old_values:
+                if old_values[name] == value:
+                    continue
+                self._discard(name, old_values[name], item_id)
+            self.buckets[name].setdefault(value, {})[item_id] = None
+        self.values[item_id] = new_values
+        if item_id not in self.sequences:
+            self.sequences[item_id] = self.next_sequence
+            self.next_sequence += 1
+
+    def remove(self, item_id: uuid.UUID) -> None:
+        old_values = self.values.pop(item_id, None)
+        if old_values is None:
+            return
+        for name, value in old_values.items():
+            self._discard(name, value, item_id)
+        del self.sequences[item_id]
+
+    def _discard(self, name: str, value: Hashable, item_id: uuid.UUID) -> None:
+        bucket = self.buckets[name].get(value, None)
+        if bucket is None:
+            return
+        bucket.pop(item_id, None)
+        if len(bucket) == 0:
+            del self.buckets[name][value]
+
+    def find(self, **criteria: Any) -> List[uuid.UUID]:
+        # Criteria that are None match everything
+        selected = [
+            self.buckets[name].get(value, {})
+            for name, value in criteria.items()
+            if value is not None
+        ]
+        if len(selected) == 0:
+            candidates: Dict[uuid.UUID, Any] = self.values
+            others: List[Dict[uuid.UUID, None]] = []
+        else:
+            selected.sort(key=len)
+            candidates, others = selected[0], selected[1:]
+        ids = [item_id for item_id in candidates if all(item_id in other for other in others)]
+        ids.sort(key=self.sequences.__getitem__)
+        return ids
@@ -2,7 +2,7 @@ import datetime
 import uuid
 from typing import Any, Dict, List, Optional, Union
 
-from flask import Flask, jsonify, request
+from flask import Flask, Response, jsonify, request, stream_with_context
 from flask_cors import CORS, cross_origin
 from flask_pydantic import validate
 from structlog import get_logger
@@ -10,6 +10,7 @@ from structlog import get_logger
 import cairne.model.generation as generate_model
 import cairne.model.templates as template_model
 import cairne.schema.edits as edits_schema
+import cairne.schema.events as events_schema
 import cairne.schema.generated as generated_schema
 import cairne.schema.generate as generate_schema
 import cairne.schema.worlds as worlds_schema
@@ -22,6 +23,8 @@ import cairne.commands.templates as template_commands
 import cairne.commands.worlds as world_commands
 
 
+import cairne.serve.push as push
+from cairne.serve.conditional import conditional, make_etag, parse_uuid
 from cairne.serve.data_store import Datastore
 
 # Story idea: the last human as ais take over
@@ -43,6 +46,56 @@ Datastore.model_rebuild()
 datastore: Datastore = Datastore.load()
 
 
+def get_world_etag(view_args: Dict[str, Any], query: Dict[str, str]) -> Optional[str]:
+    world_id = parse_uuid(view_args.get("world_id", None))
+    if world_id is None or world_id not in datastore.worlds:
+        return None
+    return make_etag("world", world_id, datastore.get_world_version(world_id))
+
+
+def get_entity_etag(view_args: Dict[str, Any], query: Dict[str, str]) -> Optional[str]:
+    world_etag = get_world_etag(view_args, query)
+    if world_etag is None:
+        return None
+    # Previews also depend on the template or generation they preview
+    template_id = parse_uuid(query.get("template_id", None))
+    generation_id = parse_uuid(query.get("generation_id", None))
+    return "-".join([
+        world_etag,
+        str(view_args.get("entity_id", None)),
+        str(template_id),
+        str(datastore.get_template_version(template_id) if template_id is not None else None),
+        str(generation_id),
+        str(datastore.get_generation_version(generation_id) if generation_id is not None else None),
+    ])
+
+
+def get_template_etag(view_args: Dict[str, Any], query: Dict[str, str]) -> Optional[str]:
+    template_id = parse_uuid(view_args.get("template_id", None))
+    template = datastore.generation_templates.get(template_id, None) if template_id is not None else None
+    if template is None:
+        return None
+    return make_etag(
+        "template",
+        template_id,
+        datastore.get_template_version(template_id),
+        datastore.get_world_version(template.world_id),
+    )
+
+
+def get_generation_etag(view_args: Dict[str, Any], query: Dict[str, str]) -> Optional[str]:
+    generation_id = parse_uuid(view_args.get("generation_id", None))
+    generation = datastore.generations.get(generation_id, None) if generation_id is not None else None
+    if generation is None:
+        return None
+    return make_etag(
+        "generation",
+        generation_id,
+        datastore.get_generation_version(generation_id),
+        datastore.get_world_version(generation.template_snapshot.world_id),
+    )
+
+
 ##############################################################
 # Worlds
 ##############################################################
@@ -71,9 +124,20 @@ def create_world(
     return response
 
 
-@app.route("/world/<world_id>", methods=["GET", "OPTIONS"])
+@app.route("/worlds/export-cache", methods=["GET", "OPTIONS"])
 @cross_origin(origins=["*"])
 @validate()
+def get_export_cache() -> worlds_schema.GetExportCacheResponse:
+    logger.info("Get export cache")
+    command = world_commands.GetExportCacheStats(datastore=datastore, user="test")
+    response = command.execute()
+    return response
+
+
+@app.route("/world/<world_id>", methods=["GET", "OPTIONS"])
+@cross_origin(origins=["*"], expose_headers=["ETag"])
+@conditional(get_world_etag)
+@validate()
 def get_world(world_id: uuid.UUID) -> generated_schema.GetEntityResponse:
     logger.info("Get world", world_id=world_id)
     command = world_commands.GetWorld(
@@ -83,6 +147,47 @@ def get_world(world_id: uuid.UUID) -> generated_schema.GetEntityResponse:
     return response
 
 
+@app.route("/world/<world_id>/changes", methods=["GET", "OPTIONS"])
+@cross_origin(origins=["*"])
+@validate()
+def get_world_changes(
+    world_id: uuid.UUID,
+    query: generated_schema.GetWorldChangesQuery,
+) -> generated_schema.GetWorldChangesResponse:
+    logger.info("Get world changes", world_id=world_id, query=query)
+    command = world_commands.GetWorldChanges(
+        datastore=datastore, user="test", world_id=world_id, query=query
+    )
+    response = command.execute()
+    return response
+
+
+@app.route("/world/<world_id>/validate", methods=["POST", "OPTIONS"])
+@cross_origin(origins=["*"])
+@validate()
+def validate_world(world_id: uuid.UUID) -> worlds_schema.ValidateWorldResponse:
+    logger.info("Validate world", world_id=world_id)
+    command = world_commands.ValidateWorld(
+        datastore=datastore, user="test", world_id=world_id
+    )
+    response = command.execute()
+    return response
+
+
+@app.route("/world/<world_id>/validation/<validation_id>", methods=["GET", "OPTIONS"])
+@cross_origin(origins=["*"])
+@validate()
+def get_world_validation(
+    world_id: uuid.UUID, validation_id: uuid.UUID
+) -> worlds_schema.GetWorldValidationResponse:
+    logger.info("Get world validation", world_id=world_id, validation_id=validation_id)
+    command = world_commands.GetWorldValidation(
+        datastore=datastore, user="test", world_id=world_id, validation_id=validation_id
+    )
+    response = command.execute()
+    return response
+
+
 @app.route("/world/<world_id>", methods=["DELETE", "OPTIONS"])
 @cross_origin(origins=["*"])
 @validate()
@@ -105,11 +210,11 @@ def delete_world(world_id: uuid.UUID) -> generated_schema.DeleteEntityResponse:
 @validate()
 # Can the entity_type be a EntityType?
 def list_entities(
-    world_id: uuid.UUID, entity_type: str
+    world_id: uuid.UUID, entity_type: str, query: generated_schema.ListEntitiesQuery
 ) -> generated_schema.ListEntitiesResponse:
-    logger.info("List entities", world_id=world_id, entity_type=entity_type)
+    logger.info("List entities", world_id=world_id, entity_type=entity_type, query=query)
     request = generated_schema.ListEntitiesRequest.model_validate(
-        dict(world_id=world_id, entity_type=entity_type)
+        dict(world_id=world_id, entity_type=entity_type, query=query)
     )
     command = generated_commands.ListEntities(
         datastore=datastore, user="test", request=request
@@ -142,7 +247,8 @@ def create_entity(
 
 
 @app.route("/world/<world_id>/entity/<entity_id>", methods=["GET", "OPTIONS"])
-@cross_origin(origins=["*"])
+@cross_origin(origins=["*"], expose_headers=["ETag"])
+@conditional(get_entity_etag)
 @validate()
 def get_entity(
     world_id: uuid.UUID,
@@ -197,7 +303,8 @@ def list_templates(
 
 
 @app.route("/template/<template_id>", methods=["GET", "OPTIONS"])
-@cross_origin(origins=["*"])
+@cross_origin(origins=["*"], expose_headers=["ETag"])
+@conditional(get_template_etag)
 @validate()
 def get_template(
     template_id: uuid.UUID,
@@ -274,9 +381,20 @@ def list_generations(
     return response
 
 
-@app.route("/generation/<generation_id>", methods=["GET", "OPTIONS"])
+@app.route("/generations/queue", methods=["GET", "OPTIONS"])
 @cross_origin(origins=["*"])
 @validate()
+def get_generation_queue() -> generate_schema.GetGenerationQueueResponse:
+    logger.info("Get generation queue")
+    command = generate_commands.GetGenerationQueue(datastore=datastore, user="test")
+    response = command.execute()
+    return response
+
+
+@app.route("/generation/<generation_id>", methods=["GET", "OPTIONS"])
+@cross_origin(origins=["*"], expose_headers=["ETag"])
+@conditional(get_generation_etag)
+@validate()
 def get_generation(
     generation_id: uuid.UUID,
 ) -> generate_schema.GetGenerationResponse:
@@ -288,6 +406,21 @@ def get_generation(
     return response
 
 
+@app.route("/generation/<generation_id>/wait", methods=["GET", "OPTIONS"])
+@cross_origin(origins=["*"])
+@validate()
+def wait_for_generation(
+    generation_id: uuid.UUID,
+    query: generate_schema.WaitForGenerationQuery,
+) -> generate_schema.WaitForGenerationResponse:
+    logger.info("Wait for generation", generation_id=generation_id, query=query)
+    command = generate_commands.WaitForGeneration(
+        datastore=datastore, user="test", generation_id=generation_id, query=query
+    )
+    response = command.execute()
+    return response
+
+
 # Descriptive path?
 @app.route("/generate", methods=["POST", "OPTIONS"])
 @cross_origin(origins=["*"])
@@ -298,11 +431,10 @@ def generate(body: generate_schema.GenerateRequest) -> generate_schema.GenerateR
     template = datastore.generation_templates.get(body.template_id, None)
     if template is None:
         raise ValueError(f"Template {body.template_id} not found")
-    world = datastore.worlds.get(template.world_id, None)
-    if world is None:
-        raise ValueError(f"World {template.world_id} not found") 
+    aggregates = datastore.get_world_aggregates(template.world_id)
     template = template.for_entity(body.target_entity_id)
-    generation = generate_model.Generation.create(template, world)
+    generation = generate_model.Generation.create(template, aggregates)
+    generation.priority = body.priority
     command_class = base_generate_commands.get_command_class(generation=generation)
     command = command_class(datastore=datastore, user="test", generation=generation)
     command.generation = generation
@@ -366,6 +498,31 @@ def remove_value(
     return response
 
 
+##############################################################
+# Events
+##############################################################
+
+
+@app.route("/events", methods=["GET", "OPTIONS"])
+@cross_origin(origins=["*"])
+@validate()
+def subscribe_events(query: events_schema.SubscribeQuery) -> Response:
+    logger.info("Subscribe to events", query=query)
+    subscription = datastore.push_hub.subscribe(
+        world_id=query.world_id, generation_id=query.generation_id
+    )
+    stream = push.stream_events(
+        datastore.push_hub,
+        subscription,
+        create_resync=lambda dropped: events_schema.ResyncEvent(dropped=dropped).model_dump_json(),
+    )
+    return Response(
+        stream_with_context(stream),
+        mimetype="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
 ##############################################################
 # Other
 ##############################################################
@@ -395,4 +552,8 @@ def list_entity_types() -> worlds_schema.ListEntityTypesResponse:
 
 
 def serve():
-    app.run(debug=True)
+    # Background work starts here rather than on import, and without the reloader,
+    # which would import this module again in a second process doing the same work
+    datastore.start_compaction()
+    base_generate_commands.resume_generations(datastore, user="test")
+    app.run(debug=True, use_reloader=False)
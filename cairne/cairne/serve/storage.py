@@ -0,0 +1,89 @@
+import os
+import uuid
+from dataclasses import dataclass, field
+from enum import Enum
+from typing import Generator, List, Optional, Tuple
+
+from structlog import get_logger
+
+logger = get_logger(__name__)
+
+
+STORAGE_DIR = "output/datastore"
+
+
+class AggregateKind(str, Enum):
+    WORLD = "worlds"
+    TEMPLATE = "templates"
+    GENERATION = "generations"
+
+
+# One json file per world, template and generation, so that a mutation
+# only rewrites the aggregate that changed.
+@dataclass
+class ShardedStorage:
+    root: str = field(default=STORAGE_DIR)
+
+    def exists(self) -> bool:
+        return os.path.isdir(self.root)
+
+    def initialize(self) -> None:
+        for kind in AggregateKind:
+            os.makedirs(os.path.join(self.root, kind.value), exist_ok=True)
+
+    def shard_path(self, kind: AggregateKind, aggregate_id: uuid.UUID) -> str:
+        return os.path.join(self.root, kind.value, f"{aggregate_id}.json")
+
+    def write(self, kind: AggregateKind, aggregate_id: uuid.UUID, js: str) -> None:
+        self._write_atomically(self.shard_path(kind, aggregate_id), js)
+
+    def read(self, kind: AggregateKind, aggregate_id: uuid.UUID) -> Optional[str]:
+        return self._read(self.shard_path(kind, aggregate_id))
+
+    def write_file(self, file_name: str, js: str) -> None:
+        self._write_atomically(os.path.join(self.root, file_name), js)
+
+    def read_file(self, file_name: str) -> Optional[str]:
+        return self._read(os.path.join(self.root, file_name))
+
+    def _write_atomically(self, path: str, js: str) -> None:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so a crash never leaves a half written shard
+        temporary_path = f"{path}.{uuid.uuid4().hex}.tmp"
+        with open(temporary_path, "w") as f:
+            f.write(js)
+        os.replace(temporary_path, path)
+
+    def _read(self, path: str) -> Optional[str]:
+        if not os.path.exists(path):
+            return None
+        with open(path, "r") as f:
+            return f.read()
+
+    def delete(self, kind: AggregateKind, aggregate_id: uuid.UUID) -> None:
+        path = self.shard_path(kind, aggregate_id)
+        if os.path.exists(path):
+            os.remove(path)
+
+    def list_ids(self, kind: AggregateKind) -> List[uuid.UUID]:
+        directory = os.path.join(self.root, kind.value)
+        if not os.path.isdir(directory):
+            return []
+        ids: List[uuid.UUID] = []
+        for file_name in os.listdir(directory):
+            if not file_name.endswith(".json"):
+                continue
+            try:
+                ids.append(uuid.UUID(file_name[: -len(".json")]))
+            except ValueError:
+                logger.warning("Ignoring unexpected file in storage", file_name=file_name)
+        return ids
+
+    def read_all(
+        self, kind: AggregateKind
+    ) -> Generator[Tuple[uuid.UUID, str], None, None]:
+        for aggregate_id in self.list_ids(kind):
+            js = self.read(kind, aggregate_id)
+            if js is None:
+                continue
+            yield aggregate_id, js
@@ -0,0 +1,133 @@
+import datetime
+import uuid
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+import cairne.model.generated as generated_model
+
+logger = get_logger(__name__)
+
+
+# Worlds beyond this many are evicted, least recently used first
+MAX_RESIDENT_WORLDS = 32
+
+
+class WorldIndexEntry(BaseModel):
+    world_id: uuid.UUID = Field()
+    name: Optional[str] = Field(default=None)
+    created_at: datetime.datetime = Field()
+    updated_at: datetime.datetime = Field()
+    deleted: bool = Field(default=False)
+
+    @staticmethod
+    def create(world: generated_model.GeneratedEntity) -> "WorldIndexEntry":
+        return WorldIndexEntry(
+            world_id=world.entity_id,
+            name=world.get_name(),
+            created_at=world.get_creation_date(),
+            updated_at=world.metadata.date,
+            deleted=world.deletion is not None,
+        )
+
+
+class WorldIndex(BaseModel):
+    entries: Dict[uuid.UUID, WorldIndexEntry] = Field(default_factory=dict)
+
+
+class WorldCache:
+    """
+    Dictionary-like view of all worlds. Only the index is kept in memory for
+    every world, the full world trees are loaded on first access.
+    """
+
+    def __init__(
+        self,
+        index: WorldIndex,
+        load_world: Callable[[uuid.UUID], Optional[generated_model.GeneratedEntity]],
+        evict_world: Callable[[uuid.UUID], None],
+        lock: Any,
+        capacity: int = MAX_RESIDENT_WORLDS,
+    ):
+        self.index = index
+        self.capacity = capacity
+        self._load_world = load_world
+        self._evict_world = evict_world
+        self._lock = lock
+        self._resident: "OrderedDict[uuid.UUID, generated_model.GeneratedEntity]" = OrderedDict()
+        # Set when an entry of the index changed since it was last written
+        self.index_modified = False
+
+    def get(
+        self, world_id: uuid.UUID, default: Optional[generated_model.GeneratedEntity] = None
+    ) -> Optional[generated_model.GeneratedEntity]:
+        with self._lock:
+            world = self._resident.get(world_id, None)
+            if world is not None:
+                self._resident.move_to_end(world_id)
+                return world
+            if world_id not in self.index.entries:
+                return default
+            logger.info("Loading world", world_id=world_id)
+            world = self._load_world(world_id)
+            if world is None:
+                return default
+            self._resident[world_id] = world
+            self._evict()
+            return world
+
+    def __getitem__(self, world_id: uuid.UUID) -> generated_model.GeneratedEntity:
+        world = self.get(world_id, None)
+        if world is None:
+            raise KeyError(world_id)
+        return world
+
+    def __setitem__(self, world_id: uuid.UUID, world: generated_model.GeneratedEntity) -> None:
+        with self._lock:
+            self._resident[world_id] = world
+            self._resident.move_to_end(world_id)
+            self.index.entries[world_id] = WorldIndexEntry.create(world)
+            self.index_modified = True
+            self._evict()
+
+    def __contains__(self, world_id: object) -> bool:
+        return world_id in self.index.entries
+
+    def __iter__(self) -> Iterator[uuid.UUID]:
+        return iter(list(self.index.entries.keys()))
+
+    def __len__(self) -> int:
+        return len(self.index.entries)
+
+    def remove(self, world_id: uuid.UUID) -> None:
+        # Forgets the world without evicting it, its shard is expected to be gone
+        with self._lock:
+            self._resident.pop(world_id, None)
+            if self.index.entries.pop(world_id, None) is not None:
+                self.index_modified = True
+
+    def is_resident(self, world_id: uuid.UUID) -> bool:
+        return world_id in self._resident
+
+    def update_index(self, world_id: uuid.UUID) -> None:
+        with self._lock:
+            world = self._resident.get(world_id, None)
+            if world is None:
+                return
+            entry = WorldIndexEntry.create(world)
+            if self.index.entries.get(world_id, None) != entry:
+                self.index.entries[world_id] = entry
+                self.index_modified = True
+
+    def list_entries(self) -> List[WorldIndexEntry]:
+        return list(self.index.entries.values())
+
+    def _evict(self) -> None:
+        while len(self._resident) > self.capacity:
+            world_id = next(iter(self._resident))
+            # Gives the datastore a chance to persist pending changes first
+            self._evict_world(world_id)
+            del self._resident[world_id]
+            logger.info("Evicted world", world_id=world_id)
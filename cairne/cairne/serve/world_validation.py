@@ -0,0 +1,345 @@
+import concurrent.futures
+import datetime
+import multiprocessing
+import os
+import pickle
+import time
+import typing
+import uuid
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+from pydantic import BaseModel, Field
+from structlog import get_logger
+
+import cairne.model.generated as generated_model
+import cairne.model.specification as spec
+import cairne.model.validation as validation
+from cairne.model.world_spec import WORLD
+from cairne.schema.worlds import WorldValidationStatus
+
+logger = get_logger(__name__)
+
+
+# Small enough for the progress to be reported regularly
+PARTITION_SIZE = 250
+MAX_WORKERS = os.cpu_count() or 1
+# Fewer modified entities are validated in this process, quicker than starting the workers
+# and sending them the entities, which costs about as much as validating them
+MIN_PARALLEL_ENTITIES = 10000
+
+
+class WorldValidation(BaseModel):
+    validation_id: uuid.UUID = Field(default_factory=uuid.uuid4)
+    world_id: uuid.UUID = Field()
+    status: WorldValidationStatus = Field(default=WorldValidationStatus.RUNNING)
+    started_at: datetime.datetime = Field(default_factory=datetime.datetime.now)
+    finished_at: Optional[datetime.datetime] = Field(default=None)
+    number_of_partitions: int = Field(default=0)
+    completed_partitions: int = Field(default=0)
+    number_of_entities: int = Field(default=0)
+    validated_entities: int = Field(default=0)
+    number_of_errors: int = Field(default=0)
+    errors: List[spec.ValidationError] = Field(default_factory=list)
+    failure: Optional[str] = Field(default=None)
+
+
+# The errors of each node of an entity that has any, None for entities without errors
+EntityErrors = Optional[List[Tuple[spec.GeneratablePath, List[spec.ValidationError]]]]
+
+
+@dataclass
+class SharedContext:
+    # Sent once to each worker, without the entities of the world, which are sent with their partition
+    world: generated_model.GeneratedEntity
+    generated_options: Dict[spec.GeneratablePath, Dict[str, str]]
+
+
+@dataclass
+class Partition:
+    dictionary_path: spec.GeneratablePath
+    # The modified entities of the dictionary, in the order of the dictionary
+    entities: Dict[uuid.UUID, generated_model.GeneratedEntity]
+
+
+@dataclass
+class PartitionResult:
+    entity_errors: List[EntityErrors]
+
+
+# Set in each worker process by initialize_worker
+SHARED_CONTEXT: Optional[SharedContext] = None
+
+
+def initialize_worker(pickled_shared_context: bytes) -> None:
+    global SHARED_CONTEXT
+    SHARED_CONTEXT = pickle.loads(pickled_shared_context)
+
+
+def validate_partition(partition: Partition) -> PartitionResult:
+    return PartitionResult(entity_errors=validate_entities(typing.cast(SharedContext, SHARED_CONTEXT), partition))
+
+
+def validate_entities(shared_context: SharedContext, partition: Partition) -> List[EntityErrors]:
+    # Without a session, only the errors of each entity are merged into the cache rather than every node
+    context = validation.ValidationContext(
+        world=shared_context.world,
+        current_path=partition.dictionary_path,
+        generated_options=dict(shared_context.generated_options),
+    )
+    specification = typing.cast(
+        spec.EntityDictionarySpecification, spec.resolve(WORLD, partition.dictionary_path)
+    )
+    entity_errors: List[EntityErrors] = []
+    for entity_id, entity in partition.entities.items():
+        number_of_node_errors = len(context.node_errors)
+        with context.with_path(spec.GeneratablePathElement(entity_id=entity_id), generated=entity):
+            validation.validate_generated(context, specification.entity_specification, entity)
+        entity_errors.append(context.node_errors[number_of_node_errors:] or None)
+    return entity_errors
+
+
+def merge_partition(
+    partition: Partition,
+    entity_errors: List[EntityErrors],
+    session: validation.ValidationSession,
+) -> None:
+    subtrees: List[Tuple[spec.GeneratablePath, validation.SubtreeValidation]] = []
+    for entity_id, node_errors in zip(partition.entities.keys(), entity_errors):
+        subtrees.append((
+            partition.dictionary_path.append(spec.GeneratablePathElement(entity_id=entity_id)),
+            validation.VALID_SUBTREE
+            if node_errors is None
+            else validation.SubtreeValidation(node_errors=node_errors),
+        ))
+    # The entities are validated again when anything they were validated against is modified
+    specification = spec.resolve(WORLD, partition.dictionary_path)
+    entity_paths = set(path for path, _ in subtrees)
+    dependents = {
+        dependency_path: entity_paths
+        for dependency_path in validation.get_dependency_paths(specification)
+    }
+    session.merge(subtrees, dependents)
+
+
+def get_errors(entity_errors: List[EntityErrors]) -> List[spec.ValidationError]:
+    return [
+        error
+        for node_errors in entity_errors
+        if node_errors is not None
+        for _, errors in node_errors
+        for error in errors
+    ]
+
+
+def create_generated_options(
+    world: generated_model.GeneratedEntity,
+) -> Dict[spec.GeneratablePath, Dict[str, str]]:
+    generated_options: Dict[spec.GeneratablePath, Dict[str, str]] = {}
+    for path in validation.get_dependency_paths(WORLD):
+        try:
+            generated = world.get(path, 0)
+        except spec.InvalidPathError:
+            continue
+        if isinstance(generated, generated_model.GeneratedList):
+            generated_options[path] = validation.compile_generated_options(generated)
+    return generated_options
+
+
+def find_modified_entities(
+    context: validation.ValidationContext,
+    session: validation.ValidationSession,
+    dictionary: generated_model.EntityDictionary,
+) -> List[uuid.UUID]:
+    # Only the errors of the entities that were not modified since they were validated are needed
+    entity_ids: List[uuid.UUID] = []
+    for entity_id in dictionary.entities.keys():
+        path = context.current_path.append(spec.GeneratablePathElement(entity_id=entity_id))
+        subtree = session.get(path)[1]
+        if subtree is None:
+            entity_ids.append(entity_id)
+            continue
+        for _, errors in subtree.node_errors:
+            context.errors.extend(errors)
+    return entity_ids
+
+
+def create_partitions(
+    world: generated_model.GeneratedEntity, entity_ids: Dict[spec.GeneratablePath, List[uuid.UUID]]
+) -> List[Partition]:
+    partitions: List[Partition] = []
+    for path, modified in entity_ids.items():
+        dictionary = typing.cast(generated_model.EntityDictionary, world.get(path, 0))
+        for start in range(0, len(modified), PARTITION_SIZE):
+            partitions.append(Partition(
+                dictionary_path=path,
+                entities={
+                    entity_id: dictionary.entities[entity_id]
+                    for entity_id in modified[start : start + PARTITION_SIZE]
+                },
+            ))
+    return partitions
+
+
+def create_world_skeleton(world: generated_model.GeneratedEntity) -> generated_model.GeneratedEntity:
+    # What the entities are validated against, without the entities themselves
+    children = {
+        key: (
+            child.model_copy(update=dict(entities={}))
+            if isinstance(child, generated_model.EntityDictionary)
+            else child
+        )
+        for key, child in world.children.items()
+    }
+    return world.model_copy(update=dict(children=children))
+
+
+def get_worker_context() -> multiprocessing.context.BaseContext:
+    # Not forked, a fork of the threaded server could inherit locks held by its other threads
+    if "forkserver" not in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("spawn")
+    context = multiprocessing.get_context("forkserver")
+    # The workers are forked from a server that imported the validation once, rather than the server's main module
+    context.set_forkserver_preload([__name__])
+    return context
+
+
+def validate_world(
+    world: generated_model.GeneratedEntity,
+    session: validation.ValidationSession,
+    state: WorldValidation,
+    on_progress: Callable[[WorldValidation], None],
+    max_workers: int = MAX_WORKERS,
+    min_parallel_entities: int = MIN_PARALLEL_ENTITIES,
+) -> None:
+    """
+    Validates a copy of a world, only the entities modified since they were last validated are walked.
+    Many modified entities are split across a pool of processes when there is more than one core.
+    The results are merged into the world's validation cache, unless the world was modified meanwhile.
+    """
+    context = validation.ValidationContext(
+        world=world,
+        current_path=spec.GeneratablePath.create(()),
+        session=session,
+    )
+    entity_ids: Dict[spec.GeneratablePath, List[uuid.UUID]] = {}
+    number_of_entities = 0
+    if validation.validate_own(context, WORLD, world).valid_type:
+        for key, child in world.children.items():
+            child_specification = WORLD.children.get(key, None)
+            if not child_specification:
+                continue
+            with context.with_path(spec.GeneratablePathElement(key=key), generated=child):
+                if isinstance(child_specification, spec.EntityDictionarySpecification):
+                    if validation.validate_own(context, child_specification, child).valid_type:
+                        dictionary = typing.cast(generated_model.EntityDictionary, child)
+                        number_of_entities += len(dictionary.entities)
+                        modified = find_modified_entities(context, session, dictionary)
+                        if len(modified) > 0:
+                            entity_ids[context.current_path] = modified
+                else:
+                    validation.validate_generated(context, child_specification, child)
+
+    errors = list(context.errors)
+    generated_options = create_generated_options(world)
+    partitions = create_partitions(world, entity_ids)
+    number_of_modified = sum(len(modified) for modified in entity_ids.values())
+    state.number_of_partitions = len(partitions)
+    state.number_of_entities = number_of_entities
+    state.validated_entities = number_of_entities - number_of_modified
+    state.number_of_errors = len(errors)
+    on_progress(state)
+
+    def complete(partition: Partition, entity_errors: List[EntityErrors]) -> None:
+        errors.extend(get_errors(entity_errors))
+        state.completed_partitions += 1
+        state.validated_entities += len(partition.entities)
+        state.number_of_errors = len(errors)
+        on_progress(state)
+
+    number_of_workers = min(max_workers, MAX_WORKERS, len(partitions))
+    if number_of_workers > 1 and number_of_modified >= min_parallel_entities:
+        shared_context = SharedContext(world=create_world_skeleton(world), generated_options=generated_options)
+        with concurrent.futures.ProcessPoolExecutor(
+            max_workers=number_of_workers,
+            mp_context=get_worker_context(),
+            initializer=initialize_worker,
+            # Pickled once rather than for each worker
+            initargs=(pickle.dumps(shared_context),),
+        ) as executor:
+            futures = {
+                executor.submit(validate_partition, partition): partition for partition in partitions
+            }
+            for future in concurrent.futures.as_completed(futures):
+                partition = futures[future]
+                entity_errors = future.result().entity_errors
+                merge_partition(partition, entity_errors, session)
+                complete(partition, entity_errors)
+    else:
+        shared_context = SharedContext(world=world, generated_options=generated_options)
+        for partition in partitions:
+            entity_errors = validate_entities(shared_context, partition)
+            merge_partition(partition, entity_errors, session)
+            complete(partition, entity_errors)
+
+    state.errors = errors
+    state.finished_at = datetime.datetime.now()
+    state.status = WorldValidationStatus.COMPLETE
+    logger.info(
+        "Validated world",
+        world_id=state.world_id,
+        number_of_entities=state.number_of_entities,
+        number_of_modified=number_of_modified,
+        number_of_errors=state.number_of_errors,
+        seconds=(state.finished_at - state.started_at).total_seconds(),
+    )
+    on_progress(state)
+
+
+def benchmark_validate_world(number_of_characters: int = 10000, repetitions: int = 3) -> None:
+    # Compares validating every entity in this process with validating them in parallel
+    import cairne.model.parsing as parsing
+
+    raw = dict(
+        name="world",
+        theme="western",
+        factions=["cowboys", "aliens"],
+        characters={
+            str(uuid.uuid4()): dict(
+                name=f"character {index}",
+                faction=["cowboys", "aliens", "robots"][index % 3],
+                age="31",
+                strengths=["aim", "grit", "luck"],
+                weaknesses=["pride"],
+            )
+            for index in range(number_of_characters)
+        },
+    )
+    source = generated_model.GenerationSource(source_type=generated_model.GenerationSourceType.MODEL_CALL)
+    world = parsing.parse(parsing.ParseContext(source=source), WORLD, raw)
+    world = typing.cast(generated_model.GeneratedEntity, world)
+
+    def run(max_workers: int) -> float:
+        # The copy is made by the datastore beforehand, so it is not timed
+        copy = world.model_copy(deep=True)
+        started = time.perf_counter()
+        validate_world(
+            copy,
+            validation.ValidationCache().begin(),
+            WorldValidation(world_id=world.entity_id),
+            on_progress=lambda state: None,
+            max_workers=max_workers,
+            min_parallel_entities=0,
+        )
+        return time.perf_counter() - started
+
+    # More workers than cores are not started
+    workers = sorted(set(number for number in [1, 2, 4, MAX_WORKERS] if number <= MAX_WORKERS))
+    print(f"{number_of_characters} characters, {os.cpu_count()} cores")
+    for max_workers in workers:
+        best = min(run(max_workers) for _ in range(repetitions))
+        print(f"{max_workers} workers: {best:.2f}s")
+
+
+if __name__ == "__main__":
+    benchmark_validate_world()